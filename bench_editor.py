@@ -0,0 +1,914 @@
+import argparse
+import heapq
+import importlib
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter
+import types
+from collections import deque
+
+# Editor latency benchmark for MediumPosterApp.
+#
+#   python bench_editor.py --output results.json
+#   python bench_editor.py --output new.json --compare results.json
+#   xvfb-run python bench_editor.py --display
+#
+# Every document size runs in its own process so peak memory is per size.
+# By default the Tk widget layer is replaced by the fakes below (a Text
+# widget over a list of lines and a virtual-clock event loop); --display
+# drives the real widgets instead. The grammar engine is replaced by a
+# regex over planted typos so the numbers are about the editor, not
+# LanguageTool.
+
+DEFAULT_SIZES = "1000,5000,20000,50000,100000"
+TIMED_METHODS = ("on_content_modified", "preview_content", "preview_step", "highlight_syntax",
+                 "highlight_errors", "update_status_bar", "frame_scheduler.run_frame")
+EDIT_CHECK_EDITS = 300  # Random edits replayed by edit_sequence_checks
+VIEW_LINES = 40
+LINE_PIXELS = 16
+
+VOCABULARY = (
+    "the of and to in is that it for on with as was be by this are from at or an have not which "
+    "but can all were their one has more when will there been would if what so about into than "
+    "them time only some could these two may first then do any like other how after most also "
+    "made over did many before must through years where much way well down should because each "
+    "just those people how too little state good very make world still own see men work long "
+    "get here between both life being under never day same another know while last might us "
+    "great old year off come since against go came right used take three editor draft markdown "
+    "paragraph preview publish story writer reader medium heading sentence words latency cache "
+    "network render widget thread process index buffer snapshot version grammar spelling"
+).split()
+TYPOS = ("teh", "recieve", "seperate", "definately", "occured")
+TYPO_RE = re.compile(r"\b(?:%s)\b" % "|".join(TYPOS))
+# Markdown that spans blank lines, for the preview parity check
+PARITY_SAMPLE = """# Parity
+
+See [the docs][docs] and [home][] before the list.
+
+1. First item
+
+2. Second item, loose
+
+3. Third item
+
+- Bullet
+- Bullet with more
+
+    An indented continuation paragraph.
+
+> A quote
+>
+> in two paragraphs
+
+> continued after a blank line
+
+    indented code
+
+
+    after two blank lines
+
+[docs]: https://example.com/docs "Docs"
+[home]: https://example.com
+"""
+# A fence still being typed must not pull the rest of the post into its block
+UNCLOSED_FENCE_SAMPLE = """Intro paragraph.
+
+```python
+def half_typed():
+
+A paragraph after the fence.
+
+Another paragraph.
+"""
+UNCLOSED_FENCE_BLOCKS = 4
+
+
+def generate_document(words, seed=1):
+    # Synthetic post with roughly the markup density of a technical article
+    rng = random.Random(seed)
+
+    def word():
+        if rng.random() < 1 / 200:
+            return rng.choice(TYPOS)
+        return rng.choice(VOCABULARY)
+
+    def decorated():
+        w = word()
+        r = rng.random()
+        if r < 1 / 60:
+            return f"*{w}*"
+        if r < 2 / 60:
+            return f"**{w}**"
+        if r < 2 / 60 + 1 / 120:
+            return f"`{w}`"
+        if r < 2 / 60 + 1 / 120 + 1 / 150:
+            return f"[{w} {word()}](https://example.com/{w})"
+        return w
+
+    def sentence(n):
+        text = " ".join(decorated() for _ in range(n))
+        return text[0].upper() + text[1:] + "."
+
+    blocks = ["# " + sentence(6)[:-1]]
+    count = 0
+    while count < words:
+        r = rng.random()
+        if r < 0.08:
+            n = rng.randint(3, 7)
+            blocks.append("## " + sentence(n)[:-1])
+        elif r < 0.13:
+            lines = [f"    value_{i} = {word()}({word()}, {i})" for i in range(rng.randint(3, 10))]
+            blocks.append("```python\ndef example():\n" + "\n".join(lines) + "\n```")
+            continue
+        elif r < 0.25:
+            items = [rng.randint(4, 12) for _ in range(rng.randint(3, 6))]
+            blocks.append("\n".join("- " + sentence(n) for n in items))
+            n = sum(items)
+        else:
+            lengths = [rng.randint(8, 22) for _ in range(rng.randint(3, 7))]
+            blocks.append(" ".join(sentence(n) for n in lengths))
+            n = sum(lengths)
+        count += n
+    return "\n\n".join(blocks) + "\n"
+
+
+def generate_trace(lines, keystrokes, seed=1):
+    # Bursts of typing at random lines, with backspaces, new lines and
+    # markup characters, separated by pauses long enough for the debounced
+    # preview and grammar stages to fire. Yields (key, delay_ms) where key
+    # is a character, "\b" or a ("jump", line) pair. The first burst opens
+    # a code fence that is never closed, as while one is being typed.
+    rng = random.Random(seed)
+    emitted = 0
+    while emitted < keystrokes:
+        yield ("jump", rng.randint(1, max(1, lines))), rng.randint(1000, 3000)
+        if emitted == 0:
+            for key in "\n```\n":
+                yield key, rng.randint(60, 120)
+                emitted += 1
+        for _ in range(rng.randint(5, 40)):
+            r = rng.random()
+            if r < 0.1:
+                key = "\b"
+            elif r < 0.13:
+                key = "\n"
+            elif r < 0.18:
+                key = rng.choice("*#`[]()_")
+            elif r < 0.35:
+                key = " "
+            else:
+                key = rng.choice("etaoinshrdlucmfwypvbgk")
+            yield key, rng.randint(60, 120)
+            emitted += 1
+            if emitted >= keystrokes:
+                return
+
+
+def summarize(samples):
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(values[len(values) // 2], 4),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 4),
+        "p99": round(values[min(len(values) - 1, int(len(values) * 0.99))], 4),
+        "max": round(values[-1], 4),
+    }
+
+
+def preview_parity(mp, text, expected_blocks=None):
+    # The block-wise preview must match converting the whole document at once
+    try:
+        import markdown
+    except ImportError:
+        return None
+    renderer = mp.PreviewRenderer()
+    blocks = [block for _, block in mp.split_markdown_blocks(text)]
+    if expected_blocks is not None and len(blocks) != expected_blocks:
+        return False
+    return renderer.render_blocks(blocks, mp.markdown_references(text)) == markdown.markdown(text)
+
+
+def stats_match(mp, stats, text):
+    # The counts kept up to date from edits must match counting from scratch
+    stats.refresh()
+    counts = [mp.paragraph_readability(paragraph) for _, paragraph in mp.split_paragraphs(text)]
+    sentences, words, syllables = (sum(column) for column in zip(*counts)) if counts else (0, 0, 0)
+    expected = 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words) if words else None
+    actual = stats.flesch_reading_ease()
+    return (stats.words == len(text.split()) and stats.paragraphs == len(counts)
+            and (actual == expected or (None not in (actual, expected) and abs(actual - expected) < 1e-9)))
+
+
+def text_index(text, offset):
+    # Tk "line.col" of a character offset, counted the slow way
+    line_start = text.rfind("\n", 0, offset) + 1
+    return f"{text.count(chr(10), 0, offset) + 1}.{offset - line_start}"
+
+
+def random_edit(rng, text):
+    # (op, offset, chars) of one random insert or delete; deletes remove the
+    # chars that are there, as EditHook reports them
+    if text and rng.random() < 0.45:
+        offset = rng.randrange(len(text))
+        length = min(len(text) - offset, rng.choice((1, 1, 2, 8, 40, 400)))
+        return "delete", offset, text[offset:offset + length]
+    chars = "".join(rng.choice(("x", " word", ".", "\n", "\n\n", "- item\n", "```\n")) for _ in range(rng.randint(1, 6)))
+    return "insert", rng.randint(0, len(text)), chars
+
+
+def edit_sequence_checks(mp, text, edits, seed):
+    # Replays random edits on a plain string and on the editor's own
+    # structures: Document (PieceTable and LineIndex), the autosave journal
+    # and its recovery, and the revision deltas. Returns what went wrong.
+    rng = random.Random(seed)
+    errors = []
+    document = mp.Document(text)
+    directory = tempfile.mkdtemp(prefix="medium-poster-journal-")
+    journal = mp.AutosaveJournal(directory, compact_bytes=max(4096, len(text) // 2))
+    journal.record(0, "insert", 0, text)
+    base = text
+    for number in range(edits):
+        op, offset, chars = random_edit(rng, text)
+        start = text_index(text, offset)
+        end = text_index(text, offset + len(chars)) if op == "delete" else None
+        document.on_edit(op, start, end, chars)
+        journal.record(document.version, op, offset, chars)
+        text = text[:offset] + chars + text[offset:] if op == "insert" else text[:offset] + text[offset + len(chars):]
+        index = document.line_index
+        if index.line_count() != text.count("\n") + 1:
+            errors.append(f"edit {number}: LineIndex has {index.line_count()} lines, the text {text.count(chr(10)) + 1}")
+            break
+        for probe in (offset, rng.randint(0, len(text)), len(text)):
+            expected = text_index(text, probe)
+            if index.offset_to_index(probe) != expected or index.index_to_offset(expected) != probe:
+                errors.append(f"edit {number}: LineIndex maps offset {probe} to {index.offset_to_index(probe)}, "
+                              f"not {expected}")
+                break
+        if number % 25 == 24 or number == edits - 1:
+            if document.snapshot().text != text:
+                errors.append(f"edit {number}: PieceTable text differs from the edited text")
+                break
+            journal.flush()
+            base_lines, lines = base.splitlines(True), text.splitlines(True)
+            ops = json.loads(json.dumps(mp.text_delta(base_lines, lines)))  # Stored as JSON
+            if mp.apply_delta(base_lines, ops) != text:
+                errors.append(f"edit {number}: apply_delta(text_delta()) does not rebuild the text")
+            base = text
+    journal.close()
+    if mp.recover_autosave_session(directory, journal.session) != text:
+        errors.append("journal recovery differs from the edited text")
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"v": 999999999, "op": "i", "o": 0, "t": "torn')  # Killed mid-write
+    if mp.recover_autosave_session(directory, journal.session) != text:
+        errors.append("journal recovery does not skip a torn final record")
+    mp.discard_autosave_session(directory, journal.session)
+    return errors
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# Widget fakes
+
+class FakeVar:
+    def __init__(self, master=None, value=None, name=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class FakeWidget:
+    # Accepts any constructor arguments and ignores any method call
+    def __init__(self, master=None, *args, **kwargs):
+        self.master = master
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakeRoot(FakeWidget):
+    # Tk event loop on a virtual clock: advance(ms) runs idle callbacks and
+    # every timer that falls due, in order.
+    def __init__(self):
+        super().__init__(None)
+        self.now = 0
+        self.timers = []
+        self.idle = deque()
+        self.cancelled = set()
+        self.sequence = 0
+
+    def _next_id(self):
+        self.sequence += 1
+        return f"after#{self.sequence}"
+
+    def after(self, ms, func=None, *args):
+        if func is None:
+            return None
+        after_id = self._next_id()
+        heapq.heappush(self.timers, (self.now + int(ms), self.sequence, after_id, func, args))
+        return after_id
+
+    def after_idle(self, func, *args):
+        after_id = self._next_id()
+        self.idle.append((after_id, func, args))
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.cancelled.add(after_id)
+
+    def run_idle(self):
+        while self.idle:
+            after_id, func, args = self.idle.popleft()
+            if after_id in self.cancelled:
+                self.cancelled.discard(after_id)
+                continue
+            func(*args)
+
+    def advance(self, ms):
+        end = self.now + ms
+        self.run_idle()
+        while self.timers and self.timers[0][0] <= end:
+            due, _, after_id, func, args = heapq.heappop(self.timers)
+            self.now = due
+            if after_id in self.cancelled:
+                self.cancelled.discard(after_id)
+                continue
+            func(*args)
+            self.run_idle()
+        self.now = end
+
+
+class FakeTcl:
+    # Just enough of the Tcl command table for EditHook's rename trick
+    def __init__(self):
+        self.commands = {}
+
+    def call(self, *args):
+        if len(args) == 1 and isinstance(args[0], tuple):
+            args = args[0]
+        if args[0] == "rename":
+            self.commands[args[2]] = self.commands.pop(args[1])
+            return ""
+        return self.commands[args[0]](*args[1:])
+
+    def createcommand(self, name, func):
+        self.commands[name] = func
+
+
+class FakeText(FakeWidget):
+    # Text widget over a list of lines. Inserts and deletes go through the
+    # Tcl command table so EditHook sees them like it would in Tk; tag
+    # ranges are kept per start line and are not shifted by edits.
+    INDEX_RE = re.compile(r"^(\d+)\.(\d+|end)|^(end)|^@(-?\d+),(-?\d+)|^(insert|current)")
+    MODIFIER_RE = re.compile(r"\s*([+-])\s*(\d+)\s*c(?:hars)?|\s*(wordstart|wordend|linestart|lineend)")
+    COMPARE = {
+        "<": lambda a, b: a < b, "<=": lambda a, b: a <= b, "==": lambda a, b: a == b,
+        ">=": lambda a, b: a >= b, ">": lambda a, b: a > b, "!=": lambda a, b: a != b,
+    }
+
+    def __init__(self, master=None, **kwargs):
+        super().__init__(master)
+        root = master
+        while getattr(root, "master", None) is not None:
+            root = root.master
+        self.root = root
+        self.lines = [""]
+        self.tags = {}
+        self.marks = {"insert": (1, 0), "current": (1, 0)}
+        self.bindings = {}
+        self.options = dict(kwargs)
+        self.modified = False
+        self.top = 1
+        self.scroll_pending = False
+        self.vbar = FakeWidget(self)
+        self._w = f".faketext{id(self)}"
+        self.tk = FakeTcl()
+        self.tk.createcommand(self._w, self._command)
+
+    def _command(self, op, *args):
+        return getattr(self, "_" + op)(*args)
+
+    def _end(self):
+        return len(self.lines) + 1, 0
+
+    def _move(self, line, col, count):
+        lines = self.lines
+        if count >= 0:
+            while count:
+                if line > len(lines):
+                    return self._end()
+                remaining = len(lines[line - 1]) - col
+                if count <= remaining:
+                    return line, col + count
+                count -= remaining + 1
+                line, col = line + 1, 0
+            return line, col
+        count = -count
+        while count:
+            if count <= col:
+                return line, col - count
+            if line == 1:
+                return 1, 0
+            count -= col + 1
+            line -= 1
+            col = len(lines[line - 1])
+        return line, col
+
+    def _parse(self, index):
+        index = str(index)
+        m = self.INDEX_RE.match(index)
+        if not m:
+            raise tkinter.TclError(f'bad text index "{index}"')
+        if m.group(1):
+            line = int(m.group(1))
+            if line > len(self.lines):
+                pos = self._end()
+            else:
+                length = len(self.lines[max(line, 1) - 1])
+                col = length if m.group(2) == "end" else min(int(m.group(2)), length)
+                pos = (max(line, 1), col)
+        elif m.group(3):
+            pos = self._end()
+        elif m.group(4) is not None:
+            line = min(len(self.lines), max(1, self.top + int(m.group(5)) // LINE_PIXELS))
+            pos = (line, 0)
+        else:
+            pos = self.marks[m.group(6)]
+        for sign, count, word in self.MODIFIER_RE.findall(index[m.end():]):
+            line, col = pos
+            if count:
+                pos = self._move(line, col, int(count) if sign == "+" else -int(count))
+            elif line <= len(self.lines):
+                text = self.lines[line - 1]
+                if word == "linestart":
+                    pos = (line, 0)
+                elif word == "lineend":
+                    pos = (line, len(text))
+                elif word == "wordstart":
+                    while col > 0 and (text[col - 1].isalnum() or text[col - 1] == "_"):
+                        col -= 1
+                    pos = (line, col)
+                else:
+                    while col < len(text) and (text[col].isalnum() or text[col] == "_"):
+                        col += 1
+                    pos = (line, col)
+        return pos
+
+    def _index(self, index):
+        return "%d.%d" % self._parse(index)
+
+    def _compare(self, index1, op, index2):
+        return self.COMPARE[op](self._parse(index1), self._parse(index2))
+
+    def _get(self, index1, index2=None):
+        start = self._parse(index1)
+        end = self._parse(index2) if index2 is not None else self._move(*start, 1)
+        if end <= start:
+            return ""
+        lines = self.lines + [""]
+        (l1, c1), (l2, c2) = start, end
+        if l1 == l2:
+            return lines[l1 - 1][c1:c2]
+        return "\n".join([lines[l1 - 1][c1:]] + lines[l1:l2 - 1] + [lines[l2 - 1][:c2]])
+
+    def _insert(self, index, chars, *tags):
+        line, col = self._parse(index)
+        if line > len(self.lines):
+            line, col = len(self.lines), len(self.lines[-1])
+        text = self.lines[line - 1]
+        new = str(chars).split("\n")
+        if len(new) == 1:
+            self.lines[line - 1] = text[:col] + new[0] + text[col:]
+        else:
+            self.lines[line - 1:line] = [text[:col] + new[0]] + new[1:-1] + [new[-1] + text[col:]]
+        self._changed(len(new) > 1)
+        return ""
+
+    def _delete(self, index1, index2=None):
+        start = self._parse(index1)
+        end = self._parse(index2) if index2 is not None else self._move(*start, 1)
+        last = (len(self.lines), len(self.lines[-1]))
+        start, end = min(start, last), min(end, last)
+        if end <= start:
+            return ""
+        (l1, c1), (l2, c2) = start, end
+        self.lines[l1 - 1:l2] = [self.lines[l1 - 1][:c1] + self.lines[l2 - 1][c2:]]
+        self._changed(l1 != l2)
+        return ""
+
+    def _changed(self, lines_changed):
+        if not self.modified:
+            self.modified = True
+            self.root.after_idle(self.fire, "<<Modified>>")
+        if lines_changed:
+            self._scrolled()
+
+    def _scrolled(self):
+        # Tk reports the new scroll position once the layout settles
+        if not self.scroll_pending and self.options.get("yscrollcommand"):
+            self.scroll_pending = True
+            self.root.after_idle(self._report_scroll)
+
+    def _report_scroll(self):
+        self.scroll_pending = False
+        total = len(self.lines)
+        self.options["yscrollcommand"](str((self.top - 1) / total), str(min(1.0, (self.top - 1 + VIEW_LINES) / total)))
+
+    def fire(self, sequence):
+        handler = self.bindings.get(sequence)
+        if handler:
+            handler(types.SimpleNamespace(widget=self))
+
+    # Widget API
+
+    def insert(self, index, chars, *tags):
+        return self.tk.call(self._w, "insert", index, chars, *tags)
+
+    def delete(self, index1, index2=None):
+        if index2 is None:
+            return self.tk.call(self._w, "delete", index1)
+        return self.tk.call(self._w, "delete", index1, index2)
+
+    def index(self, index):
+        return self.tk.call(self._w, "index", index)
+
+    def compare(self, index1, op, index2):
+        return self.tk.call(self._w, "compare", index1, op, index2)
+
+    def get(self, index1, index2=None):
+        if index2 is None:
+            return self.tk.call(self._w, "get", index1)
+        return self.tk.call(self._w, "get", index1, index2)
+
+    def tag_add(self, tag, index1, index2):
+        start, end = self._parse(index1), self._parse(index2)
+        if start < end:
+            self.tags.setdefault(tag, {}).setdefault(start[0], []).append((start[1], end))
+
+    def tag_remove(self, tag, index1, index2=None):
+        ranges = self.tags.get(tag)
+        if not ranges:
+            return
+        start = self._parse(index1)
+        end = self._parse(index2) if index2 is not None else self._move(*start, 1)
+        if start == (1, 0) and end >= (len(self.lines), len(self.lines[-1])):
+            ranges.clear()
+            return
+        if end[0] - start[0] < len(ranges):
+            lines = [line for line in range(start[0], end[0] + 1) if line in ranges]
+        else:
+            lines = [line for line in ranges if start[0] <= line <= end[0]]
+        for line in lines:
+            kept = [(col, stop) for col, stop in ranges[line] if stop <= start or (line, col) >= end]
+            if kept:
+                ranges[line] = kept
+            else:
+                del ranges[line]
+
+    def tag_names(self, index=None):
+        if index is None:
+            return tuple(self.tags)
+        pos = self._parse(index)
+        return tuple(tag for tag, ranges in self.tags.items()
+                     if any((pos[0], col) <= pos < stop for col, stop in ranges.get(pos[0], ())))
+
+    def mark_set(self, name, index):
+        self.marks[name] = self._parse(index)
+
+    def see(self, index):
+        line = self._parse(index)[0]
+        if not self.top <= line < self.top + VIEW_LINES:
+            self.top = max(1, line - VIEW_LINES // 2)
+            self._scrolled()
+
+    def yview(self, *args):
+        if not args:
+            total = len(self.lines)
+            return (self.top - 1) / total, min(1.0, (self.top - 1 + VIEW_LINES) / total)
+        self.top = max(1, min(len(self.lines), self._parse(args[0])[0]))
+        self._scrolled()
+
+    def winfo_height(self):
+        return VIEW_LINES * LINE_PIXELS
+
+    def edit_modified(self, flag=None):
+        if flag is None:
+            return self.modified
+        self.modified = bool(flag)
+
+    def bind(self, sequence, func=None, add=None):
+        self.bindings[sequence] = func
+
+    def config(self, **kwargs):
+        self.options.update(kwargs)
+
+    configure = config
+
+
+class FakeHTMLLabel(FakeWidget):
+    def __init__(self, master=None, html="", **kwargs):
+        super().__init__(master)
+        self.html = html
+        self.vbar = FakeWidget(self)
+
+    def set_html(self, html):
+        self.html = html
+
+    def yview_moveto(self, fraction):
+        pass
+
+
+def install_fake_widgets(mp):
+    class FakeModule:
+        def __getattr__(self, name):
+            return FakeWidget
+
+    fake_tk = types.SimpleNamespace(**{name: getattr(tkinter, name) for name in dir(tkinter) if name.isupper()})
+    fake_tk.TclError = tkinter.TclError
+    fake_tk.Tk = FakeRoot
+    fake_tk.StringVar = fake_tk.BooleanVar = fake_tk.IntVar = FakeVar
+    fake_tk.Menu = FakeWidget
+    mp.tk = fake_tk
+    mp.ttk = FakeModule()
+    mp.scrolledtext = types.SimpleNamespace(ScrolledText=FakeText)
+    mp.messagebox = types.SimpleNamespace(**{name: (lambda *args, **kwargs: None) for name in (
+        "askyesno", "showerror", "showinfo", "showwarning")})
+    mp.filedialog = types.SimpleNamespace(**{name: (lambda *args, **kwargs: "") for name in (
+        "askopenfilename", "asksaveasfilename")})
+    sys.modules["tkhtmlview"] = types.SimpleNamespace(HTMLLabel=FakeHTMLLabel)
+
+
+def install_grammar_stub(mp):
+    class RegexGrammarScheduler(mp.GrammarScheduler):
+        # Flags the planted typos in place of the LanguageTool pool; the
+        # scheduler thread, its paragraph cache and submit run for real
+        def warm_up(self, callback):
+            callback(None)
+
+        def _check_chunks(self, chunks, results):
+            for chunk in chunks:
+                for key, paragraph in chunk:
+                    matches = [mp.GrammarMatch(m.start(), len(m.group()), ["the"], "Possible spelling mistake found.",
+                                               "MORFOLOGIK_RULE_EN_US") for m in TYPO_RE.finditer(paragraph)]
+                    results[key] = matches
+                    with self.lock:
+                        self.cache.put(key, matches)
+            return True
+
+    mp.GrammarScheduler = RegexGrammarScheduler
+
+
+class Driver:
+    # Advances the event loop: virtual time for the fakes, wall-clock time
+    # for a real Tk root
+    def __init__(self, root, display):
+        self.root = root
+        self.display = display
+
+    def pump(self, ms):
+        if not self.display:
+            self.root.advance(ms)
+            return
+        end = time.perf_counter() + ms / 1000
+        while True:
+            self.root.update()
+            if time.perf_counter() >= end:
+                return
+            time.sleep(0.001)
+
+    def until(self, condition, timeout=60):
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            if time.perf_counter() > deadline:
+                raise RuntimeError("timed out waiting for the editor")
+            self.pump(25)
+            if not self.display:
+                time.sleep(0.001)  # Let background threads run
+
+
+def run_size(words, keystrokes, seed, display):
+    home = tempfile.mkdtemp(prefix="medium-poster-bench-")
+    os.environ["MEDIUM_POSTER_HOME"] = home
+    os.environ.setdefault("MEDIUM_POSTER_GRAMMAR_WORKERS", "1")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    mp = importlib.import_module("medium_poster")
+    install_grammar_stub(mp)
+    if display:
+        root = tkinter.Tk()
+    else:
+        install_fake_widgets(mp)
+        root = FakeRoot()
+    driver = Driver(root, display)
+    app = mp.MediumPosterApp(root)
+
+    samples = {name: [] for name in TIMED_METHODS}
+    for name in TIMED_METHODS:
+        owner, _, attr = name.rpartition(".")
+        owner = getattr(app, owner) if owner else app
+
+        def timed(*args, _method=getattr(owner, attr), _samples=samples[name], **kwargs):
+            started = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                _samples.append((time.perf_counter() - started) * 1000)
+        setattr(owner, attr, timed)
+    driver.until(lambda: app.preview_html is not None)
+
+    text = generate_document(words, seed)
+    path = os.path.join(home, "document.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    started = time.perf_counter()
+    app.load_content(mp.read_text_chunks(path))
+    driver.until(lambda: not app.tab.loading)
+    load_seconds = time.perf_counter() - started
+    driver.pump(1000)
+    for values in samples.values():
+        values.clear()  # Only the replay counts towards the latencies
+
+    text_widget = app.tab.content_text
+    cursor = "1.0"
+    started = time.perf_counter()
+    for key, delay in generate_trace(text.count("\n") + 1, keystrokes, seed):
+        if isinstance(key, tuple):
+            cursor = text_widget.index(f"{key[1]}.0 lineend")
+        elif key == "\b":
+            if cursor != "1.0":
+                cursor = text_widget.index(f"{cursor}-1c")
+                text_widget.delete(cursor)
+        else:
+            text_widget.insert(cursor, key)
+            cursor = text_widget.index(f"{cursor}+1c")
+        text_widget.see(cursor)
+        driver.pump(delay)
+    driver.pump(2000)
+    replay_seconds = time.perf_counter() - started
+    parity = [preview_parity(mp, sample) for sample in (text, app.tab.document.snapshot().text, PARITY_SAMPLE)]
+    parity.append(preview_parity(mp, UNCLOSED_FENCE_SAMPLE, UNCLOSED_FENCE_BLOCKS))
+    stats_ok = stats_match(mp, app.tab.document_stats, app.tab.document.snapshot().text)
+    edit_errors = edit_sequence_checks(mp, text, EDIT_CHECK_EDITS, seed)
+
+    app.grammar_scheduler.shutdown()
+    app.file_writer.close()
+    app.tab.autosave_journal.close(discard=True)
+    app.publish_queue.stop()
+    app.network.shutdown()
+    if display:
+        root.destroy()
+    return {
+        "words": words,
+        "chars": len(text),
+        "lines": text.count("\n") + 1,
+        "keystrokes": keystrokes,
+        "load_seconds": round(load_seconds, 4),
+        "replay_seconds": round(replay_seconds, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "preview_parity": None if None in parity else all(parity),
+        "stats_match": stats_ok,
+        "edit_errors": edit_errors,
+        "frame_budget_ms": mp.FRAME_BUDGET_MS,
+        "latency_ms": {name: summarize(values) for name, values in samples.items()},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline, threshold, report=print):
+    # p95 per stage and peak memory against a previous run; returns the
+    # number of regressions beyond the threshold
+    regressions = 0
+    report(f"{'words':>8}  {'stage':<27}{'baseline':>10}{'current':>10}{'change':>9}")
+    for size, current in results["sizes"].items():
+        previous = baseline.get("sizes", {}).get(size)
+        if not previous:
+            continue
+        rows = [(name, previous["latency_ms"].get(name, {}).get("p95"), stats.get("p95"), 0.25)
+                for name, stats in current["latency_ms"].items()]
+        rows.append(("peak_rss_mb", previous.get("peak_rss_mb"), current.get("peak_rss_mb"), 1.0))
+        rows.append(("load_seconds", previous.get("load_seconds"), current.get("load_seconds"), 0.01))
+        for name, old, new, noise in rows:
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if change > threshold and new - old > noise:
+                regressions += 1
+                flag = "  REGRESSION"
+            report(f"{size:>8}  {name:<27}{old:>10.3f}{new:>10.3f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def print_summary(results, report):
+    report(f"{'words':>8}  {'stage':<27}{'p50':>9}{'p95':>9}{'p99':>9}{'count':>7}")
+    for size, result in results["sizes"].items():
+        for name, stats in result["latency_ms"].items():
+            if stats["count"]:
+                report(f"{size:>8}  {name:<27}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}{stats['count']:>7}")
+        report(f"{size:>8}  load {result['load_seconds']:.2f}s, peak RSS {result['peak_rss_mb']} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure editor pipeline latency on synthetic documents.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated document sizes in words")
+    parser.add_argument("--keystrokes", type=int, default=1000, help="keystrokes replayed per document")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--display", action="store_true", help="drive real Tk widgets (needs $DISPLAY, e.g. xvfb-run)")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against an earlier JSON result")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative p95 increase counted as a regression")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        print(json.dumps(run_size(args.worker, args.keystrokes, args.seed, args.display)))
+        return 0
+    if args.display and not os.environ.get("DISPLAY"):
+        parser.error("--display needs an X display; run under xvfb-run")
+
+    def report(line):
+        print(line, file=sys.stderr)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": "display" if args.display else "stub",
+            "keystrokes": args.keystrokes,
+            "seed": args.seed,
+        },
+        "sizes": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        report(f"running {size} words...")
+        command = [sys.executable, os.path.abspath(__file__), "--worker", str(size),
+                   "--keystrokes", str(args.keystrokes), "--seed", str(args.seed)]
+        if args.display:
+            command.append("--display")
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            report(completed.stderr)
+            return completed.returncode
+        results["sizes"][str(size)] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    print_summary(results, report)
+    mismatched = [size for size, result in results["sizes"].items() if result.get("preview_parity") is False]
+    if mismatched:
+        report("preview differs from a full-document conversion at " + ", ".join(mismatched) + " words")
+    drifted = [size for size, result in results["sizes"].items() if result.get("stats_match") is False]
+    if drifted:
+        report("status bar counts differ from counting from scratch at " + ", ".join(drifted) + " words")
+    broken = [f"{size} words: {error}" for size, result in results["sizes"].items()
+              for error in result.get("edit_errors", ())]
+    for line in broken:
+        report(line)
+    # A frame that overruns its budget is a dropped frame, whatever the trend
+    over_budget = [f"{size} words ({result['latency_ms']['frame_scheduler.run_frame']['p99']} ms)"
+                   for size, result in results["sizes"].items()
+                   if result["latency_ms"].get("frame_scheduler.run_frame", {}).get("p99", 0) > result["frame_budget_ms"]]
+    if over_budget:
+        report("run_frame p99 over the frame budget at " + ", ".join(over_budget))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold, report):
+            return 1
+    return 1 if mismatched or drifted or broken or over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
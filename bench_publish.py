@@ -0,0 +1,654 @@
+import argparse
+import hashlib
+import importlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Publish queue benchmark against a local mock of the Medium API.
+#
+#   python bench_publish.py
+#   python bench_publish.py --posts 500 --concurrency 8 --output results.json
+#
+# The queue scenarios put --posts posts on a fresh queue database and run
+# the real PublishQueue worker against the mock until every job has settled:
+#
+#   clean    every create call succeeds
+#   flaky    a share of create calls answer 503, or 429 with Retry-After
+#   outage   the server is down (connections refused) for --outage seconds
+#   restart  the worker is stopped mid-run and a new one resumes the queue
+#
+# Each also re-queues a post that is still queued (the same job must come
+# back) and one that was cancelled (a new job must go out).
+#
+# The batch scenarios run BatchPublisher (the publish and sync commands)
+# over --posts markdown files:
+#
+#   batch        the first run dies after half the posts, before the progress
+#                file is rewritten; a second run resumes from the journal
+#   batch-lossy  besides 429/503, some create calls store the post and then
+#                answer 502 or time out; a second run must not resend them
+#   sync         plan_sync after publishing everything, after editing,
+#                touching and reordering the front matter of a few files,
+#                and once more with nothing changed; then plan_sync_checks
+#   images       ImagePipeline uploads wide PNGs, which must be scaled down,
+#                and an SVG and a truncated PNG, which must go out unchanged
+#   metadata     MetadataGenerator streams from a local completions stub
+#                (OPENAI_API_BASE); articles over the token budget must be
+#                cut to fit, and the interleaved tokens must assemble into
+#                every candidate
+#
+# Besides throughput and attempts per post, every scenario reports how many
+# posts the mock received more than once, which must be zero.
+
+SCENARIOS = ("clean", "flaky", "outage", "restart", "batch", "batch-lossy", "sync", "images", "metadata")
+QUEUE_SCENARIOS = ("clean", "flaky", "outage", "restart")
+SYNC_DEFAULTS = {"publish_status": "draft", "license": "all-rights-reserved", "tags": "", "notify_followers": False}
+SYNC_EDITS = 3
+IMAGE_SCENARIO_MAX = 20  # Images are slow to recompress; a few cover the pipeline
+METADATA_SCENARIO_MAX = 20
+TOKEN = "bench-token"
+POST_PATH_RE = re.compile(r"^/v1/users/([^/]+)/posts$")
+
+
+class MockMedium:
+    # Just enough of the API for the publishers: GET /v1/me and post creation.
+    # `fail_rate` of create calls are rejected without storing anything;
+    # `lost_rate` are stored and then answered with a 502 or not in time.
+    def __init__(self, latency=0.005, fail_rate=0.0, lost_rate=0.0, stall=1.0, seed=1):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.lost_rate = lost_rate
+        self.stall = stall
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.received = {}  # (title, content) -> posts stored
+        self.calls = 0
+        self.rejected = 0
+        self.lost = 0
+        self.server = None
+        self.port = 0
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body, headers=()):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/v1/me":
+                    self.reply(200, {"data": {"id": "bench-user"}})
+                else:
+                    self.reply(404, {"errors": [{"message": "Not found"}]})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not POST_PATH_RE.match(self.path):
+                    self.reply(404, {"errors": [{"message": "Not found"}]})
+                    return
+                time.sleep(mock.latency)
+                key = (body.get("title"), body.get("content"))
+                with mock.lock:
+                    mock.calls += 1
+                    roll = mock.rng.random()
+                    if roll < mock.fail_rate:
+                        mock.rejected += 1
+                        if roll < mock.fail_rate / 2:
+                            self.reply(429, {"errors": [{"message": "Rate limited"}]}, [("Retry-After", "0.2")])
+                        else:
+                            self.reply(503, {"errors": [{"message": "Unavailable"}]})
+                        return
+                    mock.received[key] = mock.received.get(key, 0) + 1
+                    number = sum(mock.received.values())
+                    lost = roll < mock.fail_rate + mock.lost_rate
+                    if lost:
+                        mock.lost += 1
+                if not lost:
+                    self.reply(201, {"data": {"id": str(number), "url": f"https://medium.com/p/{number}"}})
+                    return
+                # Stored, but the client never learns about it
+                if roll < mock.fail_rate + mock.lost_rate / 2:
+                    time.sleep(mock.stall)
+                try:
+                    self.reply(502, {"errors": [{"message": "Bad gateway"}]})
+                except OSError:
+                    pass  # The client timed out and hung up
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def duplicates(self):
+        with self.lock:
+            return sum(count - 1 for count in self.received.values() if count > 1)
+
+    def stored(self):
+        with self.lock:
+            return sum(self.received.values())
+
+
+class MockCompletions:
+    # A streaming chat completions endpoint, as reached through
+    # OPENAI_API_BASE. Every request streams `n` candidates whose tokens
+    # arrive a few characters at a time, interleaved across the choices.
+    def __init__(self, token_chars=3, seed=1):
+        self.token_chars = token_chars
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.prompts = []  # user message of every request
+        self.server = None
+        self.port = 0
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    @staticmethod
+    def candidate(prompt, index):
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"Title: Candidate {index} for {digest}\nSubtitle: Subtitle {index}\nTags: bench, tag{index}"
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path != "/v1/chat/completions" or not body.get("stream"):
+                    self.send_error(404)
+                    return
+                prompt = body["messages"][-1]["content"]
+                with mock.lock:
+                    mock.prompts.append(prompt)
+                    tokens = [[text[i:i + mock.token_chars] for i in range(0, len(text), mock.token_chars)]
+                              for text in (mock.candidate(prompt, index) for index in range(body.get("n", 1)))]
+                    order = [index for index, choice in enumerate(tokens) for _ in choice]
+                    mock.rng.shuffle(order)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                positions = [0] * len(tokens)
+                for index in order:
+                    token = tokens[index][positions[index]]
+                    positions[index] += 1
+                    event = {"object": "chat.completion.chunk", "model": body.get("model"),
+                             "choices": [{"index": index, "delta": {"content": token}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_queue(mp, path, concurrency, base_delay):
+    client = mp.NetworkClient(max_retries=0, base_delay=base_delay, workers=concurrency)
+    return mp.PublishQueue(path, client=client, concurrency=concurrency, base_delay=base_delay)
+
+
+def settled(queue):
+    counts = queue.counts()
+    return not any(counts.get(status) for status in ("queued", "publishing"))
+
+
+def run_scenario(mp, name, posts, concurrency, outage, seed, timeout):
+    mock = MockMedium(fail_rate=0.3 if name == "flaky" else 0.0, seed=seed)
+    mock.start()
+    path = os.path.join(tempfile.mkdtemp(prefix="medium-poster-queue-"), "queue.sqlite3")
+    queue = make_queue(mp, path, concurrency, base_delay=0.05)
+    for number in range(posts):
+        post = {"title": f"Bench post {number}", "content": f"Body of post {number}.\n\nSecond paragraph."}
+        queue.enqueue(post, TOKEN, mock.api_base)
+    errors = []
+    job_id, existing = queue.enqueue({"title": "Bench post 0", "content": "Body of post 0.\n\nSecond paragraph."},
+                                     TOKEN, mock.api_base)  # Same post again: must not be sent twice
+    if existing != "queued":
+        errors.append(f"re-queueing an active post returned {existing!r} instead of its job")
+    # A cancelled job is not reused, and re-queueing a scheduled one moves it
+    requeued = {"title": "Bench post requeued", "content": "Cancelled, then queued again."}
+    cancelled, _ = queue.enqueue(requeued, TOKEN, mock.api_base, publish_at=time.time() + 3600)
+    queue.cancel(cancelled)
+    requeued_id, existing = queue.enqueue(requeued, TOKEN, mock.api_base, publish_at=time.time() + 3600)
+    if requeued_id == cancelled or existing is not None:
+        errors.append("re-queueing a cancelled post returned the cancelled job")
+    if queue.enqueue(requeued, TOKEN, mock.api_base) != (requeued_id, "queued"):
+        errors.append("re-queueing a scheduled post did not return its job")
+    if name == "outage":
+        mock.stop()
+        threading.Timer(outage, mock.start).start()
+
+    started = time.perf_counter()
+    queue.start()
+    if name == "restart":
+        while mock.stored() < posts // 2:
+            time.sleep(0.005)
+        queue.stop(wait=True)
+        queue = make_queue(mp, path, concurrency, base_delay=0.05)
+        queue.set_token(TOKEN, mock.api_base)
+        queue.start()
+    deadline = started + timeout
+    while not settled(queue):
+        if time.perf_counter() > deadline:
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    queue.stop(wait=True)
+    mock.stop()
+
+    jobs = queue.jobs(limit=posts + 2)
+    statuses = {}
+    for job in jobs:
+        statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+        if job["id"] == requeued_id and job["status"] != "published":
+            errors.append(f"the rescheduled post ended {job['status']}, not published")
+    published = statuses.get("published", 0)
+    return {
+        "posts": posts,
+        "jobs": len(jobs),
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "posts_per_second": round(published / elapsed, 1) if elapsed else None,
+        "attempts_per_post": round(sum(job["attempts"] for job in jobs) / max(1, len(jobs)), 2),
+        "rejected": mock.rejected,
+        "duplicates": mock.duplicates(),
+        "timed_out": not settled(queue),
+        "errors": errors,
+    }
+
+
+def write_posts(directory, count):
+    paths = []
+    for number in range(count):
+        path = os.path.join(directory, f"post-{number:05d}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"---\ntitle: Bench post {number}\ntags: bench, post\n---\n"
+                    f"Body of post {number}.\n\nSecond paragraph.\n")
+        paths.append(path)
+    return paths
+
+
+def make_publisher(mp, mock, progress_path, concurrency, retries):
+    # A short read timeout so the mock's stalled answers count as timeouts
+    client = mp.NetworkClient(read_timeout=mock.stall / 2, max_retries=retries, base_delay=0.05, workers=concurrency)
+    return mp.BatchPublisher(TOKEN, mock.api_base, concurrency, progress_path, retries, client=client)
+
+
+def progress_statuses(progress, paths):
+    statuses = {}
+    for path in paths:
+        status = progress.get(path, {}).get("status", "missing")
+        statuses[status] = statuses.get(status, 0) + 1
+    return statuses
+
+
+def run_batch_scenario(mp, name, posts, concurrency, retries, seed):
+    lossy = name == "batch-lossy"
+    mock = MockMedium(fail_rate=0.2 if lossy else 0.0, lost_rate=0.1 if lossy else 0.0, seed=seed)
+    mock.start()
+    directory = tempfile.mkdtemp(prefix="medium-poster-batch-")
+    paths = write_posts(directory, posts)
+    progress_path = os.path.join(directory, "progress.json")
+    errors = []
+    quiet = lambda line: None
+
+    started = time.perf_counter()
+    publisher = make_publisher(mp, mock, progress_path, concurrency, retries)
+    if lossy:
+        publisher.run(mp.collect_posts(paths), report=quiet)
+        first = progress_statuses(publisher.progress, paths)
+        if first.get("missing"):
+            errors.append(f"{first['missing']} posts missing from the progress file")
+    else:
+        # Killed after half the posts: only the journal has their results
+        publisher.save_progress = lambda: None
+        publisher.run(mp.collect_posts(paths[:posts // 2]), report=quiet)
+    resumed = make_publisher(mp, mock, progress_path, concurrency, retries)
+    replayed = progress_statuses(resumed.progress, paths).get("published", 0)
+    if not lossy and replayed != posts // 2:
+        errors.append(f"journal replay restored {replayed} of {posts // 2} published posts")
+    stored = mock.stored()
+    resumed.run(mp.collect_posts(paths), report=quiet)
+    elapsed = time.perf_counter() - started
+    mock.stop()
+
+    statuses = progress_statuses(resumed.progress, paths)
+    if lossy:
+        # The second run leaves uncertain posts alone and retries rejected ones
+        if statuses.get("uncertain", 0) != first.get("uncertain", 0):
+            errors.append("uncertain posts changed status without --retry-uncertain")
+        if mock.stored() - stored != first.get("failed", 0) - statuses.get("failed", 0):
+            errors.append("the second run sent posts that were not failed")
+    elif statuses.get("published", 0) != posts:
+        errors.append(f"{statuses.get('published', 0)} of {posts} posts published")
+    if os.path.exists(progress_path + ".log"):
+        errors.append("the journal was not folded into the progress file")
+    return {
+        "posts": posts,
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "posts_per_second": round(statuses.get("published", 0) / elapsed, 1) if elapsed else None,
+        "attempts_per_post": round(mock.calls / max(1, posts), 2),
+        "rejected": mock.rejected,
+        "lost": mock.lost,
+        "duplicates": mock.duplicates(),
+        "timed_out": False,
+        "errors": errors,
+    }
+
+
+def plan_sync_checks(mp, paths, manifest):
+    # Focused checks on a manifest where every post is published: the pool
+    # and the serial path agree, other defaults or a failed entry mean a
+    # resend, trailing whitespace does not, and posts survive a round trip
+    # through format_markdown_post
+    errors = []
+    copy = lambda: {path: dict(entry, mtime_ns=0) for path, entry in manifest.items()}  # Forces hashing
+    serial = mp.plan_sync(paths, copy(), SYNC_DEFAULTS)
+    parallel_min = mp.SYNC_PARALLEL_MIN
+    mp.SYNC_PARALLEL_MIN = 1
+    try:
+        parallel = mp.plan_sync(paths, copy(), SYNC_DEFAULTS)
+    finally:
+        mp.SYNC_PARALLEL_MIN = parallel_min
+    if serial != parallel or serial[0]:
+        errors.append("plan_sync differs between the process pool and the serial path")
+    changed, _ = mp.plan_sync(paths, copy(), dict(SYNC_DEFAULTS, license="cc-40-by"))
+    if len(changed) != len(paths):
+        errors.append(f"changed defaults resend {len(changed)} of {len(paths)} posts")
+    failed = copy()
+    failed[paths[0]]["status"] = "failed"
+    if [path for path, _ in mp.plan_sync(paths, failed, SYNC_DEFAULTS)[0]] != [paths[0]]:
+        errors.append("a failed post is not planned for sending again")
+    with open(paths[-1], "a", encoding="utf-8") as f:
+        f.write("\n\n  \n")
+    entries = copy()
+    changed, _ = mp.plan_sync(paths, entries, SYNC_DEFAULTS)
+    if changed or entries[paths[-1]]["size"] != os.path.getsize(paths[-1]):
+        errors.append("trailing whitespace counts as an edit, or the new size is not remembered")
+    for path in paths[:SYNC_EDITS]:
+        post = mp.read_markdown_post(path, SYNC_DEFAULTS)
+        copy_path = path + ".roundtrip.md"
+        with open(copy_path, "w", encoding="utf-8") as f:
+            f.write(mp.format_markdown_post(post))
+        if mp.payload_digest(mp.read_markdown_post(copy_path, SYNC_DEFAULTS)) != mp.payload_digest(post):
+            errors.append(f"{os.path.basename(path)} changes through format_markdown_post")
+        os.remove(copy_path)
+    return errors
+
+
+def run_sync_scenario(mp, posts, concurrency, retries, seed):
+    mock = MockMedium(seed=seed)
+    mock.start()
+    directory = tempfile.mkdtemp(prefix="medium-poster-sync-")
+    paths = write_posts(directory, posts)
+    manifest_path = os.path.join(directory, "sync_manifest.json")
+    errors = []
+    passes = []
+
+    def sync():
+        publisher = make_publisher(mp, mock, manifest_path, concurrency, retries)
+        started = time.perf_counter()
+        changed, unchanged = mp.plan_sync(paths, publisher.progress, SYNC_DEFAULTS)
+        plan_seconds = time.perf_counter() - started
+        batch = []
+        for path, state in changed:
+            post = mp.read_markdown_post(path, SYNC_DEFAULTS)
+            post["manifest"] = state
+            batch.append(post)
+        if batch:
+            publisher.run(batch, report=lambda line: None)
+        else:
+            publisher.save_progress()
+        passes.append({"changed": len(changed), "unchanged": len(unchanged),
+                       "plan_seconds": round(plan_seconds, 4), "seconds": round(time.perf_counter() - started, 4)})
+        return {path for path, _ in changed}
+
+    started = time.perf_counter()
+    if len(sync()) != posts:
+        errors.append("the first sync did not publish every post")
+    edited = paths[:SYNC_EDITS]
+    for path in edited:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\nAn added paragraph.\n")
+    # Same payload: a newer mtime, and front matter in another order
+    for path in paths[SYNC_EDITS:2 * SYNC_EDITS]:
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    for path in paths[2 * SYNC_EDITS:3 * SYNC_EDITS]:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        head, body = text[4:].split("---\n", 1)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("---\n" + "".join(reversed(head.splitlines(True))) + "---\n" + body)
+    changed = sync()
+    if changed != set(edited):
+        errors.append(f"expected the {len(edited)} edited posts to change, got {len(changed)}")
+    if sync():
+        errors.append("a sync without changes still found changed posts")
+    elapsed = time.perf_counter() - started
+    mock.stop()
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    statuses = progress_statuses(manifest, paths)
+    errors.extend(plan_sync_checks(mp, paths, manifest))
+    published = mock.stored()
+    return {
+        "posts": posts,
+        "statuses": statuses,
+        "passes": passes,
+        "seconds": round(elapsed, 3),
+        "posts_per_second": round(published / elapsed, 1) if elapsed else None,
+        "attempts_per_post": round(mock.calls / max(1, posts), 2),
+        "rejected": mock.rejected,
+        "duplicates": mock.duplicates(),
+        "timed_out": False,
+        "errors": errors,
+    }
+
+
+def run_images_scenario(mp, posts, seed):
+    # Uploads --posts raster images too wide for the post plus an SVG and a
+    # truncated PNG, which Pillow cannot read and must go out unchanged
+    from PIL import Image
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp(prefix="medium-poster-images-")
+    paths = []
+    for number in range(posts):
+        path = os.path.join(directory, f"image-{number:05d}.png")
+        # Noise, so the scaled-down JPEG is always smaller than the PNG
+        Image.effect_noise((mp.IMAGE_MAX_WIDTH * 2, 64), rng.randint(32, 96)).convert("RGB").save(path)
+        paths.append(path)
+    unreadable = {os.path.join(directory, "drawing.svg"): b'<svg xmlns="http://www.w3.org/2000/svg" width="8" '
+                                                        b'height="8"><rect width="8" height="8"/></svg>\n'}
+    with open(paths[0], "rb") as f:
+        unreadable[os.path.join(directory, "truncated.png")] = f.read()[:64]
+    for path, data in unreadable.items():
+        with open(path, "wb") as f:
+            f.write(data)
+    uploaded = {}
+    lock = threading.Lock()
+
+    def upload(client, path, data):
+        with lock:
+            uploaded[path] = uploaded.get(path, 0) + 1
+        if path in unreadable and data != unreadable[path]:
+            return None
+        if path not in unreadable and Image.open(io.BytesIO(data)).width != mp.IMAGE_MAX_WIDTH:
+            return None
+        return f"https://images.example/{os.path.basename(path)}"
+
+    errors = []
+    pipeline = mp.ImagePipeline(None, cache_path=os.path.join(directory, "cache.json"), upload=upload)
+    started = time.perf_counter()
+    try:
+        urls = pipeline.upload_all(paths + list(unreadable))
+    except Exception as e:
+        errors.append(f"upload_all failed: {e}")
+        urls = {}
+    elapsed = time.perf_counter() - started
+    if not errors and pipeline.upload_all(paths + list(unreadable)) != urls:
+        errors.append("cached URLs differ from the uploaded ones")
+    return {
+        "posts": posts,
+        "statuses": {"published": len(urls)},
+        "seconds": round(elapsed, 3),
+        "posts_per_second": round(len(urls) / elapsed, 1) if elapsed else None,
+        "attempts_per_post": round(sum(uploaded.values()) / max(1, len(uploaded)), 2),
+        "duplicates": sum(1 for count in uploaded.values() if count > 1),
+        "timed_out": False,
+        "errors": errors,
+    }
+
+
+def write_article(rng, paragraphs):
+    # Headings, ordinary paragraphs and one paragraph far over any budget
+    blocks = []
+    for number in range(paragraphs):
+        if number % 5 == 0:
+            blocks.append(f"## Section {number // 5}")
+        words = rng.randint(20, 80) if number else 3000
+        blocks.append(" ".join(rng.choice(("alpha", "beta", "gamma", "delta.")) for _ in range(words)) + ".")
+    return "\n\n".join(blocks)
+
+
+def run_metadata_scenario(mp, posts, seed):
+    # MetadataGenerator against the streaming stub: the prompt must hold the
+    # summary cut to the token budget, the interleaved tokens must assemble
+    # into every candidate, and asking again must be served from the cache
+    import openai
+    mock = MockCompletions(seed=seed)
+    mock.start()
+    openai.api_key = "bench-key"
+    mp.OPENAI_API_BASE = mock.api_base
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp(prefix="medium-poster-metadata-")
+    generator = mp.MetadataGenerator(cache_path=os.path.join(directory, "cache.json"), token_budget=300,
+                                     latency_log=None)
+    articles = [write_article(rng, rng.randint(1, 40)) for _ in range(posts)]
+    errors = []
+    updates = []
+    generated = 0
+    started = time.perf_counter()
+    for number, article in enumerate(articles):
+        summary = mp.summarize_for_prompt(article, generator.token_budget)
+        if mp.estimate_tokens(summary) > generator.token_budget or not summary:
+            errors.append(f"article {number}: summary of {mp.estimate_tokens(summary)} tokens "
+                          f"for a budget of {generator.token_budget}")
+        try:
+            candidates = generator.generate(article, on_update=updates.append)
+        except Exception as e:
+            errors.append(f"article {number}: {e}")
+            continue
+        prompt = generator.prompt(article)
+        if mock.prompts[-1:] != [prompt]:
+            errors.append(f"article {number}: the prompt sent differs from the summarized one")
+        expected = [mp.parse_metadata(mock.candidate(prompt, index)) for index in range(generator.candidates)]
+        if candidates != expected or updates[-1] != expected:
+            errors.append(f"article {number}: streamed candidates did not assemble")
+        generated += 1
+    elapsed = time.perf_counter() - started
+    requests = len(mock.prompts)
+    for article in articles:
+        generator.generate(article)
+    if len(mock.prompts) != requests:
+        errors.append("unchanged articles were sent again instead of read from the cache")
+    mock.stop()
+    return {
+        "posts": posts,
+        "statuses": {"published": generated},
+        "seconds": round(elapsed, 3),
+        "posts_per_second": round(generated / elapsed, 1) if elapsed else None,
+        "attempts_per_post": round(requests / max(1, posts), 2),
+        "duplicates": 0,
+        "timed_out": False,
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure publish queue throughput and retries against a mock Medium API.")
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-retries", type=int, default=2, help="retries per post in the batch scenarios")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--outage", type=float, default=2.0, help="seconds the server is down in the outage scenario")
+    parser.add_argument("--timeout", type=float, default=120.0, help="give up on a scenario after this many seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    os.environ["MEDIUM_POSTER_HOME"] = tempfile.mkdtemp(prefix="medium-poster-bench-")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    mp = importlib.import_module("medium_poster")
+
+    results = {"concurrency": args.concurrency, "scenarios": {}}
+    failures = 0
+    print(f"{'scenario':<10}{'published':>10}{'seconds':>9}{'posts/s':>9}{'attempts':>10}{'dupes':>7}", file=sys.stderr)
+    for name in args.scenarios.split(","):
+        if name in QUEUE_SCENARIOS:
+            result = run_scenario(mp, name, args.posts, args.concurrency, args.outage, args.seed, args.timeout)
+        elif name == "sync":
+            result = run_sync_scenario(mp, args.posts, args.concurrency, args.max_retries, args.seed)
+        elif name == "metadata":
+            result = run_metadata_scenario(mp, min(args.posts, METADATA_SCENARIO_MAX), args.seed)
+        elif name == "images":
+            result = run_images_scenario(mp, min(args.posts, IMAGE_SCENARIO_MAX), args.seed)
+        else:
+            result = run_batch_scenario(mp, name, args.posts, args.concurrency, args.max_retries, args.seed)
+        results["scenarios"][name] = result
+        published = result["statuses"].get("published", 0)
+        print(f"{name:<10}{published:>10}{result['seconds']:>9.2f}{result['posts_per_second'] or 0:>9.1f}"
+              f"{result['attempts_per_post']:>10.2f}{result['duplicates']:>7}", file=sys.stderr)
+        for error in result.get("errors", ()):
+            print(f"  {name}: {error}", file=sys.stderr)
+        if result["duplicates"] or result["timed_out"] or result.get("errors"):
+            failures += 1
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,3009 @@
+import time
+
+_STARTUP_STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
-from tkhtmlview import HTMLLabel
-import markdown
-import requests
-import openai
-import language_tool_python
+from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
 import threading
 import os
-import time
+import sys
+import json
+import importlib
 import re
 import queue
+import hashlib
+import heapq
+from bisect import bisect_left, bisect_right
+import multiprocessing
+import argparse
+import random
+import sqlite3
+import zlib
+import difflib
+import itertools
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 
 # pip install tkhtmlview markdown requests openai language_tool_python
+# The heavy dependencies above are imported on first use or in the background
+# so the window shows up before LanguageTool, OpenAI and friends are loaded.
+
+APP_DATA_DIR = os.environ.get("MEDIUM_POSTER_HOME") or os.path.join(os.path.expanduser("~"), ".medium_poster")
+AUTOSAVE_DIR = os.path.join(APP_DATA_DIR, "autosave")
+AUTOSAVE_COMPACT_BYTES = 256 * 1024
+AUTOSAVE_SESSION_COUNTER = itertools.count(1)  # One journal per open tab
+DRAFTS_DB_PATH = os.path.join(APP_DATA_DIR, "drafts.sqlite3")
+DRAFT_FIELDS = ("title", "subtitle", "tags", "canonical_url", "publish_status", "license",
+                "notify_followers", "featured_image", "featured_image_url")
+DRAFT_LIST_LIMIT = 500
+DRAFT_IMPORT_BATCH = 200  # Files per transaction during bulk import
+DRAFT_SEARCH_DEBOUNCE_MS = 150
+REVISION_KEYFRAME_INTERVAL = 50  # Deltas stored against one keyframe at most
+REVISION_KEYFRAME_RATIO = 0.5  # New keyframe once a delta outgrows this share of it
+UNDO_LIMIT = 2000  # Edit groups kept on the Tk undo stack
+TAB_DEFAULT_FIELDS = {
+    "title": "", "subtitle": "", "tags": "", "canonical_url": "", "publish_status": "draft",
+    "notify_followers": False, "license": "all-rights-reserved", "featured_image": None, "featured_image_url": "",
+}
+
+MEDIUM_API_BASE = os.environ.get("MEDIUM_API_BASE", "https://api.medium.com")
+IMGUR_CLIENT_ID = os.environ.get("IMGUR_CLIENT_ID", "YOUR_IMGUR_CLIENT_ID")  # Replace with your Imgur Client ID
+PUBLISH_CONCURRENCY = 4
+PUBLISH_MAX_RETRIES = 5
+SYNC_PARALLEL_MIN = 64  # Files to hash before a process pool pays for itself
+SYNC_HASH_CHUNK = 32
+PUBLISH_QUEUE_PATH = os.path.join(APP_DATA_DIR, "publish_queue.sqlite3")
+PUBLISH_QUEUE_MAX_FAILURES = 8  # Rejected attempts before a job is marked failed
+PUBLISH_ACTIVE_STATUSES = ("queued", "publishing", "uncertain")  # A post is not queued twice while in these
+PUBLISH_QUEUE_MAX_DELAY = 600.0
+PUBLISH_OFFLINE_MAX_DELAY = 60.0  # Poll interval ceiling while the network is down
+PUBLISH_QUEUE_REFRESH_MS = 1000
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+NETWORK_CONNECT_TIMEOUT = float(os.environ.get("MEDIUM_POSTER_CONNECT_TIMEOUT", "5"))
+NETWORK_READ_TIMEOUT = float(os.environ.get("MEDIUM_POSTER_READ_TIMEOUT", "60"))
+NETWORK_MAX_RETRIES = 3
+NETWORK_WORKERS = 4
+UI_QUEUE_POLL_MS = 50
+IMAGE_CACHE_PATH = os.path.join(APP_DATA_DIR, "image_cache.json")
+IMAGE_MAX_WIDTH = 1400  # Medium's content column at 2x
+IMAGE_JPEG_QUALITY = 85
+IMAGE_UPLOAD_CONCURRENCY = 4
+OPENAI_MODEL = os.environ.get("MEDIUM_POSTER_OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_API_BASE = os.environ.get("OPENAI_API_BASE")
+METADATA_CACHE_PATH = os.path.join(APP_DATA_DIR, "metadata_cache.json")
+METADATA_PROMPT_VERSION = 2
+METADATA_TOKEN_BUDGET = 2000
+METADATA_CANDIDATES = 3
+AI_LATENCY_LOG = os.path.join(APP_DATA_DIR, "ai_latency.jsonl")
+METADATA_PROMPT = (
+    "Read the article below and reply with exactly three lines:\n"
+    "Title: <an engaging and concise title>\n"
+    "Subtitle: <a one-sentence subtitle>\n"
+    "Tags: <up to 5 relevant tags separated by commas>\n\n"
+    "Article:\n{article}"
+)
+MARKDOWN_IMAGE_RE = re.compile(r'(!\[[^\]]*\]\(\s*)(<[^>]+>|[^)\s]+)((?:\s+"[^"]*")?\s*\))')
+FRONT_MATTER_RE = re.compile(r'\A---\s*\n(.*?)\n---\s*\n', re.DOTALL)
+TITLE_HEADING_RE = re.compile(r'^#\s+(.+?)\s*#*\s*$', re.MULTILINE)
+
+FILE_CHUNK_CHARS = 256 * 1024  # Slice size for streaming open/save
+PREVIEW_DEBOUNCE_MS = 150
+PREVIEW_MARGIN_BLOCKS = 12  # Blocks rendered beyond each edge of the editor viewport
+PREVIEW_MAX_BLOCK_CHARS = 2000  # Caps one render_block call at a few ms
+PREVIEW_SCROLL_DELAY_MS = 40
+FENCE_RE = re.compile(r'^\s{0,3}(`{3,}|~{3,})')
+HEADER_RE = re.compile(r'^(#{1,6})\s.*$')
+LIST_ITEM_RE = re.compile(r'^ {0,3}(?:[*+-]|\d+\.) +')
+BLOCKQUOTE_RE = re.compile(r'^ {0,3}>', re.MULTILINE)
+REFERENCE_DEF_RE = re.compile(r'^ {0,3}\[[^\[\]]*\]: *\S.*$', re.MULTILINE)
+INLINE_SYNTAX_PATTERNS = [
+    ("bold", re.compile(r'(?<!\*)\*\*(.+?)\*\*(?!\*)')),
+    ("italic", re.compile(r'(?<!\*)\*(.+?)\*(?!\*)')),
+    ("code", re.compile(r'`([^`]+)`')),
+    ("link", re.compile(r'\[([^\]]+)\]\([^)]+\)')),
+]
+SYNTAX_TAGS = ("header", "bold", "italic", "code", "link")
+FULL_RETOKENIZE_LINES = 200
+STATUS_UPDATE_MS = 250
+FRAME_BUDGET_MS = 12  # Idle work per slice, leaving room in a 60 Hz frame
+FRAME_SLACK_MS = 1.5  # Jobs stop this early, as each overruns by one step
+WORDS_PER_MINUTE = 200
+SENTENCE_END_RE = re.compile(r'[.!?]+(?=\s|$)')
+VOWEL_GROUP_RE = re.compile(r'[aeiouy]+')
+PARAGRAPH_BREAK_RE = re.compile(r'\n(?:[ \t]*\n)+')
+
+GRAMMAR_DEBOUNCE_MS = 500
+# Local spell check that flags words before LanguageTool answers
+SPELL_DICTIONARIES = [path for path in (
+    os.environ.get("MEDIUM_POSTER_DICTIONARY"),
+    "/usr/share/dict/words",
+    "/usr/share/dict/american-english",
+    "/usr/share/dict/british-english",
+) if path]
+USER_WORDS_PATH = os.path.join(APP_DATA_DIR, "user_words.txt")
+SPELL_WORD_RE = re.compile(r"(?<![\w'])[A-Za-z]+(?:'[A-Za-z]+)*(?![\w])")
+SPELL_SKIP_RE = re.compile(r"`[^`]*`|\]\([^)]*\)|<[^>]+>|https?://\S+|\S+@\S+")
+SPELL_ALPHABET = "abcdefghijklmnopqrstuvwxyz'"
+SPELL_MAX_SUGGESTIONS = 5
+GRAMMAR_CHUNK_CHARS = 4000
+# Opt-in hot path instrumentation (MEDIUM_POSTER_METRICS=1 or View > Collect Performance Metrics)
+METRICS_ENABLED = os.environ.get("MEDIUM_POSTER_METRICS", "") not in ("", "0")
+METRICS_FORMAT = os.environ.get("MEDIUM_POSTER_METRICS_FORMAT", "json")  # or "prometheus"
+METRICS_PATH = os.path.join(APP_DATA_DIR, "metrics.prom" if METRICS_FORMAT == "prometheus" else "metrics.json")
+METRICS_WINDOW = 1000  # Samples kept per histogram
+METRICS_PROBE_MS = 50
+METRICS_STALL_MS = 100  # Event loop lateness counted as a stall
+METRICS_EXPORT_MS = 10000
+METRICS_OVERLAY_MS = 1000
+GRAMMAR_WORKERS = int(os.environ.get("MEDIUM_POSTER_GRAMMAR_WORKERS", "0")) or max(1, min(4, (os.cpu_count() or 2) // 2))
+
+GrammarMatch = namedtuple("GrammarMatch", "offset errorLength replacements message ruleId")
+DocumentSnapshot = namedtuple("DocumentSnapshot", "version text")
+
+
+def closed_fences(lines):
+    # Opening line -> closing line of every fence that has been closed. A
+    # fence still being typed is left to the blank-line split, so it does
+    # not swallow the rest of the document into one block.
+    fences = [(line_no, match.group(1)) for line_no, line in enumerate(lines)
+              for match in (FENCE_RE.match(line),) if match]
+    closing = {}
+    i = 0
+    while i < len(fences):
+        start, marker = fences[i]
+        for j in range(i + 1, len(fences)):
+            end, closer = fences[j]
+            if closer[0] == marker[0] and len(closer) >= len(marker):
+                closing[start] = end
+                i = j
+                break
+        i += 1
+    return closing
+
+
+def iter_markdown_blocks(lines, closing):
+    # Split a document into top-level blocks separated by blank lines.
+    # Closed fenced code is kept whole, and a block continues across blank
+    # lines wherever Markdown would continue the element above: indented
+    # lines, further items of a list and further paragraphs of a blockquote.
+    # Link definitions can be anywhere; see markdown_references. A finished
+    # block is held back until the next one shows it cannot be continued.
+    held = None
+    current = []
+    start_line = 0
+    fence_end = None
+    blank_lines = 0
+    for line_no, line in enumerate(lines):
+        if fence_end is not None:
+            current.append(line)
+            if line_no == fence_end:
+                fence_end = None
+            continue
+        if line_no in closing:
+            if not current:
+                if held is not None:
+                    yield held
+                    held = None
+                start_line = line_no
+            current.append(line)
+            fence_end = closing[line_no]
+            blank_lines = 0
+            continue
+        if not line.strip():
+            if current:
+                held = (start_line, "\n".join(current))
+                current = []
+            blank_lines += 1
+            continue
+        if not current:
+            previous = held[1] if held is not None else None
+            if previous is not None and (line[:1] in (" ", "\t")
+                                         or (LIST_ITEM_RE.match(line) and LIST_ITEM_RE.match(previous))
+                                         or (BLOCKQUOTE_RE.match(line) and BLOCKQUOTE_RE.search(previous))):
+                start_line = held[0]
+                current = [previous] + [""] * blank_lines
+            else:
+                if held is not None:
+                    yield held
+                start_line = line_no
+            held = None
+        current.append(line)
+        blank_lines = 0
+    if current:
+        held = (start_line, "\n".join(current))
+    if held is not None:
+        yield held
+
+
+def split_markdown_blocks(text):
+    lines = text.split("\n")
+    return list(iter_markdown_blocks(lines, closed_fences(lines)))
+
+
+def split_oversized_block(start_line, block, limit=PREVIEW_MAX_BLOCK_CHARS):
+    # A block is converted in one go, so a huge one would stall a frame.
+    # Oversized blocks are cut at their last blank line within the limit,
+    # else at a line end, else at a space; only they lose exact parity.
+    if len(block) <= limit:
+        return [(start_line, block)]
+    pieces = []
+    current = []
+    first = start_line
+    size = 0
+    for line_no, line in enumerate(block.split("\n"), start_line):
+        while len(line) > limit:
+            if current:
+                pieces.append((first, "\n".join(current)))
+                current, size = [], 0
+            cut = line.rfind(" ", 0, limit)
+            if cut <= 0:
+                cut = limit
+            pieces.append((line_no, line[:cut]))
+            line = line[cut:].lstrip(" ")
+        if current and size + len(line) + 1 > limit:
+            blank = max((i for i, previous in enumerate(current) if not previous.strip()), default=0)
+            if blank:
+                pieces.append((first, "\n".join(current[:blank])))
+                first, current = first + blank + 1, current[blank + 1:]
+            else:
+                pieces.append((first, "\n".join(current)))
+                current = []
+            size = sum(len(previous) + 1 for previous in current)
+        if not current:
+            first = line_no
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        pieces.append((first, "\n".join(current)))
+    return pieces
+
+
+def markdown_references(text):
+    # Reference link definitions, appended to every block when it is
+    # converted on its own so [text][id] resolves wherever [id]: is defined
+    return "\n".join(match.group(0).strip() for match in REFERENCE_DEF_RE.finditer(text))
+
+
+def tokenize_markdown_line(line, fence):
+    # Return the tag spans for one line and the fence that is open after it
+    fence_match = FENCE_RE.match(line)
+    if fence:
+        if fence_match and fence_match.group(1)[0] == fence[0] and len(fence_match.group(1)) >= len(fence):
+            fence = None
+        return [("code", 0, len(line))], fence
+    if fence_match:
+        return [("code", 0, len(line))], fence_match.group(1)
+    spans = []
+    if HEADER_RE.match(line):
+        spans.append(("header", 0, len(line)))
+    for tag, pattern in INLINE_SYNTAX_PATTERNS:
+        for match in pattern.finditer(line):
+            spans.append((tag, match.start(), match.end()))
+    return spans, None
+
+
+def split_paragraphs(text):
+    # Return (offset, paragraph) pairs for every non-blank paragraph
+    paragraphs = []
+    start = 0
+    for separator in PARAGRAPH_BREAK_RE.finditer(text):
+        if text[start:separator.start()].strip():
+            paragraphs.append((start, text[start:separator.start()]))
+        start = separator.end()
+    if text[start:].strip():
+        paragraphs.append((start, text[start:]))
+    return paragraphs
+
+
+class GrammarCache:
+    # Paragraph hash -> LanguageTool matches with paragraph-relative offsets
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def key(paragraph):
+        return hashlib.sha1(paragraph.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        matches = self.entries.get(key)
+        if matches is not None:
+            self.entries.move_to_end(key)
+        return matches
+
+    def put(self, key, matches):
+        self.entries[key] = matches
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+def to_grammar_match(match, shift=0):
+    return GrammarMatch(
+        match.offset + shift,
+        match.errorLength,
+        list(match.replacements),
+        match.message,
+        match.ruleId,
+    )
+
+
+# LanguageTool instance owned by each grammar worker process
+_grammar_tool = None
+
+
+def _init_grammar_worker(language):
+    global _grammar_tool
+    import language_tool_python
+    _grammar_tool = language_tool_python.LanguageTool(language)
+
+
+def _check_paragraphs(paragraphs):
+    return [[to_grammar_match(m) for m in _grammar_tool.check(p)] for p in paragraphs]
+
+
+class GrammarScheduler:
+    # Keeps at most one pending request per document; a newer submit replaces
+    # it. Uncached paragraphs are grouped into chunks that are checked in a
+    # bounded pool of LanguageTool processes, and chunks that have not been
+    # started are dropped as soon as a newer version arrives. If the pool
+    # breaks, checks stop until the user asks for a retry.
+    def __init__(self, language="en-US", workers=GRAMMAR_WORKERS, chunk_chars=GRAMMAR_CHUNK_CHARS, on_failure=None):
+        self.language = language
+        self.workers = workers
+        self.chunk_chars = chunk_chars
+        self.cache = GrammarCache()
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.pending = None
+        self.executor = None
+        self.thread = None
+        self.closed = False
+        self.chunks_waiting = 0
+        self.chunks_running = 0
+        self.checks_completed = 0
+        self.checks_superseded = 0
+        self.latencies = deque(maxlen=200)
+        self.last_error = None
+        self.failed = None  # Error that broke the pool, until retry()
+        self.on_failure = on_failure  # called with that error, from a worker thread
+
+    def submit(self, content, version, callback):
+        with self.condition:
+            if self.closed or self.failed is not None:
+                return
+            if self.pending is not None:
+                self.checks_superseded += 1
+            self.pending = (content, version, callback)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                "queue_depth": self.chunks_waiting + self.chunks_running + (1 if self.pending else 0),
+                "chunks_waiting": self.chunks_waiting,
+                "chunks_running": self.chunks_running,
+                "workers": self.workers,
+                "checks_completed": self.checks_completed,
+                "checks_superseded": self.checks_superseded,
+                "last_latency": self.latencies[-1] if self.latencies else None,
+                "p50_latency": latencies[len(latencies) // 2] if latencies else None,
+                "p95_latency": latencies[int(len(latencies) * 0.95)] if latencies else None,
+            }
+
+    def warm_up(self, callback):
+        # Start every worker process (and its LanguageTool server) ahead of
+        # the first real check; callback(error) runs once they are all up.
+        def run():
+            try:
+                executor = self._executor()
+                futures = [executor.submit(_check_paragraphs, ["Warm up."]) for _ in range(self.workers)]
+                for future in futures:
+                    future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._fail(e)
+                callback(e)
+            else:
+                callback(None)
+        threading.Thread(target=run, daemon=True).start()
+
+    def retry(self):
+        # A fresh pool is started by the next check
+        with self.condition:
+            self.failed = None
+
+    def shutdown(self):
+        with self.condition:
+            self.closed = True
+            self.pending = None
+            self.condition.notify()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _superseded(self):
+        return self.pending is not None or self.closed
+
+    def _fail(self, error):
+        with self.condition:
+            if self.failed is not None:
+                return
+            self.failed = error
+            self.pending = None
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if self.on_failure:
+            self.on_failure(error)
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_grammar_worker,
+                initargs=(self.language,),
+            )
+        return self.executor
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                content, version, callback = self.pending
+                self.pending = None
+            try:
+                self._check(content, version, callback)
+            except Exception as e:
+                self.last_error = e
+                if isinstance(e, BrokenProcessPool):
+                    self._fail(e)
+
+    def _check(self, content, version, callback):
+        started = time.perf_counter()
+        paragraphs = split_paragraphs(content)
+        results = {}
+        missing = []
+        for _, paragraph in paragraphs:
+            key = self.cache.key(paragraph)
+            if key in results:
+                continue
+            with self.lock:
+                cached = self.cache.get(key)
+            results[key] = cached
+            if cached is None:
+                missing.append((key, paragraph))
+
+        if missing and not self._check_chunks(self._chunk(missing), results):
+            return
+
+        matches = []
+        for offset, paragraph in paragraphs:
+            for match in results[self.cache.key(paragraph)] or []:
+                matches.append(match._replace(offset=match.offset + offset))
+        with self.lock:
+            self.checks_completed += 1
+            self.latencies.append(time.perf_counter() - started)
+        callback(matches, version)
+
+    def _chunk(self, missing):
+        chunks = []
+        current = []
+        size = 0
+        for key, paragraph in missing:
+            current.append((key, paragraph))
+            size += len(paragraph)
+            if size >= self.chunk_chars:
+                chunks.append(current)
+                current = []
+                size = 0
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _check_chunks(self, chunks, results):
+        executor = self._executor()
+        waiting = deque(chunks)
+        running = {}
+        error = None
+        while waiting or running:
+            while waiting and len(running) < self.workers and not self._superseded():
+                chunk = waiting.popleft()
+                future = executor.submit(_check_paragraphs, [paragraph for _, paragraph in chunk])
+                future.add_done_callback(lambda f, chunk=chunk: self._store(f, chunk))
+                running[future] = chunk
+            with self.lock:
+                self.chunks_waiting = len(waiting)
+                self.chunks_running = len(running)
+            if self._superseded():
+                # Chunks still queued in the pool are cancelled. One already
+                # in a worker cannot be interrupted; its result still lands
+                # in the cache, but nobody waits on it.
+                for future in running:
+                    future.cancel()
+                with self.lock:
+                    self.chunks_waiting = 0
+                    self.chunks_running = 0
+                return False
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = running.pop(future)
+                if future.exception() is not None:
+                    error = future.exception()
+                    waiting.clear()
+                    continue
+                for (key, _), paragraph_matches in zip(chunk, future.result()):
+                    results[key] = paragraph_matches
+        with self.lock:
+            self.chunks_waiting = 0
+            self.chunks_running = 0
+        if error is not None:
+            raise error
+        return True
+
+    def _store(self, future, chunk):
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self.lock:
+            for (key, _), paragraph_matches in zip(chunk, future.result()):
+                self.cache.put(key, paragraph_matches)
+
+
+class LineIndex:
+    # Prefix table of line start offsets for O(log n) conversion between
+    # character offsets and Tk "line.col" indices. Edits that stay on one
+    # line (ordinary typing) only record a pending shift for the lines after
+    # it, so the table is not rewritten on every keystroke.
+    def __init__(self, text=""):
+        self.rebuild(text)
+
+    def rebuild(self, text):
+        self.starts = [0]
+        self.starts.extend(m.end() for m in re.finditer("\n", text))
+        self.length = len(text)
+        self.shift_line = len(self.starts)
+        self.shift_delta = 0
+
+    def _flush(self):
+        if self.shift_delta:
+            delta = self.shift_delta
+            tail = self.shift_line + 1
+            self.starts[tail:] = [start + delta for start in self.starts[tail:]]
+        self.shift_line = len(self.starts)
+        self.shift_delta = 0
+
+    def line_start(self, line):
+        # line is 0-based
+        start = self.starts[line]
+        return start + self.shift_delta if line > self.shift_line else start
+
+    def line_count(self):
+        return len(self.starts)
+
+    def offset_to_index(self, offset):
+        line = bisect_right(self.starts, offset, 0, min(self.shift_line + 1, len(self.starts))) - 1
+        if line >= self.shift_line:
+            line = bisect_right(self.starts, offset - self.shift_delta, self.shift_line + 1) - 1
+            line = max(line, self.shift_line)
+        return f"{line + 1}.{offset - self.line_start(line)}"
+
+    def index_to_offset(self, index):
+        line, col = index.split(".")
+        return self.line_start(int(line) - 1) + int(col)
+
+    def on_edit(self, op, start, end, chars):
+        line = int(start.split(".")[0]) - 1
+        offset = self.index_to_offset(start)
+        if "\n" not in chars:
+            if self.shift_line != line:
+                self._flush()
+                self.shift_line = line
+            self.shift_delta += len(chars) if op == "insert" else -len(chars)
+        else:
+            self._flush()
+            if op == "insert":
+                new_starts = [offset + m.end() for m in re.finditer("\n", chars)]
+                self.starts[line + 1:] = new_starts + [s + len(chars) for s in self.starts[line + 1:]]
+            else:
+                removed = chars.count("\n")
+                self.starts[line + 1:] = [s - len(chars) for s in self.starts[line + 1 + removed:]]
+        self.length += len(chars) if op == "insert" else -len(chars)
+
+
+class PieceTable:
+    # Pieces are (source, start, length) slices of immutable strings: the
+    # last materialized text or the chars of an individual insert.
+    def __init__(self, text=""):
+        self.reset(text)
+
+    def reset(self, text):
+        self.pieces = [(text, 0, len(text))] if text else []
+        self.length = len(text)
+
+    def _split(self, offset):
+        # Return the index of the piece that starts at offset, splitting one if needed
+        position = 0
+        for i, (source, start, length) in enumerate(self.pieces):
+            if position == offset:
+                return i
+            if offset < position + length:
+                cut = offset - position
+                self.pieces[i:i + 1] = [(source, start, cut), (source, start + cut, length - cut)]
+                return i + 1
+            position += length
+        return len(self.pieces)
+
+    def insert(self, offset, chars):
+        if chars:
+            self.pieces.insert(self._split(offset), (chars, 0, len(chars)))
+            self.length += len(chars)
+
+    def delete(self, offset, length):
+        if length:
+            first = self._split(offset)
+            last = self._split(offset + length)
+            del self.pieces[first:last]
+            self.length -= length
+
+    def materialize(self):
+        return "".join(source[start:start + length] for source, start, length in self.pieces)
+
+
+class Document:
+    # Mirror of the editor buffer fed by edit deltas. snapshot() returns an
+    # immutable (version, text) pair that is materialized at most once per
+    # version and shared by preview, highlighting, grammar, stats and I/O.
+    def __init__(self, text=""):
+        self.table = PieceTable(text)
+        self.line_index = LineIndex(text)
+        self.version = 0
+        self._snapshot = DocumentSnapshot(0, text)
+        self._lines = (None, None)
+        self.listeners = []  # called with (version, op, offset, chars)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def on_edit(self, op, start, end, chars):
+        offset = self.line_index.index_to_offset(start)
+        if op == "insert":
+            self.table.insert(offset, chars)
+        else:
+            self.table.delete(offset, len(chars))
+        self.line_index.on_edit(op, start, end, chars)
+        self.version += 1
+        for listener in self.listeners:
+            listener(self.version, op, offset, chars)
+
+    def snapshot(self):
+        if self._snapshot.version != self.version:
+            text = self.table.materialize()
+            self.table.reset(text)
+            self._snapshot = DocumentSnapshot(self.version, text)
+        return self._snapshot
+
+    def lines(self):
+        # The snapshot split into lines, also cached per version
+        if self._lines[0] != self.version:
+            self._lines = (self.version, self.snapshot().text.split("\n"))
+        return self._lines[1]
+
+
+def atomic_write(path, data):
+    # Write to a temp file in the same directory, fsync, then rename over path.
+    # `data` is a string or an iterable of string chunks.
+    directory = os.path.dirname(os.path.abspath(path))
+    temp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp_path, "w", encoding="utf-8", newline="") as f:
+            for chunk in ([data] if isinstance(data, str) else data):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def text_chunks(text, size=FILE_CHUNK_CHARS):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def text_progress_chunks(text, size=FILE_CHUNK_CHARS):
+    # Same (chunk, fraction) pairs as read_text_chunks, for text in memory
+    total = len(text) or 1
+    for start in range(0, len(text), size):
+        yield text[start:start + size], min(1.0, (start + size) / total)
+
+
+def read_text_chunks(path, size=FILE_CHUNK_CHARS):
+    # Yields (chunk, fraction of the file read so far)
+    total = os.path.getsize(path) or 1
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk, min(1.0, f.buffer.tell() / total)
+
+
+def deliver_result(future, deliver, on_success=None, on_error=None):
+    # Hand a future's outcome to on_success/on_error through `deliver`
+    def done(future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            if on_error:
+                deliver(on_error, error)
+        elif on_success:
+            deliver(on_success, future.result())
+    future.add_done_callback(done)
+    return future
+
+
+class FileWriter:
+    # Saves documents on a single background thread, so the UI never waits
+    # on the disk and saves land in the order they were requested.
+    def __init__(self, deliver=None):
+        self.deliver = deliver or (lambda callback, *args: callback(*args))
+        self.executor = None
+
+    def save(self, path, text, on_success=None, on_error=None):
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-writer")
+
+        def write():
+            atomic_write(path, text_chunks(text))
+            return path
+        return deliver_result(self.executor.submit(write), self.deliver, on_success, on_error)
+
+    def close(self):
+        # Let queued saves finish before the process exits
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class AutosaveJournal:
+    # Edit deltas are appended to <session>.journal by a background writer,
+    # which keeps its own piece table so it can periodically compact the
+    # journal into an atomically written <session>.snapshot. The Tk thread
+    # only hands over the deltas collected since the previous autosave.
+    def __init__(self, directory=AUTOSAVE_DIR, compact_bytes=AUTOSAVE_COMPACT_BYTES):
+        self.directory = directory
+        self.compact_bytes = compact_bytes
+        self.session = f"session-{os.getpid()}-{int(time.time())}-{next(AUTOSAVE_SESSION_COUNTER)}"
+        self.journal_path = os.path.join(directory, self.session + ".journal")
+        self.snapshot_path = os.path.join(directory, self.session + ".snapshot")
+        self.pending = []
+        self.table = PieceTable()
+        self.version = 0
+        self.journal_bytes = 0
+        self.last_saved = None
+        self.last_error = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, version, op, offset, chars):
+        self.pending.append((version, op, offset, chars))
+
+    def flush(self):
+        # Returns False when nothing changed since the last autosave
+        if not self.pending:
+            return False
+        deltas, self.pending = self.pending, []
+        self.queue.put(deltas)
+        return True
+
+    def close(self, discard=False):
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+        if discard:
+            discard_autosave_session(self.directory, self.session)
+
+    def _run(self):
+        while True:
+            deltas = self.queue.get()
+            if deltas is None:
+                return
+            try:
+                self._write(deltas)
+                self.last_saved = time.time()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+
+    def _write(self, deltas):
+        os.makedirs(self.directory, exist_ok=True)
+        records = []
+        for version, op, offset, chars in deltas:
+            if op == "insert":
+                records.append(json.dumps({"v": version, "op": "i", "o": offset, "t": chars}))
+            else:
+                records.append(json.dumps({"v": version, "op": "d", "o": offset, "n": len(chars)}))
+        data = "\n".join(records) + "\n"
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        for version, op, offset, chars in deltas:
+            if op == "insert":
+                self.table.insert(offset, chars)
+            else:
+                self.table.delete(offset, len(chars))
+        self.version = deltas[-1][0]
+        self.journal_bytes += len(data)
+        if self.journal_bytes > self.compact_bytes:
+            self._compact()
+
+    def _compact(self):
+        text = self.table.materialize()
+        self.table.reset(text)
+        atomic_write(self.snapshot_path, json.dumps({"version": self.version, "text": text}))
+        atomic_write(self.journal_path, "")
+        self.journal_bytes = 0
+
+
+def find_orphaned_autosaves(directory=AUTOSAVE_DIR):
+    # Sessions whose process is gone, newest first
+    if not os.path.isdir(directory):
+        return []
+    sessions = {}
+    for name in os.listdir(directory):
+        match = re.match(r'^(session-(\d+)-(\d+)(?:-\d+)?)\.(journal|snapshot)$', name)
+        if match and not pid_alive(int(match.group(2))):
+            sessions[match.group(1)] = int(match.group(3))
+    return sorted(sessions, key=sessions.get, reverse=True)
+
+
+def recover_autosave_session(directory, session):
+    table = PieceTable()
+    version = 0
+    snapshot_path = os.path.join(directory, session + ".snapshot")
+    journal_path = os.path.join(directory, session + ".journal")
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        table.reset(snapshot["text"])
+        version = snapshot["version"]
+    if os.path.exists(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn final write
+                if record["v"] <= version:
+                    continue
+                if record["op"] == "i":
+                    table.insert(record["o"], record["t"])
+                else:
+                    table.delete(record["o"], record["n"])
+    return table.materialize()
+
+
+def discard_autosave_session(directory, session):
+    for suffix in (".journal", ".snapshot"):
+        path = os.path.join(directory, session + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class MatchIndex:
+    # Grammar matches sorted by offset for fast point lookup. Offsets are
+    # shifted as the text is edited so the index stays valid between checks.
+    def __init__(self, line_index):
+        self.line_index = line_index
+        self.set_matches([])
+
+    def set_matches(self, matches):
+        self.matches = sorted(matches, key=lambda m: m.offset)
+        self.starts = [m.offset for m in self.matches]
+        self.max_length = max((m.errorLength for m in self.matches), default=0)
+
+    def find(self, offset):
+        hi = bisect_right(self.starts, offset)
+        lo = bisect_left(self.starts, offset - self.max_length)
+        for match in self.matches[lo:hi]:
+            if match.offset <= offset < match.offset + match.errorLength:
+                return match
+        return None
+
+    def on_edit(self, op, start, end, chars):
+        if not self.matches:
+            return
+        offset = self.line_index.index_to_offset(start)
+        if op == "insert":
+            delta = len(chars)
+            edit_end = offset
+        else:
+            delta = -len(chars)
+            edit_end = offset + len(chars)
+        first = bisect_left(self.starts, offset - self.max_length)
+        kept = self.matches[:first]
+        for match in self.matches[first:]:
+            if match.offset + match.errorLength <= offset:
+                kept.append(match)
+            elif match.offset >= edit_end and (op == "delete" or match.offset > offset):
+                kept.append(match._replace(offset=match.offset + delta))
+            # Matches overlapping the edit are dropped until the next check
+        self.set_matches(kept)
+
+
+def shift_lines(lines, line, delta):
+    # Renumber a set of line numbers after lines were added (delta > 0) or
+    # removed (delta < 0) just below `line`
+    if delta > 0:
+        return {n + delta if n > line else n for n in lines}
+    return {n + delta if n > line - delta else min(n, line) for n in lines}
+
+
+class DirtyLines:
+    # Line numbers waiting to be reprocessed, handed out lowest first. The
+    # heap survives across calls so resumable work does not re-sort the set
+    # every slice; it is rebuilt lazily after lines are added or removed.
+    def __init__(self, lines=()):
+        self.lines = set(lines)
+        self.heap = None
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __contains__(self, line):
+        return line in self.lines
+
+    def add(self, line):
+        if line not in self.lines:
+            self.lines.add(line)
+            if self.heap is not None:
+                heapq.heappush(self.heap, line)
+
+    def update(self, lines):
+        for line in lines:
+            self.add(line)
+
+    def discard(self, line):
+        self.lines.discard(line)
+
+    def shift(self, line, delta):
+        self.lines = shift_lines(self.lines, line, delta)
+        self.heap = None
+
+    def reset(self, lines=()):
+        self.lines = set(lines)
+        self.heap = None
+
+    def pop(self):
+        if self.heap is None:
+            self.heap = list(self.lines)
+            heapq.heapify(self.heap)
+        while self.heap:
+            line = heapq.heappop(self.heap)
+            if line in self.lines:
+                self.lines.discard(line)
+                return line
+        self.lines.clear()
+        return None
+
+
+class FrameScheduler:
+    # Runs edit-driven work from idle callbacks in slices of at most
+    # `budget_ms`. A job is step(deadline) -> True while work remains; the
+    # most urgent pending job always runs first, and whatever is left over
+    # waits for the next idle slice so keystrokes are handled in between.
+    def __init__(self, root, budget_ms=FRAME_BUDGET_MS, slack_ms=FRAME_SLACK_MS):
+        self.root = root
+        self.budget = budget_ms / 1000
+        self.slack = slack_ms / 1000
+        self.jobs = {}  # name -> (priority, step); lower priority runs first
+        self.pending = set()
+        self.after_id = None
+
+    def add_job(self, name, priority, step):
+        self.jobs[name] = (priority, step)
+
+    def request(self, *names):
+        self.pending.update(names)
+        if self.after_id is None:
+            self.after_id = self.root.after_idle(self.run_frame)
+
+    def cancel(self, *names):
+        self.pending.difference_update(names)
+
+    def run_frame(self):
+        self.after_id = None
+        deadline = time.perf_counter() + self.budget - self.slack
+        try:
+            while self.pending and time.perf_counter() < deadline:
+                name = min(self.pending, key=lambda n: self.jobs[n][0])
+                self.pending.discard(name)
+                if self.jobs[name][1](deadline):
+                    self.pending.add(name)
+        finally:
+            if self.pending and self.after_id is None:
+                self.after_id = self.root.after_idle(self.run_frame)
+
+
+class EditHook:
+    # Intercepts the Tcl command of a Text widget so listeners see every
+    # insert and delete (including undo/redo) as "line.col" ranges.
+    def __init__(self, widget):
+        self.widget = widget
+        self.listeners = []
+        self.orig = widget._w + "_orig"
+        widget.tk.call("rename", widget._w, self.orig)
+        widget.tk.createcommand(widget._w, self.dispatch)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def call(self, *args):
+        return self.widget.tk.call((self.orig,) + args)
+
+    def clamp(self, index):
+        index = self.call("index", index)
+        end = self.call("index", "end-1c")
+        if self.call("compare", index, ">", end):
+            return end
+        return index
+
+    def dispatch(self, *args):
+        # Errors from the widget (a bad index, no selection) reach the caller
+        # just as they would without the hook
+        if args and args[0] == "insert":
+            return self.insert(args[1], args[2:])
+        if args and args[0] == "delete":
+            return self.delete(args[1], args[2] if len(args) > 2 else None)
+        if args and args[0] == "replace":
+            self.delete(args[1], args[2])
+            return self.insert(args[1], args[3:])
+        return self.call(*args)
+
+    def notify(self, op, start, end, chars):
+        # The edit is done by now; a listener failing must not report it failed
+        for listener in self.listeners:
+            try:
+                listener(op, start, end, chars)
+            except tk.TclError:
+                pass
+
+    def insert(self, index, chars_and_tags):
+        start = self.clamp(index)
+        result = self.call("insert", index, *chars_and_tags)
+        chars = "".join(str(c) for c in chars_and_tags[::2])
+        if chars:
+            self.notify("insert", start, None, chars)
+        return result
+
+    def delete(self, index1, index2=None):
+        start = self.clamp(index1)
+        end = self.clamp(index2) if index2 is not None else self.clamp(f"{start}+1c")
+        if not self.call("compare", start, "<", end):
+            return ""
+        chars = self.call("get", start, end)
+        result = self.call("delete", start, end)
+        self.notify("delete", start, end, chars)
+        return result
+
+
+class SyntaxHighlighter:
+    # Re-tokenizes only the lines touched by edits. The fence state at the
+    # start of every line is remembered so a change that opens or closes a
+    # fenced code block keeps propagating until the state settles again.
+    def __init__(self, text_widget, document):
+        self.text = text_widget
+        self.document = document
+        self.fence_states = [None]  # fence open at the start of each line
+        self.dirty = DirtyLines({1})
+
+    def on_edit(self, op, start, end, chars):
+        line = int(start.split(".")[0])
+        if op == "insert":
+            added = chars.count("\n")
+            if added:
+                self.fence_states[line:line] = [None] * added
+                self.dirty.shift(line, added)
+            self.dirty.update(range(line, line + added + 1))
+        else:
+            removed = int(end.split(".")[0]) - line
+            if removed:
+                del self.fence_states[line:line + removed]
+                self.dirty.shift(line, -removed)
+            self.dirty.add(line)
+
+    def mark_all_dirty(self):
+        line_count = int(self.text.index("end-1c").split(".")[0])
+        self.fence_states = [None] * line_count
+        self.dirty.reset(range(1, line_count + 1))
+
+    def highlight(self, deadline=None, first=None, last=None):
+        # Without a range every dirty line is done, lowest first; with one,
+        # only dirty lines in first..last. Returns True if the deadline
+        # stopped it (or, for a full pass, if dirty lines remain).
+        line_count = int(self.text.index("end-1c").split(".")[0])
+        if len(self.fence_states) != line_count:
+            self.mark_all_dirty()
+        if not self.dirty:
+            return False
+        lines = self.document.lines() if len(self.dirty) > FULL_RETOKENIZE_LINES else None
+        visible = None
+        if first is not None:
+            last = min(last, line_count)
+            visible = [line for line in range(first, last + 1) if line in self.dirty]
+        while True:
+            if visible is None:
+                line = self.dirty.pop()
+            else:
+                line = heapq.heappop(visible) if visible else None
+                if line is not None:
+                    if line not in self.dirty:
+                        continue
+                    self.dirty.discard(line)
+            if line is None:
+                break
+            if line > line_count:
+                continue
+            text = lines[line - 1] if lines is not None else self.text.get(f"{line}.0", f"{line}.end")
+            for tag in SYNTAX_TAGS:
+                self.text.tag_remove(tag, f"{line}.0", f"{line}.end")
+            spans, next_fence = tokenize_markdown_line(text, self.fence_states[line - 1])
+            for tag, start, end in spans:
+                self.text.tag_add(tag, f"{line}.{start}", f"{line}.{end}")
+            if line < line_count and self.fence_states[line] != next_fence:
+                self.fence_states[line] = next_fence
+                self.dirty.add(line + 1)
+                if visible is not None and line + 1 <= last:
+                    heapq.heappush(visible, line + 1)
+            if deadline is not None and time.perf_counter() > deadline:
+                return bool(self.dirty) if visible is None else bool(visible)
+        return bool(self.dirty) if visible is None else False
+
+
+class SpellChecker:
+    # Word lookups in a frozenset built from the system dictionary, plus the
+    # user's own word list. Without a dictionary nothing is flagged.
+    def __init__(self, paths=None, user_words_path=USER_WORDS_PATH):
+        self.paths = SPELL_DICTIONARIES if paths is None else paths
+        self.user_words_path = user_words_path
+        self.words = frozenset()
+        self.user_words = set()
+        self.ready = False
+
+    def load(self):
+        words = set()
+        for path in self.paths:
+            try:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    words.update(line.strip().lower() for line in f)
+                break
+            except OSError:
+                continue
+        try:
+            with open(self.user_words_path, "r", encoding="utf-8") as f:
+                self.user_words.update(line.strip().lower() for line in f if line.strip())
+        except OSError:
+            pass
+        words.discard("")
+        self.words = frozenset(words)
+        self.ready = bool(self.words)
+
+    def known(self, word):
+        word = word.lower()
+        if word.endswith("'s"):
+            word = word[:-2]
+        return word in self.words or word in self.user_words
+
+    def misspelled(self, text):
+        # (start, end) of unknown words; code, link targets, URLs, HTML,
+        # acronyms and mixed-case names are left alone
+        if not self.ready:
+            return []
+        text = SPELL_SKIP_RE.sub(lambda m: " " * len(m.group()), text)
+        spans = []
+        for m in SPELL_WORD_RE.finditer(text):
+            word = m.group()
+            if len(word) < 2 or word[1:] != word[1:].lower() or self.known(word):
+                continue
+            spans.append((m.start(), m.end()))
+        return spans
+
+    def add_word(self, word):
+        word = word.lower()
+        self.user_words.add(word)
+        os.makedirs(os.path.dirname(self.user_words_path), exist_ok=True)
+        with open(self.user_words_path, "a", encoding="utf-8") as f:
+            f.write(word + "\n")
+
+    def suggestions(self, word, limit=SPELL_MAX_SUGGESTIONS):
+        # Known words one edit away, then two edits away for short words
+        lower = word.lower()
+
+        def edits(w):
+            splits = [(w[:i], w[i:]) for i in range(len(w) + 1)]
+            return ({a + b[1:] for a, b in splits if b}
+                    | {a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1}
+                    | {a + c + b[1:] for a, b in splits if b for c in SPELL_ALPHABET}
+                    | {a + c + b for a, b in splits for c in SPELL_ALPHABET})
+
+        def rank(candidate):
+            return (candidate[:1] != lower[:1], abs(len(candidate) - len(lower)), candidate)
+
+        first = edits(lower)
+        found = sorted((w for w in first if self.known(w)), key=rank)
+        if not found and len(lower) <= 8:
+            found = sorted({w for e in first for w in edits(e) if self.known(w)}, key=rank)
+        found = found[:limit]
+        if word.isupper():
+            return [w.upper() for w in found]
+        if word[:1].isupper():
+            return [w[:1].upper() + w[1:] for w in found]
+        return found
+
+
+class SpellHighlighter:
+    # Tags unknown words on edited lines with "spelling_error". Fenced code
+    # is skipped, and so are words LanguageTool has already reported.
+    def __init__(self, text_widget, document, checker, syntax_highlighter, match_index):
+        self.text = text_widget
+        self.document = document
+        self.checker = checker
+        self.syntax_highlighter = syntax_highlighter
+        self.match_index = match_index
+        self.dirty = DirtyLines({1})
+
+    def on_edit(self, op, start, end, chars):
+        line = int(start.split(".")[0])
+        if op == "insert":
+            added = chars.count("\n")
+            if added:
+                self.dirty.shift(line, added)
+            self.dirty.update(range(line, line + added + 1))
+        else:
+            removed = int(end.split(".")[0]) - line
+            if removed:
+                self.dirty.shift(line, -removed)
+            self.dirty.add(line)
+
+    def mark_all_dirty(self):
+        line_count = int(self.text.index("end-1c").split(".")[0])
+        self.dirty.reset(range(1, line_count + 1))
+
+    def highlight(self, deadline=None, first=None, last=None):
+        # Same contract as SyntaxHighlighter.highlight
+        if not self.checker.ready or not self.dirty:
+            return False
+        line_count = int(self.text.index("end-1c").split(".")[0])
+        lines = self.document.lines() if len(self.dirty) > FULL_RETOKENIZE_LINES else None
+        visible = None
+        if first is not None:
+            visible = [line for line in range(first, min(last, line_count) + 1) if line in self.dirty]
+        fence_states = self.syntax_highlighter.fence_states
+        line_index = self.document.line_index
+        while True:
+            if visible is None:
+                line = self.dirty.pop()
+            elif visible:
+                line = visible.pop(0)
+                self.dirty.discard(line)
+            else:
+                line = None
+            if line is None:
+                break
+            if line > line_count:
+                continue
+            text = lines[line - 1] if lines is not None else self.text.get(f"{line}.0", f"{line}.end")
+            self.text.tag_remove("spelling_error", f"{line}.0", f"{line}.end")
+            in_code = line <= len(fence_states) and fence_states[line - 1] is not None
+            if not in_code and not FENCE_RE.match(text):
+                line_start = line_index.line_start(line - 1) if self.match_index.matches else 0
+                for start, end in self.checker.misspelled(text):
+                    if self.match_index.matches and self.match_index.find(line_start + start):
+                        continue
+                    self.text.tag_add("spelling_error", f"{line}.{start}", f"{line}.{end}")
+            if deadline is not None and time.perf_counter() > deadline:
+                return bool(self.dirty) if visible is None else bool(visible)
+        return bool(self.dirty) if visible is None else False
+
+
+def count_syllables(word):
+    word = word.lower().strip(".,;:!?\"'()[]*_`")
+    if not word:
+        return 0
+    syllables = len(VOWEL_GROUP_RE.findall(word))
+    if word.endswith("e") and syllables > 1 and not word.endswith("le"):
+        syllables -= 1
+    return max(1, syllables)
+
+
+def paragraph_readability(paragraph):
+    # (sentences, words, syllables) for the Flesch reading ease score
+    words = paragraph.split()
+    sentences = max(1, len(SENTENCE_END_RE.findall(paragraph)))
+    return sentences, len(words), sum(count_syllables(word) for word in words)
+
+
+class DocumentStats:
+    # Word, paragraph, heading and readability counts kept per line and
+    # updated from edit deltas; only lines touched since the last refresh are
+    # re-read, and only the paragraphs holding them are summed again.
+    def __init__(self, text_widget, document):
+        self.text = text_widget
+        self.document = document
+        # words, blank, heading, paragraph start, sentence ends, syllables,
+        # and on a paragraph's first line 1 if the paragraph has no sentence end
+        self.lines = [[0, True, False, False, 0, 0, 0]]
+        self.words = 0
+        self.headings = 0
+        self.paragraphs = 0
+        self.sentences = 0  # Paragraphs count as at least one sentence
+        self.syllables = 0
+        self.dirty = DirtyLines({0})
+        self.touched = set()  # Lines re-read since their paragraphs were summed
+
+    def on_edit(self, op, start, end, chars):
+        line = int(start.split(".")[0]) - 1
+        if op == "insert":
+            added = chars.count("\n")
+            if added:
+                self.lines[line + 1:line + 1] = [[0, True, False, False, 0, 0, 0] for _ in range(added)]
+                self.dirty.shift(line, added)
+                self.touched = shift_lines(self.touched, line, added)
+            self.dirty.update(range(line, line + added + 2))
+        else:
+            removed = int(end.split(".")[0]) - 1 - line
+            for record in self.lines[line + 1:line + 1 + removed]:
+                self._add(record, -1)
+            del self.lines[line + 1:line + 1 + removed]
+            if removed:
+                self.dirty.shift(line, -removed)
+                self.touched = shift_lines(self.touched, line, -removed)
+            self.dirty.update((line, line + 1))
+
+    def _add(self, record, sign):
+        self.words += sign * record[0]
+        self.headings += sign * record[2]
+        self.paragraphs += sign * record[3]
+        self.sentences += sign * (record[4] + record[6])
+        self.syllables += sign * record[5]
+
+    def refresh(self, deadline=None):
+        # Returns True if the deadline passed before every dirty line was read
+        if not self.dirty:
+            return False
+        lines = self.document.lines() if len(self.dirty) > FULL_RETOKENIZE_LINES else None
+        while True:
+            line = self.dirty.pop()
+            if line is None:
+                break
+            if line >= len(self.lines):
+                continue
+            text = lines[line] if lines is not None else self.text.get(f"{line + 1}.0", f"{line + 1}.end")
+            record = self.lines[line]
+            self._add(record, -1)
+            words = text.split()
+            record[0] = len(words)
+            record[1] = not text.strip()
+            record[2] = bool(HEADER_RE.match(text))
+            previous_blank = line == 0 or self.lines[line - 1][1]
+            record[3] = not record[1] and previous_blank
+            record[4] = len(SENTENCE_END_RE.findall(text))
+            record[5] = sum(count_syllables(word) for word in words)
+            record[6] = 0
+            self._add(record, 1)
+            self.touched.add(line)
+            if deadline is not None and time.perf_counter() > deadline:
+                if self.dirty:
+                    return True
+        self.sum_touched_paragraphs()
+        return False
+
+    def sum_touched_paragraphs(self):
+        # Sentence ends are summed again for every paragraph that holds, or
+        # borders, a re-read line; one without any still counts as a sentence
+        lines = self.lines
+        covered = 0  # Lines before this belong to paragraphs already summed
+        for touched in sorted(self.touched):
+            for line in range(max(touched - 1, covered), min(touched + 2, len(lines))):
+                if line < covered or lines[line][1]:
+                    continue
+                start = line
+                while not lines[start][3]:
+                    start -= 1
+                ends = 0
+                covered = start
+                while covered < len(lines) and not lines[covered][1]:
+                    ends += lines[covered][4]
+                    covered += 1
+                self._add(lines[start], -1)
+                lines[start][6] = int(ends == 0)
+                self._add(lines[start], 1)
+        self.touched = set()
+
+    def reading_time(self):
+        return max(1, self.words // WORDS_PER_MINUTE) if self.words > 0 else 0
+
+    def flesch_reading_ease(self):
+        if not self.words:
+            return None
+        return 206.835 - 1.015 * (self.words / self.sentences) - 84.6 * (self.syllables / self.words)
+
+
+class PreviewRenderer:
+    def __init__(self, cache_size=2048):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # block hash -> rendered html
+        self.seconds_per_char = 1e-6  # Running average of conversion cost
+        self._md = None
+
+    def _markdown(self):
+        if self._md is None:
+            import markdown
+            self._md = markdown.Markdown()
+        return self._md
+
+    def cache_key(self, block, references):
+        return hashlib.sha1(f"{block}\0{references}".encode("utf-8")).hexdigest()
+
+    def estimate(self, block, references=""):
+        # Expected seconds for render_block; nothing if the block is cached
+        if self.cache_key(block, references) in self.cache:
+            return 0
+        return (len(block) + len(references)) * self.seconds_per_char
+
+    def render_block(self, block, references=""):
+        key = self.cache_key(block, references)
+        html = self.cache.get(key)
+        if html is None:
+            source = f"{block}\n\n{references}" if references else block
+            started = time.perf_counter()
+            html = self._markdown().reset().convert(source)
+            if source:
+                cost = (time.perf_counter() - started) / len(source)
+                self.seconds_per_char += (cost - self.seconds_per_char) / 8
+            self.cache[key] = html
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return html
+
+    def render_blocks(self, blocks, references=""):
+        # Blocks of nothing but link definitions render empty
+        return "\n".join(html for html in (self.render_block(block, references) for block in blocks) if html)
+
+
+def parse_tags(tags):
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return [tag.strip() for tag in tags if tag.strip()]
+
+
+def build_post_payload(title, markdown_text, tags="", canonical_url="", publish_status="draft",
+                       license="all-rights-reserved", notify_followers=False, image_url=None, subtitle=""):
+    # Shared by the Post button and the headless publisher
+    markdown_text = markdown_text.strip()
+    if image_url:
+        # Insert image at the top of the content
+        markdown_text = f"![Featured Image]({image_url})\n\n" + markdown_text
+    if subtitle:
+        markdown_text = f"## {subtitle.strip()}\n\n" + markdown_text
+    tags = parse_tags(tags)
+    return {
+        "title": title,
+        "contentFormat": "markdown",
+        "content": markdown_text,
+        "tags": tags if tags else [],
+        "canonicalUrl": canonical_url if canonical_url else "",
+        "publishStatus": publish_status,
+        "license": license,
+        "notifyFollowers": notify_followers,
+    }
+
+
+def medium_headers(token):
+    return {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+    }
+
+
+def retry_delay(attempt, response=None, base_delay=1.0, max_delay=60.0):
+    # Honour Retry-After when the server sends one, otherwise back off
+    # exponentially with full jitter
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(max_delay, float(retry_after))
+            except ValueError:
+                pass
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def request_with_backoff(session, method, url, max_retries=PUBLISH_MAX_RETRIES, base_delay=1.0, **kwargs):
+    import requests
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+            time.sleep(retry_delay(attempt, base_delay=base_delay))
+            continue
+        if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+            return response
+        time.sleep(retry_delay(attempt, response, base_delay=base_delay))
+
+
+class NetworkClient:
+    # One keep-alive session per host, default connect/read timeouts and
+    # retries with jittered backoff for every API call the app makes.
+    # submit() runs work on a small thread pool and hands the outcome to
+    # `deliver`, which the GUI points at its thread-safe callback queue.
+    def __init__(self, connect_timeout=NETWORK_CONNECT_TIMEOUT, read_timeout=NETWORK_READ_TIMEOUT,
+                 max_retries=NETWORK_MAX_RETRIES, base_delay=1.0, workers=NETWORK_WORKERS, deliver=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.workers = workers
+        self.deliver = deliver or (lambda callback, *args: callback(*args))
+        self.sessions = {}
+        self.user_ids = {}  # token hash -> Medium user id
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def session(self, url):
+        from urllib.parse import urlsplit
+        host = urlsplit(url).netloc
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(self.workers, 10))
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[host] = session
+        return session
+
+    def request(self, method, url, max_retries=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if max_retries is None:
+            max_retries = self.max_retries
+        return request_with_backoff(self.session(url), method, url, max_retries=max_retries,
+                                    base_delay=self.base_delay, **kwargs)
+
+    def submit(self, fn, *args, on_success=None, on_error=None):
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="network")
+        return deliver_result(self.executor.submit(fn, *args), self.deliver, on_success, on_error)
+
+    def get_user_id(self, token, api_base=MEDIUM_API_BASE):
+        key = account_key(token, api_base)
+        with self.lock:
+            user_id = self.user_ids.get(key)
+        if user_id:
+            return user_id
+        response = self.request("GET", f"{api_base}/v1/me", headers=medium_headers(token))
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to get user ID. Status code: {response.status_code}\n{response.text}")
+        user_id = response.json()["data"]["id"]
+        with self.lock:
+            self.user_ids[key] = user_id
+        return user_id
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        for session in self.sessions.values():
+            session.close()
+
+
+def upload_image_to_imgur(client, image_path, data=None):
+    # Imgur authenticated upload API
+    url = "https://api.imgur.com/3/image"
+    headers = {
+        "Authorization": f"Client-ID {IMGUR_CLIENT_ID}",
+    }
+    if data is None:
+        with open(image_path, "rb") as image_file:
+            data = image_file.read()
+    files = {'image': (os.path.basename(image_path), data)}
+    response = client.request("POST", url, headers=headers, files=files)
+    if response.status_code == 200:
+        data = response.json()
+        return data["data"]["link"]
+    return None
+
+
+def prepare_image(path, max_width=IMAGE_MAX_WIDTH, quality=IMAGE_JPEG_QUALITY):
+    # Runs in a worker process: scale down to the display width and
+    # recompress. Without Pillow, for animated GIFs, and for anything Pillow
+    # cannot read (SVG, a truncated file) the file is sent as is.
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+    import io
+    try:
+        # UnidentifiedImageError is an OSError, as are decoding errors
+        with Image.open(io.BytesIO(data)) as image:
+            if getattr(image, "is_animated", False):
+                return data
+            if image.width > max_width:
+                image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+            output = io.BytesIO()
+            if image.mode in ("RGBA", "LA", "P"):
+                image.save(output, "PNG", optimize=True)
+            else:
+                image.convert("RGB").save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+    except OSError:
+        return data
+    return data if len(output.getvalue()) >= len(data) else output.getvalue()
+
+
+def is_local_image(target):
+    return not re.match(r'^(https?|data):', target, re.IGNORECASE)
+
+
+def local_image_path(target, base_dir):
+    target = target.strip("<>")
+    if target.lower().startswith("file://"):
+        target = target[len("file://"):]
+    from urllib.parse import unquote
+    target = unquote(target)
+    return os.path.normpath(os.path.join(base_dir or os.getcwd(), os.path.expanduser(target)))
+
+
+class ImagePipeline:
+    # Uploads every local image a post references. Files are hashed, images
+    # whose hash is already in the persistent cache reuse their hosted URL,
+    # the rest are recompressed in a process pool and uploaded concurrently,
+    # then the markdown links are rewritten to the hosted URLs.
+    def __init__(self, client, cache_path=IMAGE_CACHE_PATH, max_width=IMAGE_MAX_WIDTH,
+                 upload=upload_image_to_imgur, concurrency=IMAGE_UPLOAD_CONCURRENCY):
+        self.client = client
+        self.cache_path = cache_path
+        self.max_width = max_width
+        self.upload = upload
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.cache = None
+
+    def _load_cache(self):
+        if self.cache is None:
+            self.cache = {}
+            if os.path.exists(self.cache_path):
+                try:
+                    with open(self.cache_path, "r", encoding="utf-8") as f:
+                        self.cache = json.load(f)
+                except (OSError, ValueError):
+                    self.cache = {}
+        return self.cache
+
+    def _save_cache(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        atomic_write(self.cache_path, json.dumps(self.cache, indent=1, sort_keys=True))
+
+    def _hash(self, path):
+        digest = hashlib.sha256(f"{self.max_width}\0".encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def upload_all(self, paths):
+        # Returns {path: hosted url}
+        from concurrent.futures import ThreadPoolExecutor
+        paths = sorted(set(paths))
+        if not paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as threads:
+            hashes = dict(zip(paths, threads.map(self._hash, paths)))
+            with self.lock:
+                cache = self._load_cache()
+                urls = {path: cache[key] for path, key in hashes.items() if key in cache}
+            missing = [path for path in paths if path not in urls]
+            if not missing:
+                return urls
+            with ProcessPoolExecutor(max_workers=min(len(missing), os.cpu_count() or 1),
+                                     mp_context=multiprocessing.get_context("spawn")) as processes:
+                prepared = processes.map(prepare_image, missing, [self.max_width] * len(missing))
+                uploads = [threads.submit(self.upload, self.client, path, data)
+                           for path, data in zip(missing, prepared)]
+            for path, upload in zip(missing, uploads):
+                url = upload.result()
+                if not url:
+                    raise RuntimeError(f"Failed to upload image: {path}")
+                urls[path] = url
+        with self.lock:
+            cache = self._load_cache()
+            for path in missing:
+                cache[hashes[path]] = urls[path]
+            self._save_cache()
+        return urls
+
+    def process(self, markdown_text, base_dir=None, featured_image_path=None):
+        # Returns the rewritten markdown and the featured image URL (if any)
+        paths = {}
+        for match in MARKDOWN_IMAGE_RE.finditer(markdown_text):
+            if is_local_image(match.group(2)):
+                path = local_image_path(match.group(2), base_dir)
+                if os.path.isfile(path):
+                    paths[match.group(2)] = path
+        if featured_image_path:
+            featured_image_path = os.path.abspath(featured_image_path)
+        urls = self.upload_all(list(paths.values()) + ([featured_image_path] if featured_image_path else []))
+
+        def rewrite(match):
+            path = paths.get(match.group(2))
+            if path is None:
+                return match.group(0)
+            return match.group(1) + urls[path] + match.group(3)
+        markdown_text = MARKDOWN_IMAGE_RE.sub(rewrite, markdown_text)
+        return markdown_text, urls.get(featured_image_path)
+
+
+class PublishError(RuntimeError):
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+        self.status_code = response.status_code if response is not None else None
+
+
+class PublishUncertain(PublishError):
+    # The create call failed after it was sent, so the post may exist anyway
+    pass
+
+
+def publish_post(client, token, user_id, data, api_base=MEDIUM_API_BASE, max_retries=None):
+    headers = medium_headers(token)
+    headers["Content-Type"] = "application/json"
+    response = client.request("POST", f"{api_base}/v1/users/{user_id}/posts", max_retries=max_retries,
+                              headers=headers, json=data)
+    if response.status_code != 201:
+        raise PublishError(f"Failed to publish post. Status code: {response.status_code}\n{response.text}", response)
+    return response.json()["data"]["url"]
+
+
+def connection_refused(error):
+    # True when a request failed before reaching the server (DNS, refused
+    # or timed-out connect), so sending it again cannot duplicate anything
+    import requests
+    from urllib3.exceptions import MaxRetryError, NewConnectionError
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        reason = error.args[0] if error.args else None
+        if isinstance(reason, MaxRetryError):
+            reason = reason.reason
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+def account_key(token, api_base=MEDIUM_API_BASE):
+    return hashlib.sha256(f"{api_base}\0{token}".encode("utf-8")).hexdigest()[:16]
+
+
+def read_markdown_post(path, defaults=None):
+    # Load a post and its metadata: "key: value" front matter, then the
+    # first "# " heading, then the file name for the title
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    post = dict(defaults or {})
+    front_matter = FRONT_MATTER_RE.match(text)
+    if front_matter:
+        for line in front_matter.group(1).splitlines():
+            key, sep, value = line.partition(":")
+            if sep:
+                post[key.strip().lower().replace("-", "_")] = value.strip().strip('"').strip("'")
+        text = text[front_matter.end():]
+    if not post.get("title"):
+        heading = TITLE_HEADING_RE.search(text)
+        post["title"] = heading.group(1) if heading else os.path.splitext(os.path.basename(path))[0]
+    post["content"] = text
+    post["path"] = path
+    return post
+
+
+def format_markdown_post(post):
+    # Inverse of read_markdown_post: front matter for the metadata, then the body
+    lines = ["---"]
+    for key in DRAFT_FIELDS:
+        value = post.get(key)
+        if key == "notify_followers":
+            value = "true" if value and str(value).lower() not in ("0", "false", "no") else ""
+        if value:
+            lines.append(f"{key}: {value}")
+    lines.append("---")
+    return "\n".join(lines) + "\n" + post.get("content", "")
+
+
+def markdown_files(directory):
+    for root, _, names in sorted(os.walk(directory)):
+        for name in sorted(names):
+            if name.lower().endswith((".md", ".markdown")):
+                yield os.path.join(root, name)
+
+
+def collect_posts(sources, defaults=None):
+    # Sources are markdown files, directories of them, or JSON manifests
+    # listing {"path": ..., "title": ..., "tags": ...} entries
+    posts = []
+    for source in sources:
+        if os.path.isdir(source):
+            for path in markdown_files(source):
+                posts.append(read_markdown_post(path, defaults))
+        elif source.lower().endswith(".json"):
+            with open(source, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            base = os.path.dirname(os.path.abspath(source))
+            for entry in manifest:
+                entry = dict(entry)
+                path = os.path.join(base, entry.pop("path"))
+                posts.append(read_markdown_post(path, {**(defaults or {}), **entry}))
+        else:
+            posts.append(read_markdown_post(source, defaults))
+    return posts
+
+
+def source_paths(sources):
+    for source in sources:
+        if os.path.isdir(source):
+            yield from markdown_files(source)
+        else:
+            yield source
+
+
+def payload_digest(post):
+    # Hash of the fields Medium receives, built the same way as the real
+    # payload, so front matter reordering or trailing whitespace is not an edit
+    data = build_post_payload(
+        post.get("title") or "",
+        post.get("content") or "",
+        post.get("tags") or "",
+        post.get("canonical_url") or "",
+        license=post.get("license") or "all-rights-reserved",
+        image_url=post.get("featured_image_url") or post.get("featured_image") or None,
+        subtitle=post.get("subtitle") or "",
+    )
+    fields = {key: data[key] for key in ("title", "content", "tags", "canonicalUrl", "license")}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def hash_post_file(path, defaults=None):
+    # Stat first: a write that lands while the file is read leaves a newer
+    # mtime behind, so the next run reads it again
+    stat = os.stat(path)
+    return path, payload_digest(read_markdown_post(path, defaults)), stat.st_size, stat.st_mtime_ns
+
+
+def plan_sync(paths, manifest, defaults=None, workers=None):
+    # Splits paths into those whose payload differs from the manifest and
+    # those that match. Files whose size and mtime are unchanged since they
+    # were published are not read at all; the rest are hashed, in a process
+    # pool once there are enough of them.
+    settings = hashlib.sha256(json.dumps(defaults or {}, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    unchanged = []
+    to_hash = []
+    for path in paths:
+        entry = manifest.get(path) or {}
+        if entry.get("status") == "published" and entry.get("settings") == settings:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if stat and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+                unchanged.append(path)
+                continue
+        to_hash.append(path)
+    if len(to_hash) >= SYNC_PARALLEL_MIN:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as processes:
+            hashed = list(processes.map(hash_post_file, to_hash, [defaults] * len(to_hash), chunksize=SYNC_HASH_CHUNK))
+    else:
+        hashed = [hash_post_file(path, defaults) for path in to_hash]
+    changed = []
+    for path, digest, size, mtime_ns in hashed:
+        entry = manifest.get(path) or {}
+        state = {"hash": digest, "size": size, "mtime_ns": mtime_ns, "settings": settings}
+        if entry.get("status") == "published" and entry.get("hash") == digest:
+            entry.update(state)  # Touched, not edited: remember the new mtime
+            unchanged.append(path)
+        else:
+            changed.append((path, state))
+    return changed, unchanged
+
+
+def text_delta(base_lines, lines):
+    # Line-level edit script turning base_lines into lines: [start, end]
+    # copies a run of base lines, a string is inserted as is
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(lines[j1:j2]))
+    return ops
+
+
+def apply_delta(base_lines, ops):
+    return "".join(op if isinstance(op, str) else "".join(base_lines[op[0]:op[1]]) for op in ops)
+
+
+def side_by_side_diff(old_text, new_text):
+    # Two aligned columns of (line, tag) for a side-by-side view; the shorter
+    # side of a changed hunk is padded with blank "filler" lines
+    old_lines = old_text.splitlines()
+    new_lines = new_text.splitlines()
+    left = []
+    right = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            left.extend((line, None) for line in old_lines[i1:i2])
+            right.extend((line, None) for line in new_lines[j1:j2])
+            continue
+        left.extend((line, "removed") for line in old_lines[i1:i2])
+        right.extend((line, "added") for line in new_lines[j1:j2])
+        padding = (i2 - i1) - (j2 - j1)
+        if padding > 0:
+            right.extend([("", "filler")] * padding)
+        else:
+            left.extend([("", "filler")] * -padding)
+    return left, right
+
+
+class DraftLibrary:
+    # SQLite store of drafts. Metadata and bodies live in separate tables so
+    # the list view and search never read a body, and an FTS5 index over
+    # title, tags and body answers searches. Each thread gets its own
+    # connection; writes and bulk jobs go through submit(), which runs them
+    # in order on one background thread.
+    def __init__(self, path=DRAFTS_DB_PATH, deliver=None):
+        self.path = path
+        self.deliver = deliver or (lambda callback, *args: callback(*args))
+        self.local = threading.local()
+        self.fts = True
+        self.executor = None
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._create_schema(connection)
+            self.local.connection = connection
+        return connection
+
+    def _create_schema(self, connection):
+        with connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS drafts (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL DEFAULT '',
+                    subtitle TEXT NOT NULL DEFAULT '',
+                    tags TEXT NOT NULL DEFAULT '',
+                    canonical_url TEXT NOT NULL DEFAULT '',
+                    publish_status TEXT NOT NULL DEFAULT 'draft',
+                    license TEXT NOT NULL DEFAULT 'all-rights-reserved',
+                    notify_followers INTEGER NOT NULL DEFAULT 0,
+                    featured_image TEXT NOT NULL DEFAULT '',
+                    featured_image_url TEXT NOT NULL DEFAULT '',
+                    source_path TEXT UNIQUE,
+                    words INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS drafts_updated ON drafts (updated DESC);
+                CREATE TABLE IF NOT EXISTS bodies (
+                    draft_id INTEGER PRIMARY KEY REFERENCES drafts (id) ON DELETE CASCADE,
+                    body TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS revisions (
+                    id INTEGER PRIMARY KEY,
+                    document TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    reason TEXT NOT NULL,
+                    keyframe_id INTEGER,
+                    size INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    data BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS revisions_document ON revisions (document, id);
+            """)
+            try:
+                connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS drafts_fts USING fts5("
+                                   "title, tags, body, tokenize='unicode61 remove_diacritics 2')")
+            except sqlite3.OperationalError:
+                self.fts = False  # SQLite built without FTS5: fall back to LIKE
+
+    def list(self, query="", limit=DRAFT_LIST_LIMIT):
+        columns = "d.id, d.title, d.tags, d.publish_status, d.words, d.updated"
+        connection = self.connection()
+        terms = query.split()
+        if not terms:
+            rows = connection.execute(f"SELECT {columns} FROM drafts d ORDER BY d.updated DESC LIMIT ?", (limit,))
+        elif self.fts:
+            match = " ".join('"%s"*' % term.replace('"', '""') for term in terms)
+            rows = connection.execute(
+                f"SELECT {columns} FROM drafts_fts JOIN drafts d ON d.id = drafts_fts.rowid "
+                "WHERE drafts_fts MATCH ? ORDER BY bm25(drafts_fts, 10.0, 5.0, 1.0) LIMIT ?", (match, limit))
+        else:
+            where = " AND ".join("(d.title LIKE ? OR d.tags LIKE ? OR b.body LIKE ?)" for _ in terms)
+            params = [f"%{term}%" for term in terms for _ in range(3)]
+            rows = connection.execute(
+                f"SELECT {columns} FROM drafts d JOIN bodies b ON b.draft_id = d.id WHERE {where} "
+                "ORDER BY d.updated DESC LIMIT ?", params + [limit])
+        return [dict(row) for row in rows]
+
+    def get(self, draft_id):
+        row = self.connection().execute(
+            "SELECT d.*, b.body FROM drafts d LEFT JOIN bodies b ON b.draft_id = d.id WHERE d.id = ?",
+            (draft_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No draft with id {draft_id}")
+        post = dict(row)
+        post["content"] = post.pop("body") or ""
+        return post
+
+    def _save(self, connection, draft_id, post, source_path=None):
+        content = post.get("content", "")
+        values = {key: post.get(key) or "" for key in DRAFT_FIELDS}
+        values["notify_followers"] = int(bool(values["notify_followers"]) and
+                                         str(values["notify_followers"]).lower() not in ("0", "false", "no"))
+        values["publish_status"] = values["publish_status"] or "draft"
+        values["license"] = values["license"] or "all-rights-reserved"
+        values["words"] = len(content.split())
+        now = time.time()
+        if draft_id is None:
+            values["source_path"] = source_path
+            keys = list(values)
+            cursor = connection.execute(
+                f"INSERT INTO drafts ({', '.join(keys)}, created, updated) VALUES ({', '.join('?' * len(keys))}, ?, ?)",
+                [values[key] for key in keys] + [now, now])
+            draft_id = cursor.lastrowid
+        else:
+            keys = list(values)
+            connection.execute(f"UPDATE drafts SET {', '.join(f'{key} = ?' for key in keys)}, updated = ? WHERE id = ?",
+                               [values[key] for key in keys] + [now, draft_id])
+        connection.execute("INSERT OR REPLACE INTO bodies (draft_id, body) VALUES (?, ?)", (draft_id, content))
+        if self.fts:
+            connection.execute("DELETE FROM drafts_fts WHERE rowid = ?", (draft_id,))
+            connection.execute("INSERT INTO drafts_fts (rowid, title, tags, body) VALUES (?, ?, ?, ?)",
+                               (draft_id, values["title"], values["tags"], content))
+        return draft_id
+
+    def save(self, draft_id, post):
+        connection = self.connection()
+        with connection:
+            return self._save(connection, draft_id, post)
+
+    def delete(self, draft_id):
+        connection = self.connection()
+        with connection:
+            connection.execute("DELETE FROM drafts WHERE id = ?", (draft_id,))
+            connection.execute("DELETE FROM revisions WHERE document = ?", (f"draft:{draft_id}",))
+            if self.fts:
+                connection.execute("DELETE FROM drafts_fts WHERE rowid = ?", (draft_id,))
+
+    def import_directory(self, directory, progress=None):
+        # Re-importing a file updates its draft instead of adding a copy
+        connection = self.connection()
+        count = 0
+        try:
+            for path in markdown_files(directory):
+                path = os.path.abspath(path)
+                post = read_markdown_post(path)
+                if post.get("featured_image") and not re.match(r"[a-z]+://", post["featured_image"]):
+                    post["featured_image"] = os.path.join(os.path.dirname(path), post["featured_image"])
+                existing = connection.execute("SELECT id FROM drafts WHERE source_path = ?", (path,)).fetchone()
+                self._save(connection, existing["id"] if existing else None, post, source_path=path)
+                count += 1
+                if count % DRAFT_IMPORT_BATCH == 0:
+                    connection.commit()
+                    if progress:
+                        progress(count)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        return count
+
+    def export_directory(self, directory, progress=None):
+        # One file per draft, bodies loaded one at a time
+        os.makedirs(directory, exist_ok=True)
+        used = set()
+        ids = [row["id"] for row in self.connection().execute("SELECT id FROM drafts ORDER BY id")]
+        for count, draft_id in enumerate(ids, 1):
+            post = self.get(draft_id)
+            name = re.sub(r"[^a-z0-9]+", "-", post["title"].lower()).strip("-")[:80] or f"draft-{draft_id}"
+            if name in used:
+                name = f"{name}-{draft_id}"
+            used.add(name)
+            atomic_write(os.path.join(directory, name + ".md"), format_markdown_post(post))
+            if progress and count % DRAFT_IMPORT_BATCH == 0:
+                progress(count)
+        return len(ids)
+
+    def add_revision(self, document, text, reason):
+        # Revisions are zlib-compressed line deltas against the document's
+        # latest keyframe, so reading any of them costs one keyframe and one
+        # delta. A new full keyframe is written every REVISION_KEYFRAME_INTERVAL
+        # revisions or once the delta is no longer much smaller than it.
+        connection = self.connection()
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        latest = connection.execute("SELECT id, reason, digest FROM revisions WHERE document = ? ORDER BY id DESC LIMIT 1",
+                                    (document,)).fetchone()
+        if latest and latest["digest"] == digest:
+            if latest["reason"] == "autosave" and reason != "autosave":
+                with connection:
+                    connection.execute("UPDATE revisions SET reason = ? WHERE id = ?", (reason, latest["id"]))
+            return latest["id"]
+        keyframe = connection.execute(
+            "SELECT id, data FROM revisions WHERE document = ? AND keyframe_id IS NULL ORDER BY id DESC LIMIT 1",
+            (document,)).fetchone()
+        keyframe_id = None
+        data = None
+        if keyframe:
+            deltas = connection.execute("SELECT COUNT(*) FROM revisions WHERE keyframe_id = ?",
+                                        (keyframe["id"],)).fetchone()[0]
+            if deltas < REVISION_KEYFRAME_INTERVAL:
+                ops = text_delta(self.keyframe_lines(keyframe["id"], keyframe["data"]), text.splitlines(True))
+                delta = zlib.compress(json.dumps(ops, separators=(",", ":")).encode("utf-8"))
+                if len(delta) <= len(keyframe["data"]) * REVISION_KEYFRAME_RATIO:
+                    keyframe_id = keyframe["id"]
+                    data = delta
+        if data is None:
+            data = zlib.compress(text.encode("utf-8"))
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO revisions (document, created, reason, keyframe_id, size, digest, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", (document, time.time(), reason, keyframe_id, len(text), digest, data))
+        return cursor.lastrowid
+
+    def keyframe_lines(self, keyframe_id, data):
+        # The last keyframe used by this thread stays decoded
+        cached = getattr(self.local, "keyframe", None)
+        if cached is None or cached[0] != keyframe_id:
+            cached = (keyframe_id, zlib.decompress(data).decode("utf-8").splitlines(True))
+            self.local.keyframe = cached
+        return cached[1]
+
+    def revisions(self, document):
+        rows = self.connection().execute(
+            "SELECT id, created, reason, size, keyframe_id IS NULL AS keyframe FROM revisions "
+            "WHERE document = ? ORDER BY id DESC", (document,))
+        return [dict(row) for row in rows]
+
+    def revision_text(self, revision_id):
+        connection = self.connection()
+        row = connection.execute("SELECT keyframe_id, data FROM revisions WHERE id = ?", (revision_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No revision with id {revision_id}")
+        if row["keyframe_id"] is None:
+            return zlib.decompress(row["data"]).decode("utf-8")
+        keyframe = connection.execute("SELECT data FROM revisions WHERE id = ?", (row["keyframe_id"],)).fetchone()
+        ops = json.loads(zlib.decompress(row["data"]).decode("utf-8"))
+        return apply_delta(self.keyframe_lines(row["keyframe_id"], keyframe["data"]), ops)
+
+    def history_size(self, document):
+        row = self.connection().execute(
+            "SELECT COUNT(*) AS revisions, COALESCE(SUM(LENGTH(data)), 0) AS bytes FROM revisions WHERE document = ?",
+            (document,)).fetchone()
+        return row["revisions"], row["bytes"]
+
+    def submit(self, fn, *args, on_success=None, on_error=None):
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="draft-library")
+        return deliver_result(self.executor.submit(fn, *args), self.deliver, on_success, on_error)
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English prose
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, token_budget):
+    # Cut at the last word boundary that fits, marking the cut with "..."
+    chars = token_budget * 4 - 3
+    if chars <= 0:
+        return ""
+    if len(text) <= chars:
+        return text
+    cut = text[:chars]
+    if not text[chars].isspace() and len(cut.split()) > 1:
+        cut = cut.rsplit(None, 1)[0]
+    cut = cut.rstrip()
+    return cut + "..." if cut else ""
+
+
+def summarize_for_prompt(markdown_text, token_budget=METADATA_TOKEN_BUDGET):
+    # Cut an article down to the token budget by keeping, in order of
+    # priority, the headings and opening paragraph, the lead paragraph of
+    # every section and then the first sentence of the remaining paragraphs.
+    markdown_text = markdown_text.strip()
+    if estimate_tokens(markdown_text) <= token_budget:
+        return markdown_text
+    blocks = [block for _, block in split_markdown_blocks(markdown_text) if not FENCE_RE.match(block)]
+    tiers = []
+    after_heading = True
+    seen_paragraph = False
+    for position, block in enumerate(blocks):
+        if HEADER_RE.match(block):
+            tiers.append((0, position, block))
+            after_heading = True
+            continue
+        if not seen_paragraph:
+            tiers.append((0, position, block))
+        elif after_heading:
+            tiers.append((1, position, block))
+        else:
+            first_sentence = SENTENCE_END_RE.split(block, 1)[0].strip()
+            tiers.append((2, position, first_sentence + "." if first_sentence else block))
+        seen_paragraph = True
+        after_heading = False
+    selected = []
+    used = 0
+    skipped = []
+    for tier, position, block in sorted(tiers):
+        cost = estimate_tokens(block) + 1
+        if used + cost > token_budget:
+            skipped.append((position, block))
+            continue
+        selected.append((position, block))
+        used += cost
+    # Whatever is left goes to the beginning of the blocks that did not fit,
+    # so even a post that is one long paragraph yields an excerpt
+    for position, block in skipped:
+        block = truncate_to_tokens(block, token_budget - used - 1)
+        if block:
+            selected.append((position, block))
+            used += estimate_tokens(block) + 1
+    return "\n\n".join(block for _, block in sorted(selected))
+
+
+def parse_metadata(text):
+    metadata = {"title": "", "subtitle": "", "tags": ""}
+    for line in text.splitlines():
+        key, sep, value = line.partition(":")
+        key = key.strip().strip("*").lower()
+        if sep and key in metadata:
+            metadata[key] = value.strip().strip('"')
+    return metadata
+
+
+class MetadataCancelled(Exception):
+    pass
+
+
+class MetadataGenerator:
+    # A single streamed completion returns title, subtitle and tags for
+    # several candidates at once. Responses are cached on disk by content
+    # hash, model and prompt version, so asking again for unchanged content
+    # does not call the API. Time to first token is kept for every request.
+    def __init__(self, cache_path=METADATA_CACHE_PATH, model=OPENAI_MODEL,
+                 token_budget=METADATA_TOKEN_BUDGET, request_timeout=None,
+                 candidates=METADATA_CANDIDATES, latency_log=AI_LATENCY_LOG):
+        self.cache_path = cache_path
+        self.model = model
+        self.token_budget = token_budget
+        self.request_timeout = request_timeout
+        self.candidates = candidates
+        self.latency_log = latency_log
+        self.lock = threading.Lock()
+        self.cache = None
+        self.ttft = deque(maxlen=200)
+
+    def cache_key(self, content):
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return f"{METADATA_PROMPT_VERSION}:{self.model}:{self.token_budget}:{self.candidates}:{content_hash}"
+
+    def cached(self, content):
+        with self.lock:
+            if self.cache is None:
+                self.cache = {}
+                if os.path.exists(self.cache_path):
+                    try:
+                        with open(self.cache_path, "r", encoding="utf-8") as f:
+                            self.cache = json.load(f)
+                    except (OSError, ValueError):
+                        self.cache = {}
+            return self.cache.get(self.cache_key(content))
+
+    def store(self, content, metadata):
+        with self.lock:
+            self.cache[self.cache_key(content)] = metadata
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+            atomic_write(self.cache_path, json.dumps(self.cache, indent=1))
+
+    def prompt(self, content):
+        return METADATA_PROMPT.format(article=summarize_for_prompt(content, self.token_budget))
+
+    def generate(self, content, on_update=None, cancelled=None):
+        # Returns a list of candidate metadata dicts, best first. on_update
+        # receives the partial candidates as tokens arrive; once cancelled()
+        # turns true the stream is dropped and MetadataCancelled is raised.
+        candidates = self.cached(content)
+        if candidates is not None:
+            if on_update:
+                on_update(candidates)
+            return candidates
+        import openai
+        if OPENAI_API_BASE:
+            openai.api_base = OPENAI_API_BASE
+        started = time.perf_counter()
+        first_token = None
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=[
+                {"role": "user", "content": self.prompt(content)}
+            ],
+            max_tokens=120,
+            n=self.candidates,
+            stop=None,
+            temperature=0.7,
+            stream=True,
+            request_timeout=self.request_timeout,
+        )
+        texts = [""] * self.candidates
+        try:
+            for chunk in response:
+                if cancelled and cancelled():
+                    raise MetadataCancelled()
+                changed = False
+                for choice in chunk["choices"]:
+                    token = choice.get("delta", {}).get("content")
+                    if token:
+                        texts[choice["index"]] += token
+                        changed = True
+                if changed:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                        self.record_ttft(first_token - started)
+                    if on_update:
+                        on_update([parse_metadata(text) for text in texts if text])
+        finally:
+            close = getattr(response, "close", None)
+            if close:
+                close()
+        candidates = [parse_metadata(text) for text in texts if text]
+        self.store(content, candidates)
+        return candidates
+
+    def record_ttft(self, seconds):
+        self.ttft.append(seconds)
+        if not self.latency_log:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.latency_log)), exist_ok=True)
+            with open(self.latency_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"event": "openai_time_to_first_token", "model": self.model,
+                                    "seconds": round(seconds, 4), "time": time.time()}) + "\n")
+        except OSError:
+            pass
+
+
+class BatchPublisher:
+    # Publishes many posts over one pooled session with a bounded number of
+    # concurrent uploads. Finished posts are recorded in a progress file so
+    # an interrupted run can be resumed without publishing anything twice.
+    # Each result is appended to a journal next to it first, and the file is
+    # rewritten once at the end, so large runs don't rewrite it per post.
+    # A post whose create call may have reached Medium is recorded as
+    # "uncertain" and is only sent again with retry_uncertain.
+    def __init__(self, token, api_base=MEDIUM_API_BASE, concurrency=PUBLISH_CONCURRENCY,
+                 progress_path=None, max_retries=PUBLISH_MAX_RETRIES, base_delay=1.0, client=None):
+        self.token = token
+        self.api_base = api_base.rstrip("/")
+        self.concurrency = concurrency
+        self.progress_path = progress_path
+        self.max_retries = max_retries
+        self.client = client or NetworkClient(max_retries=max_retries, base_delay=base_delay, workers=concurrency)
+        self.images = ImagePipeline(self.client)
+        self.lock = threading.Lock()
+        self.progress = {}
+        if progress_path and os.path.exists(progress_path):
+            with open(progress_path, "r", encoding="utf-8") as f:
+                self.progress = json.load(f)
+        self.journal_path = progress_path + ".log" if progress_path else None
+        if self.journal_path and os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        path, result = json.loads(line)
+                    except ValueError:
+                        break  # Torn last line from a crash
+                    self.progress[path] = result
+            self.save_progress()
+        self.user_id = None
+
+    def get_user_id(self):
+        self.user_id = self.client.get_user_id(self.token, self.api_base)
+        return self.user_id
+
+    def publish(self, post):
+        base_dir = os.path.dirname(os.path.abspath(post["path"]))
+        featured_image = post.get("featured_image")
+        if featured_image:
+            featured_image = os.path.join(base_dir, featured_image)
+        content, image_url = self.images.process(post["content"], base_dir, featured_image)
+        image_url = post.get("featured_image_url") or image_url
+        data = build_post_payload(
+            post["title"],
+            content,
+            post.get("tags", ""),
+            post.get("canonical_url", ""),
+            post.get("publish_status", "draft"),
+            post.get("license", "all-rights-reserved"),
+            str(post.get("notify_followers", False)).lower() in ("1", "true", "yes"),
+            image_url,
+            post.get("subtitle", ""),
+        )
+        if not data["title"] or not data["content"]:
+            raise RuntimeError("Title and content are required.")
+        # Creating a post is not idempotent: only a refused connection or an
+        # explicit 429/503 proves nothing was stored and may be retried
+        for attempt in range(self.max_retries + 1):
+            try:
+                return publish_post(self.client, self.token, self.user_id, data, self.api_base, max_retries=0)
+            except Exception as e:
+                response = getattr(e, "response", None)
+                status_code = getattr(e, "status_code", None)
+                if connection_refused(e) or status_code in (429, 503):
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(retry_delay(attempt, response, base_delay=self.client.base_delay))
+                elif status_code is not None and status_code < 500:
+                    raise  # Rejected, so nothing was stored
+                else:
+                    # Timed out or failed after sending: the post may exist
+                    raise PublishUncertain(f"{e}\nCheck Medium before retrying.", response) from e
+
+    def record(self, path, **result):
+        with self.lock:
+            self.progress[path] = result
+            if self.journal_path:
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps([path, result]) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def save_progress(self):
+        with self.lock:
+            if not self.progress_path:
+                return
+            atomic_write(self.progress_path, json.dumps(self.progress, indent=2))
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+
+    def run(self, posts, report=print, retry_uncertain=False):
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        if self.user_id is None:
+            self.get_user_id()
+        todo = []
+        failures = 0
+        for post in posts:
+            done = self.progress.get(post["path"], {})
+            # Synced posts carry a payload hash; a changed one goes out again
+            if done.get("hash") != post.get("manifest", {}).get("hash"):
+                todo.append(post)
+            elif done.get("status") == "published":
+                report(f"skipped {post['path']} (already published)")
+            elif done.get("status") == "uncertain" and not retry_uncertain:
+                failures += 1
+                report(f"skipped {post['path']} (may already be published; check Medium, then use --retry-uncertain)")
+            else:
+                todo.append(post)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self.publish, post): post for post in todo}
+            for future in as_completed(futures):
+                path = futures[future]["path"]
+                try:
+                    url = future.result()
+                except PublishUncertain as e:
+                    failures += 1
+                    self.record(path, status="uncertain", error=str(e), **futures[future].get("manifest", {}))
+                    report(f"uncertain {path}: {e}")
+                except Exception as e:
+                    failures += 1
+                    self.record(path, status="failed", error=str(e))
+                    report(f"failed {path}: {e}")
+                else:
+                    self.record(path, status="published", url=url, **futures[future].get("manifest", {}))
+                    report(f"published {path} -> {url}")
+        self.save_progress()
+        return failures
+
+
+class PublishQueue:
+    # Durable publish queue in SQLite, worked by one background thread that
+    # runs up to `concurrency` jobs at a time. Jobs wait for their scheduled
+    # time and for the API token of their account, which is only ever held
+    # in memory. Failures are retried with backoff: connection errors forever
+    # (the network is down), rejections up to PUBLISH_QUEUE_MAX_FAILURES times.
+    #
+    # Medium's API has no idempotency keys, so the create call itself is the
+    # one step that must not be repeated blindly. A job is marked "publishing"
+    # before that call; if the outcome is unknown (timeout after sending,
+    # 5xx, or the app died mid-call) it becomes "uncertain" and waits for the
+    # user to check Medium and then retry or mark it published.
+    def __init__(self, path=PUBLISH_QUEUE_PATH, client=None, images=None, concurrency=PUBLISH_CONCURRENCY,
+                 base_delay=1.0, on_change=None, deliver=None):
+        self.path = path
+        self.client = client or NetworkClient(workers=concurrency)
+        self.images = images or ImagePipeline(self.client)
+        self.concurrency = concurrency
+        self.base_delay = base_delay
+        self.on_change = on_change  # called with (job_id, status, detail)
+        self.deliver = deliver or (lambda callback, *args: callback(*args))
+        self.local = threading.local()
+        self.tokens = {}  # account -> token
+        self.running = set()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.dirty = False  # Set by every wake-up so none is lost between queries
+        self.thread = None
+        self.executor = None
+        self.offline = False
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id INTEGER PRIMARY KEY,
+                        key TEXT NOT NULL UNIQUE,
+                        account TEXT NOT NULL,
+                        api_base TEXT NOT NULL,
+                        title TEXT NOT NULL,
+                        post TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'queued',
+                        publish_at REAL NOT NULL,
+                        next_attempt REAL NOT NULL DEFAULT 0,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        failures INTEGER NOT NULL DEFAULT 0,
+                        error TEXT NOT NULL DEFAULT '',
+                        url TEXT NOT NULL DEFAULT '',
+                        created REAL NOT NULL,
+                        updated REAL NOT NULL
+                    )""")
+                connection.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, publish_at, next_attempt)")
+            self.local.connection = connection
+        return connection
+
+    def set_token(self, token, api_base=MEDIUM_API_BASE):
+        with self.condition:
+            self.tokens[account_key(token, api_base)] = token
+            self._notify()
+
+    def enqueue(self, post, token, api_base=MEDIUM_API_BASE, publish_at=None):
+        # Returns (job id, status of the job reused or None). The key covers
+        # the account and everything sent, so queueing the same post again
+        # while its job is still active (a double click, a re-run) returns
+        # that job, moved to the new time if it has not gone out yet. After
+        # a job is cancelled, failed or published, the post is queued afresh.
+        account = account_key(token, api_base)
+        body = json.dumps(post, sort_keys=True)
+        key = hashlib.sha256(f"{account}\0{body}".encode("utf-8")).hexdigest()
+        now = time.time()
+        connection = self.connection()
+        with connection:
+            row = connection.execute("SELECT id, status FROM jobs WHERE key = ?", (key,)).fetchone()
+            if row is not None and row["status"] in PUBLISH_ACTIVE_STATUSES:
+                job_id, existing = row["id"], row["status"]
+                connection.execute("UPDATE jobs SET publish_at = ?, updated = ? WHERE id = ? AND status = 'queued'",
+                                   (publish_at or now, now, job_id))
+            else:
+                if row is not None:
+                    # The finished job keeps its history under a key of its own
+                    connection.execute("UPDATE jobs SET key = key || ':' || id WHERE id = ?", (row["id"],))
+                job_id = connection.execute(
+                    "INSERT INTO jobs (key, account, api_base, title, post, publish_at, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, account, api_base, post.get("title", ""), body, publish_at or now, now, now)).lastrowid
+                existing = None
+        with self.condition:
+            self.tokens[account] = token
+            self._notify()
+        return job_id, existing
+
+    def jobs(self, limit=DRAFT_LIST_LIMIT):
+        rows = self.connection().execute(
+            "SELECT id, account, title, status, publish_at, next_attempt, attempts, error, url, updated FROM jobs "
+            "ORDER BY status IN ('published', 'cancelled'), publish_at DESC LIMIT ?", (limit,))
+        jobs = [dict(row) for row in rows]
+        for job in jobs:
+            job["has_token"] = job["account"] in self.tokens
+        return jobs
+
+    def counts(self):
+        rows = self.connection().execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status")
+        return {row["status"]: row["count"] for row in rows}
+
+    def _update(self, job_id, status, notify=True, **fields):
+        fields["status"] = status
+        fields["updated"] = time.time()
+        connection = self.connection()
+        with connection:
+            connection.execute(f"UPDATE jobs SET {', '.join(f'{key} = ?' for key in fields)} WHERE id = ?",
+                               list(fields.values()) + [job_id])
+        if notify:
+            self._changed(job_id, status, fields.get("url") or fields.get("error", ""))
+
+    def _changed(self, job_id, status, detail=""):
+        if self.on_change:
+            self.deliver(self.on_change, job_id, status, detail)
+
+    def retry(self, job_id):
+        # Also used to confirm an uncertain job was not published after all
+        self._update(job_id, "queued", next_attempt=0, failures=0, error="")
+        self.wake()
+
+    def cancel(self, job_id):
+        connection = self.connection()
+        with connection:
+            connection.execute("UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? "
+                               "AND status IN ('queued', 'failed', 'uncertain')", (time.time(), job_id))
+        self._changed(job_id, "cancelled")
+
+    def mark_published(self, job_id, url=""):
+        self._update(job_id, "published", url=url, error="")
+
+    def clear_finished(self):
+        connection = self.connection()
+        with connection:
+            connection.execute("DELETE FROM jobs WHERE status IN ('published', 'cancelled')")
+
+    def wake(self):
+        with self.condition:
+            self._notify()
+
+    def _notify(self):
+        # Called with the condition held
+        self.dirty = True
+        self.condition.notify()
+
+    def start(self):
+        # A job left "publishing" by a previous run may or may not exist on Medium
+        connection = self.connection()
+        with connection:
+            connection.execute("UPDATE jobs SET status = 'uncertain', error = ? WHERE status = 'publishing'",
+                               ("Interrupted while publishing; check Medium before retrying.",))
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="publish")
+        self.thread = threading.Thread(target=self._run, name="publish-queue", daemon=True)
+        self.thread.start()
+
+    def stop(self, wait=False):
+        with self.condition:
+            self.stopping = True
+            self._notify()
+        if self.executor:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if self.stopping:
+                    return
+                self.dirty = False
+                free = self.concurrency - len(self.running)
+                accounts = list(self.tokens)
+                running = list(self.running)
+            now = time.time()
+            due = []
+            wait_for = None
+            if free > 0 and accounts:
+                marks = ", ".join("?" * len(accounts))
+                exclude = ", ".join("?" * len(running))
+                connection = self.connection()
+                due = [dict(row) for row in connection.execute(
+                    f"SELECT * FROM jobs WHERE status = 'queued' AND account IN ({marks}) AND id NOT IN ({exclude}) "
+                    "AND publish_at <= ? AND next_attempt <= ? ORDER BY publish_at, id LIMIT ?",
+                    accounts + running + [now, now, free])]
+                upcoming = connection.execute(
+                    f"SELECT MIN(MAX(publish_at, next_attempt)) FROM jobs WHERE status = 'queued' "
+                    f"AND account IN ({marks}) AND id NOT IN ({exclude})", accounts + running).fetchone()[0]
+                if upcoming is not None and not due:
+                    wait_for = max(0.0, upcoming - now)
+            with self.condition:
+                if self.stopping:
+                    return
+                for job in due:
+                    self.running.add(job["id"])
+                    self.executor.submit(self._work, job)
+                if not due and not self.dirty:
+                    self.condition.wait(wait_for)
+
+    def _work(self, job):
+        try:
+            self._publish(job)
+        except Exception as e:
+            # Bookkeeping failed (database locked, disk full). The job keeps
+            # its last recorded status, which start() sorts out next run.
+            self._changed(job["id"], "error", str(e))
+        finally:
+            with self.condition:
+                self.running.discard(job["id"])
+                self._notify()
+
+    def _publish(self, job):
+        with self.condition:
+            token = self.tokens.get(job["account"])
+        if token is None:
+            return
+        post = json.loads(job["post"])
+        attempts = job["attempts"] + 1
+        sent = False
+        try:
+            # Everything before the create call is safe to repeat
+            user_id = self.client.get_user_id(token, job["api_base"])
+            content, image_url = self.images.process(post["content"], post.get("base_dir"),
+                                                     post.get("featured_image") or None)
+            data = build_post_payload(post["title"], content, post.get("tags") or "", post.get("canonical_url") or "",
+                                      post.get("publish_status") or "draft", post.get("license") or "all-rights-reserved",
+                                      bool(post.get("notify_followers")), image_url or post.get("featured_image_url") or None,
+                                      post.get("subtitle") or "")
+            self._update(job["id"], "publishing", notify=False, attempts=attempts)
+            sent = True
+            url = publish_post(self.client, token, user_id, data, job["api_base"], max_retries=0)
+        except Exception as e:
+            self._failed(job, attempts, e, sent)
+            return
+        self._update(job["id"], "published", url=url, error="")
+        self._back_online()
+
+    def _back_online(self):
+        # Jobs backing off because the network was down can go right away
+        if not self.offline:
+            return
+        self.offline = False
+        connection = self.connection()
+        with connection:
+            connection.execute("UPDATE jobs SET next_attempt = 0 WHERE status = 'queued' AND error LIKE 'Offline:%'")
+        self.wake()
+
+    def _failed(self, job, attempts, error, sent):
+        response = getattr(error, "response", None)
+        status_code = getattr(error, "status_code", None)
+        if connection_refused(error):
+            # Offline: keep the job and poll until the network is back
+            self.offline = True
+            delay = retry_delay(attempts, base_delay=self.base_delay, max_delay=PUBLISH_OFFLINE_MAX_DELAY)
+            self._update(job["id"], "queued", attempts=attempts, next_attempt=time.time() + delay,
+                         error=f"Offline: {error}")
+            return
+        self._back_online()
+        if sent and (status_code is None or status_code >= 500) and status_code != 503:
+            # Timed out or failed after sending: the post may exist
+            self._update(job["id"], "uncertain", attempts=attempts, error=f"{error}\nCheck Medium before retrying.")
+            return
+        # Anything before the create call may be repeated; after it only an
+        # explicit "not now" from the server
+        retryable = not sent or status_code in (429, 503)
+        failures = job["failures"] + 1
+        if retryable and failures < PUBLISH_QUEUE_MAX_FAILURES:
+            delay = retry_delay(attempts, response, base_delay=self.base_delay, max_delay=PUBLISH_QUEUE_MAX_DELAY)
+            self._update(job["id"], "queued", attempts=attempts, next_attempt=time.time() + delay,
+                         failures=failures, error=str(error))
+        else:
+            self._update(job["id"], "failed", attempts=attempts, failures=failures, error=str(error))
+
+
+class Metrics:
+    # Rolling latency histograms (milliseconds), counters and gauges. Nothing
+    # is measured until wrap() swaps a timing shim over a method, so the
+    # disabled path costs nothing.
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}  # name -> recent samples
+        self.totals = {}  # name -> [count, sum] since enabled
+        self.counters = {}
+        self.gauges = {}
+        self.wrapped = []
+
+    def observe(self, name, ms):
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+                self.totals[name] = [0, 0.0]
+            samples.append(ms)
+            totals = self.totals[name]
+            totals[0] += 1
+            totals[1] += ms
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def wrap(self, obj, attr, name):
+        method = getattr(obj, attr)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.observe(name, (time.perf_counter() - started) * 1000)
+        setattr(obj, attr, timed)
+        self.wrapped.append((obj, attr))
+
+    def unwrap_all(self):
+        for obj, attr in self.wrapped:
+            delattr(obj, attr)  # The class method shows through again
+        self.wrapped = []
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.totals.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def snapshot(self):
+        with self.lock:
+            histograms = {}
+            for name, samples in self.samples.items():
+                values = sorted(samples)
+                count, total = self.totals[name]
+                histograms[name] = {
+                    "count": count,
+                    "sum": round(total, 3),
+                    "p50": round(values[len(values) // 2], 3),
+                    "p95": round(values[int(len(values) * 0.95)], 3),
+                    "p99": round(values[int(len(values) * 0.99)], 3),
+                    "max": round(values[-1], 3),
+                }
+            return {"histograms_ms": histograms, "counters": dict(self.counters), "gauges": dict(self.gauges)}
+
+    def export(self, format="json"):
+        snapshot = self.snapshot()
+        if format != "prometheus":
+            snapshot["timestamp"] = time.time()
+            return json.dumps(snapshot, indent=2)
+
+        def metric_name(name):
+            return "medium_poster_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+        lines = []
+        for name, h in sorted(snapshot["histograms_ms"].items()):
+            name = metric_name(name) + "_ms"
+            lines.append(f"# TYPE {name} summary")
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                lines.append(f'{name}{{quantile="{quantile}"}} {h[key]}')
+            lines.append(f"{name}_sum {h['sum']}")
+            lines.append(f"{name}_count {h['count']}")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {metric_name(name)}_total counter")
+            lines.append(f"{metric_name(name)}_total {value}")
+        for name, value in sorted(snapshot["gauges"].items()):
+            if value is not None:
+                lines.append(f"# TYPE {metric_name(name)} gauge")
+                lines.append(f"{metric_name(name)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        # Plain-text table for the overlay
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<28}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"]
+        for name, h in sorted(snapshot["histograms_ms"].items()):
+            lines.append(f"{name:<28}{h['count']:>7}{h['p50']:>9.2f}{h['p95']:>9.2f}{h['p99']:>9.2f}{h['max']:>9.2f}")
+        lines.append("")
+        for name, value in sorted(snapshot["counters"].items()) + sorted(snapshot["gauges"].items()):
+            lines.append(f"{name:<28}{value}")
+        return "\n".join(lines)
+
+
+class DocumentTab:
+    # Everything that belongs to one open document: its editor and the edit
+    # listeners fed by it, its grammar matches and autosave journal, the post
+    # fields and the preview window computed for it. While another tab has
+    # focus, the post fields live in `fields` and edits only mark work.
+    def __init__(self, notebook, spell_checker, untitled):
+        self.frame = ttk.Frame(notebook)
+        self.content_text = scrolledtext.ScrolledText(self.frame, wrap=tk.WORD, undo=True, maxundo=UNDO_LIMIT)
+        self.content_text.pack(fill=tk.BOTH, expand=True)
+        self.document = Document()
+        self.line_index = self.document.line_index
+        self.autosave_journal = AutosaveJournal()
+        self.document.add_listener(self.autosave_journal.record)
+        self.match_index = MatchIndex(self.line_index)  # Grammar matches
+
+        # Track edits so highlighting only revisits the lines that changed
+        self.syntax_highlighter = SyntaxHighlighter(self.content_text, self.document)
+        self.edit_hook = EditHook(self.content_text)
+        self.edit_hook.add_listener(self.document.on_edit)
+        self.edit_hook.add_listener(self.match_index.on_edit)
+        self.edit_hook.add_listener(self.syntax_highlighter.on_edit)
+        self.document_stats = DocumentStats(self.content_text, self.document)
+        self.edit_hook.add_listener(self.document_stats.on_edit)
+        self.spell_highlighter = SpellHighlighter(self.content_text, self.document, spell_checker,
+                                                  self.syntax_highlighter, self.match_index)
+        self.edit_hook.add_listener(self.spell_highlighter.on_edit)
+
+        self.untitled = untitled
+        self.fields = dict(TAB_DEFAULT_FIELDS)
+        self.current_file = None
+        self.current_draft_id = None  # Library draft shown in the editor, if any
+        self.last_revision = None  # (document, version) of the latest snapshot sent to the library
+        self.modified = False
+        self.loading = False  # Set while a file streams into the editor
+        self.load_generation = 0
+        self.grammar_version = None  # Document version the grammar matches belong to
+        self.preview_blocks = []  # (start line, markdown) for the whole document
+        self.preview_block_lines = []
+        self.preview_references = ""  # Link definitions of the whole document
+        self.preview_range = None  # (first, last) block indices currently shown
+        self.preview_job = None  # preview_work generator of the pending preview
+        self.last_preview_html = None
+
+    def name(self):
+        if self.current_file:
+            name = os.path.basename(self.current_file)
+        elif self.current_draft_id is not None:
+            name = f"Draft {self.current_draft_id}"
+        else:
+            name = f"Untitled {self.untitled}"
+        return ("*" if self.modified else "") + name
+
+    def close(self):
+        self.load_generation += 1
+        self.autosave_journal.close(discard=True)
+        self.frame.destroy()
 
 
 class MediumPosterApp:
@@ -24,6 +3016,7 @@ class MediumPosterApp:
         self.user_id = None
         self.openai_api_key = tk.StringVar()  # OpenAI API Key
         self.title = tk.StringVar()
+        self.subtitle = tk.StringVar()
         self.tags = tk.StringVar()
         self.canonical_url = tk.StringVar()
         self.publish_status = tk.StringVar(value="draft")
@@ -31,37 +3024,100 @@ class MediumPosterApp:
         self.license = tk.StringVar(value="all-rights-reserved")
         self.featured_image_path = None
         self.featured_image_url = tk.StringVar()
-        self.current_file = None
         self.auto_save_interval = 30000  # Auto-save every 30 seconds
-        self.auto_save_file = f"autosave_{os.getpid()}.md"
-        self.tool = language_tool_python.LanguageTool('en-US')
-        self.grammar_matches = []  # Store grammar matches
+        # One grammar engine, spell checker, renderer and network pool serve every tab
+        self.grammar_scheduler = GrammarScheduler(
+            'en-US', on_failure=lambda error: self.call_soon(self.on_grammar_failed, error))
+        self.spell_checker = SpellChecker()
+        self.tabs = []
+        self.tab = None  # The focused DocumentTab
+        self.untitled_count = 0
 
         # Grammar check debounce variables
         self.grammar_check_queue = queue.Queue()
-        self.grammar_check_thread = None
         self.grammar_check_scheduled = False
-        self.current_content_version = None  # For synchronization
+
+        # Preview rendering (only the blocks around the editor viewport are materialized)
+        self.preview_renderer = PreviewRenderer()
+        self.preview_after_id = None
+        self.preview_scroll_id = None
+        self.preview_sync_until = 0.0  # Preview scroll events before this come from our own updates
 
         # Auto-save ID for cancelling
         self.auto_save_id = None
 
+        # Results from background threads are run on the Tk thread via this queue
+        self.ui_callbacks = queue.Queue()
+        self.network = NetworkClient(deliver=self.call_soon)
+        self.file_writer = FileWriter(deliver=self.call_soon)
+        self.draft_library = DraftLibrary(deliver=self.call_soon)
+        self.library_window = None
+        self.library_search_id = None
+        self.history_window = None
+        self.history_generation = 0
+        self.image_pipeline = ImagePipeline(self.network)
+        self.publish_queue = PublishQueue(client=self.network, images=self.image_pipeline,
+                                          on_change=self.on_publish_event, deliver=self.call_soon)
+        self.publish_snapshots = {}  # job id -> (tab, history key, snapshot) queued this session
+        self.queue_window = None
+        self.queue_refresh_id = None
+        self.queue_status = ""
+        self.metadata_generator = MetadataGenerator(request_timeout=self.network.timeout)
+        self.metadata_request = 0  # Newer requests cancel older streams
+        self.metadata_candidates = None
+
         # Status messages
         self.status_var = tk.StringVar()
         self.status_message = ""
         self.auto_save_message = ""
-        self.update_status_bar()
+        self.grammar_status = "Grammar engine warming up..."
+        self.status_after_id = None
+
+        # Edit-driven work runs in budgeted idle slices, most urgent first
+        self.frame_scheduler = FrameScheduler(self.root)
+        self.frame_scheduler.add_job("highlight_visible", 0, lambda deadline: self.highlight_syntax(deadline, visible_only=True))
+        self.frame_scheduler.add_job("spelling_visible", 0, lambda deadline: self.check_spelling(deadline, visible_only=True))
+        self.frame_scheduler.add_job("preview", 1, lambda deadline: self.preview_step(deadline))
+        self.frame_scheduler.add_job("highlight", 2, lambda deadline: self.highlight_syntax(deadline))
+        self.frame_scheduler.add_job("spelling", 2, lambda deadline: self.check_spelling(deadline))
+        self.frame_scheduler.add_job("status", 3, lambda deadline: self.status_step(deadline))
+        self.frame_scheduler.add_job("grammar", 3, lambda deadline: self.start_grammar_check())
+
+        # Performance instrumentation (off unless enabled)
+        self.metrics = Metrics()
+        self.metrics_enabled = tk.BooleanVar(value=False)
+        self.metrics_probe_id = None
+        self.metrics_export_id = None
+        self.metrics_overlay = None
+        self.metrics_overlay_id = None
 
         # Layout
         self.create_menu()
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_exit)
+        self.update_status_bar()
+        self.root.after(UI_QUEUE_POLL_MS, self.process_ui_callbacks)
+
+        # Heavy backends load in the background once the window is up
+        self.preview_backend_ready = threading.Event()
+        threading.Thread(target=self.preload_preview_backend, daemon=True).start()
+        threading.Thread(target=self.load_spell_checker, daemon=True).start()
+        self.root.after(25, self.finish_preview_setup)
+        self.grammar_scheduler.warm_up(self.on_grammar_engine_ready)
 
         # Start auto-save
         self.schedule_auto_save()
 
+        # Posts queued in earlier sessions wait for the token to be set again
+        self.root.after_idle(self.start_publish_queue)
+
         # Check for auto-save file
         self.check_autosave()
 
+        if METRICS_ENABLED:
+            self.metrics_enabled.set(True)
+            self.toggle_metrics()
+
     def create_widgets(self):
         # API Token Frame
         token_frame = ttk.Frame(self.root)
@@ -83,9 +3139,17 @@ class MediumPosterApp:
         title_frame.pack(fill=tk.X, padx=10, pady=5)
 
         ttk.Label(title_frame, text="Title:").pack(side=tk.LEFT)
-        ttk.Entry(title_frame, textvariable=self.title).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.title_entry = ttk.Combobox(title_frame, textvariable=self.title)  # Generated candidates in the dropdown
+        self.title_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
         ttk.Button(title_frame, text="Generate Title", command=self.generate_title).pack(side=tk.LEFT)
 
+        # Subtitle Frame
+        subtitle_frame = ttk.Frame(self.root)
+        subtitle_frame.pack(fill=tk.X, padx=10, pady=5)
+
+        ttk.Label(subtitle_frame, text="Subtitle:").pack(side=tk.LEFT)
+        ttk.Entry(subtitle_frame, textvariable=self.subtitle).pack(side=tk.LEFT, fill=tk.X, expand=True)
+
         # Tags Frame with Suggest Button
         tags_frame = ttk.Frame(self.root)
         tags_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -160,23 +3224,24 @@ class MediumPosterApp:
         content_frame = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
         content_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
-        # Rich Text Editor with Syntax Highlighting
-        self.content_text = scrolledtext.ScrolledText(content_frame, wrap=tk.WORD, undo=True)
-        self.content_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.content_text.bind("<<Modified>>", self.on_content_modified)
-        self.content_text.bind("<Button-3>", self.show_suggestions)  # Right-click for suggestions
-        content_frame.add(self.content_text)
+        # One editor per tab; the preview beside them follows the focused tab
+        self.content_pane = content_frame
+        self.preview_html = None
+        self.notebook = ttk.Notebook(content_frame)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        content_frame.add(self.notebook)
+        self.add_tab()
 
-        # Preview Frame
-        self.preview_html = HTMLLabel(content_frame, html="<p>Preview will appear here</p>")
-        self.preview_html.pack(fill=tk.BOTH, expand=True)
-        content_frame.add(self.preview_html)
+        # Preview Frame (the HTML widget replaces this placeholder once tkhtmlview is loaded)
+        self.preview_placeholder = ttk.Label(content_frame, text="Loading preview...", anchor="center")
+        content_frame.add(self.preview_placeholder)
 
         # Buttons Frame
         buttons_frame = ttk.Frame(self.root)
         buttons_frame.pack(fill=tk.X, padx=10, pady=5)
 
         ttk.Button(buttons_frame, text="Post to Medium", command=self.post_to_medium).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Schedule...", command=self.schedule_post).pack(side=tk.LEFT)
         ttk.Label(buttons_frame, text="Auto-save interval (sec):").pack(side=tk.LEFT)
         self.auto_save_entry = ttk.Entry(buttons_frame, width=5)
         self.auto_save_entry.insert(0, str(self.auto_save_interval // 1000))
@@ -197,17 +3262,34 @@ class MediumPosterApp:
         # File menu
         file_menu = tk.Menu(menu_bar, tearoff=0)
         menu_bar.add_cascade(label="File", menu=file_menu)
-        file_menu.add_command(label="New", command=self.new_file, accelerator="Ctrl+N")
+        file_menu.add_command(label="New Tab", command=self.new_file, accelerator="Ctrl+N")
         file_menu.add_command(label="Open...", command=self.open_file, accelerator="Ctrl+O")
         file_menu.add_command(label="Save", command=self.save_file, accelerator="Ctrl+S")
         file_menu.add_command(label="Save As...", command=self.save_file_as)
+        file_menu.add_command(label="Close Tab", command=self.close_tab, accelerator="Ctrl+W")
+        file_menu.add_separator()
+        file_menu.add_command(label="Save to Library", command=self.save_to_library, accelerator="Ctrl+Shift+S")
+        file_menu.add_command(label="Draft Library...", command=self.show_library, accelerator="Ctrl+L")
+        file_menu.add_command(label="Revision History...", command=self.show_history)
+        file_menu.add_command(label="Publish Queue...", command=self.show_queue)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.on_exit)
 
+        # View menu
+        view_menu = tk.Menu(menu_bar, tearoff=0)
+        menu_bar.add_cascade(label="View", menu=view_menu)
+        view_menu.add_checkbutton(label="Collect Performance Metrics", variable=self.metrics_enabled,
+                                  command=self.toggle_metrics)
+        view_menu.add_command(label="Performance Overlay", command=self.show_metrics_overlay)
+        view_menu.add_command(label="Retry Grammar Check", command=self.retry_grammar_check)
+
         # Bind shortcuts
         self.root.bind('<Control-n>', self.new_file)
         self.root.bind('<Control-o>', self.open_file)
         self.root.bind('<Control-s>', self.save_file)
+        self.root.bind('<Control-w>', self.close_tab)
+        self.root.bind('<Control-S>', self.save_to_library)
+        self.root.bind('<Control-l>', self.show_library)
 
     def select_featured_image(self):
         filetypes = [
@@ -223,28 +3305,241 @@ class MediumPosterApp:
             # Reset featured image URL
             self.featured_image_url.set("")
 
-    def on_content_modified(self, event=None):
-        self.content_text.edit_modified(0)
-        self.preview_content()
-        self.highlight_syntax()
-        self.current_content_version = time.time()  # Update content version
+    def on_content_modified(self, event=None, tab=None):
+        tab = tab or self.tab
+        tab.content_text.edit_modified(0)
+        if tab.loading:
+            return  # finish_loading runs the pipelines once for the whole file
+        if not tab.modified:
+            tab.modified = True
+            self.update_tab_name(tab)
+        if tab is not self.tab:
+            return  # Background tabs catch up when they get focus
+        # Only marks work; the frame scheduler does it once the key is handled
+        self.frame_scheduler.request("highlight_visible", "spelling_visible", "highlight", "spelling")
+        self.schedule_preview()
+        self.request_status_update()
+        self.debounce_grammar_check()
+
+    def load_spell_checker(self):
+        self.spell_checker.load()
+        self.call_soon(self.on_spell_checker_ready)
+
+    def on_spell_checker_ready(self):
+        for tab in self.tabs:
+            tab.spell_highlighter.mark_all_dirty()
+        self.frame_scheduler.request("spelling_visible", "spelling")
+
+    def preload_preview_backend(self):
+        for module in ("markdown", "tkhtmlview"):
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+        self.preview_backend_ready.set()
+
+    def finish_preview_setup(self):
+        if not self.preview_backend_ready.is_set():
+            self.root.after(25, self.finish_preview_setup)
+            return
+        from tkhtmlview import HTMLLabel
+        self.preview_html = HTMLLabel(self.content_pane, html="<p>Preview will appear here</p>")
+        self.content_pane.forget(self.preview_placeholder)
+        self.preview_placeholder.destroy()
+        self.content_pane.add(self.preview_html)
+        self.preview_html.config(yscrollcommand=self.on_preview_scroll)
+        if self.tab.document.snapshot().text:
+            self.preview_content()
+
+    def call_soon(self, callback, *args):
+        # Safe to call from any thread
+        self.ui_callbacks.put((callback, args))
+
+    def process_ui_callbacks(self):
+        while True:
+            try:
+                callback, args = self.ui_callbacks.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                self.status_message = f"Error: {str(e)}"
+        self.root.after(UI_QUEUE_POLL_MS, self.process_ui_callbacks)
+
+    def on_grammar_engine_ready(self, error):
+        if error is None:
+            self.grammar_status = "Grammar engine ready"
+        else:
+            self.grammar_status = f"Grammar engine unavailable: {error} (View > Retry Grammar Check)"
+        self.call_soon(self.update_status_bar)
+
+    def on_grammar_failed(self, error):
+        self.grammar_status = f"Grammar check stopped: {error} (View > Retry Grammar Check)"
+        self.update_status_bar()
+
+    def retry_grammar_check(self):
+        self.grammar_scheduler.retry()
+        self.grammar_status = "Grammar engine warming up..."
+        self.update_status_bar()
+        self.grammar_scheduler.warm_up(self.on_grammar_engine_ready)
         self.debounce_grammar_check()
 
+    def schedule_preview(self):
+        # Collapse bursts of keystrokes into a single render
+        if self.preview_after_id:
+            self.root.after_cancel(self.preview_after_id)
+        self.preview_after_id = self.root.after(PREVIEW_DEBOUNCE_MS, self.request_preview)
+
+    def request_preview(self):
+        self.preview_after_id = None
+        self.tab.preview_job = None  # Restart from the current text
+        self.frame_scheduler.request("preview")
+
+    def preview_step(self, deadline):
+        # Runs the preview job a slice at a time. A slice that is not expected
+        # to fit in what is left of the frame waits for the next one, where it
+        # runs first, so a single large block cannot overrun the budget.
+        if self.preview_html is None:
+            return False
+        if self.tab.preview_job is None:
+            self.tab.preview_job = self.preview_work()
+        for cost in self.tab.preview_job:
+            if time.perf_counter() + cost > deadline:
+                return True
+        self.tab.preview_job = None
+        self.render_preview_window(force=True)
+        return False
+
+    def preview_work(self):
+        # Splits the text into blocks, then renders the uncached blocks of the
+        # new window; yields the expected cost of each slice before doing it
+        text = self.tab.document.snapshot().text
+        lines = text.split("\n")
+        yield 0
+        closing = closed_fences(lines)
+        blocks = self.preview_header_blocks()
+        references = []
+        for line, block in iter_markdown_blocks(lines, closing):
+            yield 0
+            blocks.extend(split_oversized_block(line, block))
+            if "]:" in block:
+                references.append(markdown_references(block))
+        self.set_preview_blocks(blocks, "\n".join(reference for reference in references if reference))
+        first, last = self.preview_window_range()
+        for _, block in self.tab.preview_blocks[first:last]:
+            yield self.preview_renderer.estimate(block, self.tab.preview_references)
+            self.preview_renderer.render_block(block, self.tab.preview_references)
+
     def preview_content(self):
-        markdown_text = self.content_text.get("1.0", tk.END)
+        if self.preview_after_id:
+            self.root.after_cancel(self.preview_after_id)
+            self.preview_after_id = None
+        self.frame_scheduler.cancel("preview")
+        self.tab.preview_job = None
+        if self.preview_html is None:
+            return  # Rendered by finish_preview_setup once the widget exists
+        self.update_preview_blocks()
+        self.render_preview_window(force=True)
+
+    def update_preview_blocks(self):
+        text = self.tab.document.snapshot().text
+        blocks = self.preview_header_blocks()
+        blocks.extend(piece for line, block in split_markdown_blocks(text) for piece in split_oversized_block(line, block))
+        self.set_preview_blocks(blocks, markdown_references(text))
+
+    def preview_header_blocks(self):
         # If featured image URL is provided, insert it into the content
-        image_markdown = ""
+        image_url = None
         if self.featured_image_url.get():
             image_url = self.featured_image_url.get()
-            image_markdown = f"![Featured Image]({image_url})\n\n"
         elif self.featured_image_path:
             image_url = f"file://{self.featured_image_path}"
-            image_markdown = f"![Featured Image]({image_url})\n\n"
+        if image_url:
+            return [(0, f"![Featured Image]({image_url})")]
+        return []
+
+    def set_preview_blocks(self, blocks, references):
+        self.tab.preview_blocks = blocks
+        self.tab.preview_block_lines = [line for line, _ in blocks]
+        self.tab.preview_references = references
+
+    def visible_editor_lines(self):
+        # First and last 0-based line shown in the editor
+        top = int(self.tab.content_text.index("@0,0").split(".")[0]) - 1
+        bottom = int(self.tab.content_text.index(f"@0,{self.tab.content_text.winfo_height()}").split(".")[0]) - 1
+        return top, bottom
+
+    def visible_blocks(self):
+        lines = self.tab.preview_block_lines
+        top, bottom = self.visible_editor_lines()
+        top_block = max(0, bisect_right(lines, top) - 1)
+        return top_block, max(top_block, bisect_right(lines, bottom) - 1)
+
+    def preview_window_range(self):
+        top_block, bottom_block = self.visible_blocks()
+        return (max(0, top_block - PREVIEW_MARGIN_BLOCKS),
+                min(len(self.tab.preview_block_lines), bottom_block + PREVIEW_MARGIN_BLOCKS + 1))
+
+    def render_preview_window(self, force=False):
+        # Materialize only the blocks around the editor viewport. Scrolling
+        # re-renders once the viewport gets within half a margin of the edge.
+        if not force and self.tab.preview_range:
+            top_block, bottom_block = self.visible_blocks()
+            first, last = self.tab.preview_range
+            slack = PREVIEW_MARGIN_BLOCKS // 2
+            if ((first == 0 or top_block - first >= slack)
+                    and (last >= len(self.tab.preview_block_lines) or last - bottom_block > slack)):
+                self.sync_preview_scroll()
+                return
+        first, last = self.preview_window_range()
+        self.tab.preview_range = (first, last)
+        html = self.preview_renderer.render_blocks([block for _, block in self.tab.preview_blocks[first:last]],
+                                                   self.tab.preview_references)
+        if html != self.tab.last_preview_html:
+            self.tab.last_preview_html = html
+            self.preview_sync_until = time.perf_counter() + PREVIEW_SCROLL_DELAY_MS * 5 / 1000
+            self.preview_html.set_html(html)
+        self.sync_preview_scroll()
 
-        markdown_text = image_markdown + markdown_text
+    def preview_window_lines(self):
+        first, last = self.tab.preview_range
+        lines = self.tab.preview_block_lines
+        start = lines[first] if first < len(lines) else 0
+        end = lines[last] if last < len(lines) else self.tab.line_index.line_count()
+        return start, max(end, start + 1)
 
-        html = markdown.markdown(markdown_text)
-        self.preview_html.set_html(html)
+    def sync_preview_scroll(self):
+        # Block-to-line map: place the preview at the same relative position
+        # inside the rendered window as the editor's first visible line
+        if not self.tab.preview_range:
+            return
+        start, end = self.preview_window_lines()
+        top, _ = self.visible_editor_lines()
+        fraction = min(1.0, max(0.0, (top - start) / (end - start)))
+        self.preview_sync_until = max(self.preview_sync_until, time.perf_counter() + PREVIEW_SCROLL_DELAY_MS / 1000)
+        self.preview_html.yview_moveto(fraction)
+
+    def on_editor_scroll(self, first, last, tab=None):
+        tab = tab or self.tab
+        tab.content_text.vbar.set(first, last)
+        if tab is self.tab and self.preview_scroll_id is None:
+            self.preview_scroll_id = self.root.after(PREVIEW_SCROLL_DELAY_MS, self.on_editor_viewport_changed)
+
+    def on_editor_viewport_changed(self):
+        self.preview_scroll_id = None
+        if self.preview_html is not None and self.tab.preview_range:
+            self.render_preview_window()
+
+    def on_preview_scroll(self, first, last):
+        self.preview_html.vbar.set(first, last)
+        if time.perf_counter() < self.preview_sync_until or not self.tab.preview_range:
+            return  # Caused by set_html / sync_preview_scroll, not the user
+        # The user scrolled the preview: move the editor, which in turn
+        # shifts the rendered window when the viewport nears its edge
+        start, end = self.preview_window_lines()
+        line = start + int(float(first) * (end - start))
+        self.tab.content_text.yview(f"{line + 1}.0")
 
     def get_user_id(self):
         token = self.api_token.get()
@@ -252,154 +3547,403 @@ class MediumPosterApp:
             messagebox.showwarning("Token Required", "Please enter your Medium API token.")
             return
 
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/json",
-        }
-
-        response = requests.get("https://api.medium.com/v1/me", headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            self.user_id = data["data"]["id"]
+        def on_success(user_id):
+            self.user_id = user_id
+            self.publish_queue.set_token(token)  # Jobs from earlier sessions can go out now
+            self.set_status("")
             messagebox.showinfo("Success", "API token is valid.")
-        else:
+
+        def on_error(error):
+            self.user_id = None
+            self.set_status("")
             messagebox.showerror(
                 "Error", "Failed to get user ID. Check your API token."
             )
-            self.user_id = None
+
+        self.set_status("Checking API token...")
+        self.network.submit(self.network.get_user_id, token, on_success=on_success, on_error=on_error)
 
     def post_to_medium(self):
-        if not self.user_id:
-            messagebox.showwarning("User ID Missing", "Please set your API token.")
+        self.queue_post()
+
+    def schedule_post(self):
+        when = simpledialog.askstring("Schedule Post", "Publish at (YYYY-MM-DD HH:MM, local time):", parent=self.root)
+        if not when:
             return
+        try:
+            publish_at = time.mktime(time.strptime(when.strip(), "%Y-%m-%d %H:%M"))
+        except ValueError:
+            messagebox.showwarning("Invalid Time", "Please enter the time as YYYY-MM-DD HH:MM.")
+            return
+        self.queue_post(publish_at)
 
+    def queue_post(self, publish_at=None):
+        # Posts go through the publish queue, which keeps them across
+        # restarts and outages; the user id is looked up when they go out
         token = self.api_token.get()
         if not token:
             messagebox.showwarning("Token Required", "Please enter your Medium API token.")
             return
 
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/json",
-        }
-
-        # Prepare content
+        snapshot = self.tab.document.snapshot()
         title = self.title.get()
-        markdown_text = self.content_text.get("1.0", tk.END).strip()
-        tags = [tag.strip() for tag in self.tags.get().split(",") if tag.strip()]
-        canonical_url = self.canonical_url.get()
-        publish_status = self.publish_status.get()
-        notify_followers = self.notify_followers.get()
-        license = self.license.get()
-
-        if not title or not markdown_text:
+        if not title or not snapshot.text.strip():
             messagebox.showwarning("Missing Information", "Title and content are required.")
             return
 
-        # If featured image is set, upload it and insert into content
-        if self.featured_image_path:
-            image_url = self.upload_image_to_imgur(self.featured_image_path)
-            if image_url:
-                # Insert image at the top of the content
-                image_markdown = f"![Featured Image]({image_url})\n\n"
-                markdown_text = image_markdown + markdown_text
-            else:
-                messagebox.showerror("Error", "Failed to upload featured image.")
-                return
-        elif self.featured_image_url.get():
-            image_url = self.featured_image_url.get()
-            image_markdown = f"![Featured Image]({image_url})\n\n"
-            markdown_text = image_markdown + markdown_text
-
-        # Prepare data
-        data = {
-            "title": title,
-            "contentFormat": "markdown",
-            "content": markdown_text,
-            "tags": tags if tags else [],
-            "canonicalUrl": canonical_url if canonical_url else "",
-            "publishStatus": publish_status,
-            "license": license,
-            "notifyFollowers": notify_followers,
-        }
+        post = self.current_post()
+        post["content"] = snapshot.text.strip()
+        post["notify_followers"] = bool(post["notify_followers"])
+        post["featured_image"] = os.path.abspath(post["featured_image"]) if post["featured_image"] else ""
+        post["base_dir"] = os.path.dirname(os.path.abspath(self.tab.current_file)) if self.tab.current_file else None
+        try:
+            job_id, existing = self.publish_queue.enqueue(post, token, publish_at=publish_at)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to queue post: {str(e)}")
+            return
+        self.publish_snapshots[job_id] = (self.tab, self.revision_key(), snapshot)
+        self.refresh_queue_status()
+        if existing == "publishing":
+            self.set_status("Publishing...")
+            messagebox.showinfo("Already Queued", "This post is already being published.")
+            return
+        if existing == "uncertain":
+            self.set_status("")
+            messagebox.showwarning("Already Queued",
+                                   "This post was already sent once, but it is not known whether Medium received it. "
+                                   "Check Medium, then retry or mark it published from the publish queue.")
+            return
+        if publish_at and publish_at > time.time():
+            self.set_status("Scheduled for " + time.strftime("%Y-%m-%d %H:%M", time.localtime(publish_at)))
+        else:
+            self.set_status("Publishing...")
+        if existing == "queued":
+            messagebox.showinfo("Already Queued", "This post was already in the publish queue; "
+                                + ("it has been rescheduled." if publish_at else "it will go out now."))
 
-        post_headers = headers.copy()
-        post_headers["Content-Type"] = "application/json"
+    def start_publish_queue(self):
+        try:
+            self.publish_queue.start()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open the publish queue: {str(e)}")
+            return
+        self.refresh_queue_status()
 
-        url = f"https://api.medium.com/v1/users/{self.user_id}/posts"
+    def on_publish_event(self, job_id, status, detail):
+        self.refresh_queue_status()
+        if self.queue_window is not None:
+            self.refresh_queue()
+        if status == "published":
+            self.set_status("")
+            tab, document, snapshot = self.publish_snapshots.pop(job_id, (None, None, None))
+            if tab in self.tabs and document == self.revision_key(tab):
+                self.record_revision("publish", snapshot, tab)
+            messagebox.showinfo("Success", f"Post published successfully: {detail}")
+        elif status in ("failed", "uncertain", "error"):
+            self.set_status("")
+            messagebox.showerror("Error", detail)
+        elif status == "queued" and detail.startswith("Offline"):
+            self.set_status("Offline; the post will go out when the network is back")
 
-        response = requests.post(url, headers=post_headers, json=data)
-        if response.status_code == 201:
-            post_data = response.json()
-            post_url = post_data["data"]["url"]
-            messagebox.showinfo("Success", f"Post published successfully: {post_url}")
-        else:
-            messagebox.showerror(
-                "Error",
-                f"Failed to publish post. Status code: {response.status_code}\n{response.text}",
-            )
+    def refresh_queue_status(self):
+        try:
+            counts = self.publish_queue.counts()
+        except Exception as e:
+            self.queue_status = f"Publish queue unavailable: {str(e)}"
+            self.update_status_bar()
+            return
+        waiting = counts.get("queued", 0) + counts.get("publishing", 0)
+        attention = counts.get("failed", 0) + counts.get("uncertain", 0)
+        parts = []
+        if waiting:
+            parts.append(f"Queued: {waiting}")
+        if attention:
+            parts.append(f"Needs attention: {attention}")
+        self.queue_status = ", ".join(parts)
+        self.update_status_bar()
+
+    def show_queue(self, event=None):
+        if self.queue_window is not None:
+            self.queue_window.lift()
+            return
+        self.queue_window = tk.Toplevel(self.root)
+        self.queue_window.title("Publish Queue")
+        self.queue_window.protocol("WM_DELETE_WINDOW", self.close_queue)
+
+        columns = ("title", "status", "scheduled", "attempts", "detail")
+        self.queue_tree = ttk.Treeview(self.queue_window, columns=columns, show="headings", selectmode="browse")
+        for column, width in zip(columns, (260, 90, 130, 70, 360)):
+            self.queue_tree.heading(column, text=column.capitalize())
+            self.queue_tree.column(column, width=width, stretch=column in ("title", "detail"))
+        self.queue_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        buttons_frame = ttk.Frame(self.queue_window)
+        buttons_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(buttons_frame, text="Retry Now", command=self.retry_queued_post).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Cancel", command=self.cancel_queued_post).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Mark Published", command=self.mark_queued_post_published).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Clear Finished", command=self.clear_finished_posts).pack(side=tk.LEFT)
+        self.refresh_queue()
+
+    def close_queue(self):
+        if self.queue_refresh_id:
+            self.root.after_cancel(self.queue_refresh_id)
+            self.queue_refresh_id = None
+        self.queue_window.destroy()
+        self.queue_window = None
+
+    def refresh_queue(self):
+        if self.queue_refresh_id:
+            self.root.after_cancel(self.queue_refresh_id)
+            self.queue_refresh_id = None
+        if self.queue_window is None:
+            return
+        try:
+            jobs = self.publish_queue.jobs()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read the publish queue: {str(e)}")
+            return
+        selection = self.queue_tree.selection()
+        self.queue_tree.delete(*self.queue_tree.get_children())
+        now = time.time()
+        for job in jobs:
+            detail = job["url"] or job["error"].split("\n")[0]
+            if job["status"] == "queued":
+                if not job["has_token"]:
+                    detail = "Waiting for the API token (Set Token)"
+                elif job["next_attempt"] > now:
+                    detail = f"Retrying in {job['next_attempt'] - now:.0f}s: {detail}"
+            scheduled = time.strftime("%Y-%m-%d %H:%M", time.localtime(job["publish_at"]))
+            self.queue_tree.insert("", tk.END, iid=str(job["id"]), values=(
+                job["title"], job["status"], scheduled, job["attempts"], detail))
+        self.queue_tree.selection_set([iid for iid in selection if self.queue_tree.exists(iid)])
+        # Countdowns tick while the window is open
+        self.queue_refresh_id = self.root.after(PUBLISH_QUEUE_REFRESH_MS, self.refresh_queue)
+
+    def selected_job_id(self):
+        selection = self.queue_tree.selection()
+        return int(selection[0]) if selection else None
+
+    def retry_queued_post(self):
+        job_id = self.selected_job_id()
+        if job_id is None:
+            return
+        status = self.queue_tree.set(str(job_id), "status")
+        if status == "uncertain" and not messagebox.askyesno(
+                "Retry", "This post may already be on Medium. Publish it again only if it is not. Retry?"):
+            return
+        self.run_queue_action(self.publish_queue.retry, job_id)
+
+    def cancel_queued_post(self):
+        job_id = self.selected_job_id()
+        if job_id is not None:
+            self.run_queue_action(self.publish_queue.cancel, job_id)
+
+    def mark_queued_post_published(self):
+        job_id = self.selected_job_id()
+        if job_id is not None:
+            self.run_queue_action(self.publish_queue.mark_published, job_id)
+
+    def clear_finished_posts(self):
+        self.run_queue_action(self.publish_queue.clear_finished)
+
+    def run_queue_action(self, action, *args):
+        try:
+            action(*args)
+        except Exception as e:
+            messagebox.showerror("Error", f"Publish queue error: {str(e)}")
+        self.refresh_queue()
+        self.refresh_queue_status()
+
+    def set_status(self, message):
+        self.status_message = message
+        self.update_status_bar()
+
+    def add_tab(self):
+        self.untitled_count += 1
+        tab = DocumentTab(self.notebook, self.spell_checker, self.untitled_count)
+        tab.content_text.bind("<<Modified>>", lambda event: self.on_content_modified(event, tab))
+        tab.content_text.bind("<Button-3>", self.show_suggestions)  # Right-click for suggestions
+        tab.content_text.config(yscrollcommand=lambda first, last: self.on_editor_scroll(first, last, tab))
+        self.configure_syntax_tags(tab.content_text)
+        if self.metrics.wrapped:
+            self.metrics.wrap(tab.autosave_journal, "_write", "autosave_write")
+        self.tabs.append(tab)
+        self.notebook.add(tab.frame, text=tab.name())
+        self.select_tab(tab)
+        return tab
+
+    def tab_for_open(self):
+        # Reuse the focused tab while it is an untouched blank document
+        tab = self.tab
+        if tab.current_file or tab.current_draft_id is not None or tab.modified or tab.loading or tab.document.table.length:
+            tab = self.add_tab()
+        return tab
+
+    def select_tab(self, tab):
+        self.notebook.select(tab.frame)
+        self.activate_tab(tab)
 
-    def upload_image_to_imgur(self, image_path):
-        # Imgur authenticated upload API
-        url = "https://api.imgur.com/3/image"
-        headers = {
-            "Authorization": "Client-ID YOUR_IMGUR_CLIENT_ID",  # Replace with your Imgur Client ID
+    def on_tab_changed(self, event=None):
+        selected = str(self.notebook.select())
+        for tab in self.tabs:
+            if str(tab.frame) == selected:
+                self.activate_tab(tab)
+
+    def activate_tab(self, tab):
+        if tab is self.tab:
+            return
+        if self.tab is not None:
+            self.store_fields(self.tab)
+        # Work queued for the old tab is dropped; it is redone on focus
+        if self.preview_after_id:
+            self.root.after_cancel(self.preview_after_id)
+            self.preview_after_id = None
+        self.frame_scheduler.cancel("highlight_visible", "spelling_visible", "preview", "highlight", "spelling",
+                                    "status", "grammar")
+        self.grammar_check_scheduled = False  # The cancelled check is requested again below if still needed
+        self.metadata_request += 1  # AI suggestions were meant for the old tab
+        self.tab = tab
+        self.restore_fields(tab)
+        self.title_entry.config(values=[])
+        # The shared preview shows another document until this one renders
+        tab.preview_range = None
+        tab.last_preview_html = None
+        self.frame_scheduler.request("highlight_visible", "spelling_visible", "highlight", "spelling", "status")
+        if not tab.loading:
+            self.preview_content()
+            if tab.grammar_version != tab.document.version:
+                self.debounce_grammar_check()
+        if self.history_window is not None:
+            self.refresh_history()
+        tab.content_text.focus_set()
+
+    def store_fields(self, tab):
+        tab.fields = {
+            "title": self.title.get(),
+            "subtitle": self.subtitle.get(),
+            "tags": self.tags.get(),
+            "canonical_url": self.canonical_url.get(),
+            "publish_status": self.publish_status.get(),
+            "notify_followers": self.notify_followers.get(),
+            "license": self.license.get(),
+            "featured_image": self.featured_image_path,
+            "featured_image_url": self.featured_image_url.get(),
         }
-        with open(image_path, "rb") as image_file:
-            files = {'image': image_file}
-            response = requests.post(url, headers=headers, files=files)
-        if response.status_code == 200:
-            data = response.json()
-            image_url = data["data"]["link"]
-            return image_url
+
+    def restore_fields(self, tab):
+        fields = tab.fields
+        self.title.set(fields["title"])
+        self.subtitle.set(fields["subtitle"])
+        self.tags.set(fields["tags"])
+        self.canonical_url.set(fields["canonical_url"])
+        self.publish_status.set(fields["publish_status"])
+        self.notify_followers.set(fields["notify_followers"])
+        self.license.set(fields["license"])
+        self.featured_image_path = fields["featured_image"]
+        self.featured_image_url.set(fields["featured_image_url"])
+        self.image_label.config(text=self.featured_image_path or "No image selected")
+
+    def update_tab_name(self, tab):
+        self.notebook.tab(tab.frame, text=tab.name())
+
+    def close_tab(self, event=None):
+        tab = self.tab
+        if tab.modified:
+            if not messagebox.askyesno("Unsaved Changes", f"{tab.name().lstrip('*')} has unsaved changes. Close it anyway?"):
+                return
+        self.tab = None
+        self.tabs.remove(tab)
+        self.notebook.forget(tab.frame)
+        tab.close()
+        if self.tabs:
+            self.select_tab(self.tabs[-1])
         else:
-            return None
+            self.add_tab()
 
     def new_file(self, event=None):
-        if self.content_text.edit_modified():
-            if not messagebox.askyesno("Unsaved Changes", "You have unsaved changes. Do you want to discard them?"):
-                return
-        self.title.set("")
-        self.tags.set("")
-        self.canonical_url.set("")
-        self.publish_status.set("draft")
-        self.notify_followers.set(False)
-        self.license.set("all-rights-reserved")
-        self.featured_image_path = None
-        self.featured_image_url.set("")
-        self.image_label.config(text="No image selected")
-        self.content_text.delete("1.0", tk.END)
-        self.preview_html.set_html("<p>Preview will appear here</p>")
-        self.current_file = None
-        self.content_text.edit_modified(0)
+        self.add_tab()
 
     def open_file(self, event=None):
-        if self.content_text.edit_modified():
-            if not messagebox.askyesno("Unsaved Changes", "You have unsaved changes. Do you want to discard them?"):
-                return
         filetypes = [("Markdown files", "*.md *.markdown"), ("All files", "*.*")]
         filename = filedialog.askopenfilename(title="Open File", filetypes=filetypes)
         if filename:
-            try:
-                with open(filename, "r", encoding="utf-8") as f:
-                    content = f.read()
-                self.content_text.delete("1.0", tk.END)
-                self.content_text.insert(tk.END, content)
-                self.current_file = filename
-                self.preview_content()
-                self.content_text.edit_modified(0)
-            except Exception as e:
+            for tab in self.tabs:
+                if tab.current_file and os.path.abspath(tab.current_file) == os.path.abspath(filename):
+                    self.select_tab(tab)
+                    return
+            tab = self.tab_for_open()
+
+            def on_success():
+                tab.current_file = filename
+                tab.current_draft_id = None
+                self.update_tab_name(tab)
+
+            def on_error(e):
                 messagebox.showerror("Error", f"Failed to open file: {str(e)}")
 
-    def save_file(self, event=None):
-        if self.current_file:
             try:
-                content = self.content_text.get("1.0", tk.END)
-                with open(self.current_file, "w", encoding="utf-8") as f:
-                    f.write(content)
-                self.content_text.edit_modified(0)
+                self.load_content(read_text_chunks(filename), on_success, on_error)
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to save file: {str(e)}")
+                on_error(e)
+
+    def load_content(self, chunks, on_success=None, on_error=None):
+        # Streams (chunk, fraction) pairs into the focused tab's editor during
+        # idle time. Only the cheap edit listeners run per chunk; preview,
+        # highlighting, stats and grammar run once when the last chunk is in.
+        tab = self.tab
+        self.cancel_loading(tab)
+        tab.loading = True
+        tab.content_text.config(undo=False)
+        tab.content_text.delete("1.0", tk.END)
+        tab.last_preview_html = None
+        tab.preview_range = None
+        self.set_status("Loading... 0%")
+        self.root.after_idle(self.load_next_chunk, tab, tab.load_generation, chunks, on_success, on_error)
+
+    def load_next_chunk(self, tab, generation, chunks, on_success, on_error):
+        if generation != tab.load_generation:
+            chunks.close()
+            return
+        try:
+            chunk, fraction = next(chunks)
+        except StopIteration:
+            self.finish_loading(tab)
+            if on_success:
+                on_success()
+            return
+        except Exception as e:
+            self.finish_loading(tab)
+            if on_error:
+                on_error(e)
+            return
+        tab.content_text.insert(tk.END, chunk)
+        self.status_message = f"Loading... {int(fraction * 100)}%"
+        self.request_status_update()
+        self.root.after_idle(self.load_next_chunk, tab, generation, chunks, on_success, on_error)
+
+    def cancel_loading(self, tab=None):
+        tab = tab or self.tab
+        tab.load_generation += 1
+        if tab.loading:
+            self.finish_loading(tab, analyze=False)
+
+    def finish_loading(self, tab, analyze=True):
+        tab.loading = False
+        tab.modified = False
+        tab.content_text.config(undo=True)
+        tab.content_text.edit_reset()
+        tab.content_text.edit_modified(0)
+        self.status_message = ""
+        self.frame_scheduler.request("status")
+        if analyze and tab is self.tab:
+            self.frame_scheduler.request("highlight_visible", "spelling_visible", "highlight", "spelling")
+            self.preview_content()
+            self.debounce_grammar_check()
+
+    def save_file(self, event=None):
+        if self.tab.current_file:
+            self.save_to(self.tab.current_file)
         else:
             self.save_file_as()
 
@@ -409,220 +3953,578 @@ class MediumPosterApp:
             title="Save File As", defaultextension=".md", filetypes=filetypes
         )
         if filename:
-            try:
-                content = self.content_text.get("1.0", tk.END)
-                with open(filename, "w", encoding="utf-8") as f:
-                    f.write(content)
-                self.current_file = filename
-                self.content_text.edit_modified(0)
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save file: {str(e)}")
+            self.save_to(filename)
 
-    def on_exit(self):
-        if self.content_text.edit_modified():
-            if not messagebox.askyesno("Quit", "You have unsaved changes. Do you really wish to quit?"):
+    def save_to(self, filename):
+        # The snapshot is taken now; writing it happens off the main thread
+        tab = self.tab
+        snapshot = tab.document.snapshot()
+
+        def on_success(path):
+            tab.current_file = path
+            self.set_status("")
+            self.record_revision("save", snapshot, tab)
+            if tab.document.version == snapshot.version:
+                tab.modified = False
+                tab.content_text.edit_modified(0)
+            self.update_tab_name(tab)
+
+        def on_error(e):
+            self.set_status("")
+            messagebox.showerror("Error", f"Failed to save file: {str(e)}")
+
+        self.set_status("Saving...")
+        self.file_writer.save(filename, snapshot.text, on_success=on_success, on_error=on_error)
+
+    def current_post(self):
+        return {
+            "title": self.title.get(),
+            "subtitle": self.subtitle.get(),
+            "tags": self.tags.get(),
+            "canonical_url": self.canonical_url.get(),
+            "publish_status": self.publish_status.get(),
+            "license": self.license.get(),
+            "notify_followers": self.notify_followers.get(),
+            "featured_image": self.featured_image_path or "",
+            "featured_image_url": self.featured_image_url.get(),
+            "content": self.tab.document.snapshot().text,
+        }
+
+    def save_to_library(self, event=None):
+        tab = self.tab
+        snapshot = tab.document.snapshot()
+
+        def on_success(draft_id):
+            tab.current_draft_id = draft_id
+            self.set_status("Saved to library")
+            self.record_revision("save", snapshot, tab)
+            if not tab.current_file:
+                self.update_tab_name(tab)
+            if self.library_window is not None:
+                self.refresh_library()
+
+        def on_error(e):
+            self.set_status("")
+            messagebox.showerror("Error", f"Failed to save draft: {str(e)}")
+
+        self.draft_library.submit(self.draft_library.save, self.tab.current_draft_id, self.current_post(),
+                                  on_success=on_success, on_error=on_error)
+
+    def show_library(self, event=None):
+        if self.library_window is not None:
+            self.library_window.lift()
+            return
+        self.library_window = tk.Toplevel(self.root)
+        self.library_window.title("Draft Library")
+        self.library_window.protocol("WM_DELETE_WINDOW", self.close_library)
+
+        search_frame = ttk.Frame(self.library_window)
+        search_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT)
+        self.library_query = tk.StringVar()
+        self.library_query.trace_add("write", lambda *args: self.schedule_library_search())
+        search_entry = ttk.Entry(search_frame, textvariable=self.library_query)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        search_entry.focus_set()
+
+        # Metadata only; a body is read when its draft is opened
+        columns = ("title", "tags", "status", "words", "updated")
+        self.library_tree = ttk.Treeview(self.library_window, columns=columns, show="headings", selectmode="browse")
+        for column, width in zip(columns, (320, 160, 70, 60, 130)):
+            self.library_tree.heading(column, text=column.capitalize())
+            self.library_tree.column(column, width=width, stretch=column == "title")
+        self.library_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.library_tree.bind("<Double-1>", lambda event: self.open_selected_draft())
+
+        buttons_frame = ttk.Frame(self.library_window)
+        buttons_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(buttons_frame, text="Open", command=self.open_selected_draft).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Delete", command=self.delete_selected_draft).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Import Folder...", command=self.import_drafts).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Export Folder...", command=self.export_drafts).pack(side=tk.LEFT)
+        self.library_count = ttk.Label(buttons_frame, text="")
+        self.library_count.pack(side=tk.RIGHT)
+        self.refresh_library()
+
+    def close_library(self):
+        if self.library_search_id:
+            self.root.after_cancel(self.library_search_id)
+            self.library_search_id = None
+        self.library_window.destroy()
+        self.library_window = None
+
+    def schedule_library_search(self):
+        if self.library_search_id:
+            self.root.after_cancel(self.library_search_id)
+        self.library_search_id = self.root.after(DRAFT_SEARCH_DEBOUNCE_MS, self.refresh_library)
+
+    def refresh_library(self):
+        self.library_search_id = None
+        if self.library_window is None:
+            return
+        started = time.perf_counter()
+        try:
+            drafts = self.draft_library.list(self.library_query.get())
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to search drafts: {str(e)}")
+            return
+        self.library_tree.delete(*self.library_tree.get_children())
+        for draft in drafts:
+            updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(draft["updated"]))
+            self.library_tree.insert("", tk.END, iid=str(draft["id"]), values=(
+                draft["title"], draft["tags"], draft["publish_status"], draft["words"], updated))
+        self.library_count.config(text=f"{len(drafts)} drafts ({(time.perf_counter() - started) * 1000:.0f} ms)")
+
+    def selected_draft_id(self):
+        selection = self.library_tree.selection()
+        return int(selection[0]) if selection else None
+
+    def open_selected_draft(self):
+        draft_id = self.selected_draft_id()
+        if draft_id is None:
+            return
+        for tab in self.tabs:
+            if tab.current_draft_id == draft_id:
+                self.select_tab(tab)
                 return
-        self.root.destroy()
+        try:
+            post = self.draft_library.get(draft_id)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open draft: {str(e)}")
+            return
+        tab = self.tab_for_open()
+        self.title.set(post["title"])
+        self.subtitle.set(post["subtitle"])
+        self.tags.set(post["tags"])
+        self.canonical_url.set(post["canonical_url"])
+        self.publish_status.set(post["publish_status"])
+        self.license.set(post["license"])
+        self.notify_followers.set(bool(post["notify_followers"]))
+        self.featured_image_path = post["featured_image"] or None
+        self.featured_image_url.set(post["featured_image_url"])
+        self.image_label.config(text=self.featured_image_path or "No image selected")
 
-    def generate_title(self):
-        api_key = self.openai_api_key.get()
-        if not api_key:
-            messagebox.showwarning("API Key Required", "Please enter your OpenAI API key.")
+        def on_success():
+            tab.current_draft_id = draft_id
+            tab.current_file = None
+            self.update_tab_name(tab)
+
+        self.load_content(text_progress_chunks(post["content"]), on_success)
+
+    def delete_selected_draft(self):
+        draft_id = self.selected_draft_id()
+        if draft_id is None:
+            return
+        if not messagebox.askyesno("Delete Draft", "Delete the selected draft from the library?"):
             return
 
-        openai.api_key = api_key
+        def on_success(result):
+            for tab in self.tabs:
+                if tab.current_draft_id == draft_id:
+                    tab.current_draft_id = None
+                    self.update_tab_name(tab)
+            self.refresh_library()
 
-        content = self.content_text.get("1.0", tk.END).strip()
-        if not content:
-            messagebox.showwarning("Content Required", "Please enter some content to generate a title.")
+        def on_error(e):
+            messagebox.showerror("Error", f"Failed to delete draft: {str(e)}")
+
+        self.draft_library.submit(self.draft_library.delete, draft_id, on_success=on_success, on_error=on_error)
+
+    def import_drafts(self):
+        directory = filedialog.askdirectory(title="Import Markdown Folder")
+        if directory:
+            self.run_library_job(self.draft_library.import_directory, directory, "Imported")
+
+    def export_drafts(self):
+        directory = filedialog.askdirectory(title="Export Drafts To")
+        if directory:
+            self.run_library_job(self.draft_library.export_directory, directory, "Exported")
+
+    def run_library_job(self, job, directory, verb):
+        # Bulk import/export on the library thread, reporting progress in the status bar
+        def progress(count):
+            self.call_soon(self.set_status, f"{verb} {count} drafts...")
+
+        def on_success(count):
+            self.set_status("")
+            if self.library_window is not None:
+                self.refresh_library()
+            messagebox.showinfo("Draft Library", f"{verb} {count} drafts.")
+
+        def on_error(e):
+            self.set_status("")
+            messagebox.showerror("Error", f"{verb[:-2]} failed: {str(e)}")
+
+        self.set_status(f"{verb} 0 drafts...")
+        self.draft_library.submit(job, directory, progress, on_success=on_success, on_error=on_error)
+
+    def revision_key(self, tab=None):
+        # History follows the library draft, or else the file on disk
+        tab = tab or self.tab
+        if tab.current_draft_id is not None:
+            return f"draft:{tab.current_draft_id}"
+        if tab.current_file:
+            return "file:" + os.path.abspath(tab.current_file)
+        return None
+
+    def record_revision(self, reason, snapshot=None, tab=None):
+        tab = tab or self.tab
+        document = self.revision_key(tab)
+        if document is None:
             return
+        snapshot = snapshot or tab.document.snapshot()
+        if reason == "autosave" and tab.last_revision == (document, snapshot.version):
+            return
+        tab.last_revision = (document, snapshot.version)
 
-        prompt = (
-            "Generate an engaging and concise title for the following article:\n\n"
-            f"{content}\n\nTitle:"
-        )
+        def on_success(revision_id):
+            if self.history_window is not None:
+                self.refresh_history()
+
+        def on_error(e):
+            self.set_status(f"Failed to record revision: {str(e)}")
+
+        self.draft_library.submit(self.draft_library.add_revision, document, snapshot.text, reason,
+                                  on_success=on_success, on_error=on_error)
+
+    def show_history(self, event=None):
+        if self.history_window is not None:
+            self.history_window.lift()
+            return
+        if self.revision_key() is None:
+            messagebox.showinfo("Revision History", "Save the post to a file or the library to start its history.")
+            return
+        self.history_window = tk.Toplevel(self.root)
+        self.history_window.title("Revision History")
+        self.history_window.geometry("1100x600")
+        self.history_window.protocol("WM_DELETE_WINDOW", self.close_history)
+
+        list_frame = ttk.Frame(self.history_window)
+        list_frame.pack(side=tk.LEFT, fill=tk.Y, padx=10, pady=5)
+        ttk.Label(list_frame, text="Select one revision to compare with the editor, or two to compare them.",
+                  wraplength=260).pack(fill=tk.X)
+        self.history_list = tk.Listbox(list_frame, selectmode=tk.EXTENDED, width=40, exportselection=False)
+        self.history_list.pack(fill=tk.BOTH, expand=True)
+        self.history_list.bind("<<ListboxSelect>>", lambda event: self.show_revision_diff())
+        ttk.Button(list_frame, text="Restore", command=self.restore_revision).pack(fill=tk.X)
+        self.history_summary = ttk.Label(list_frame, text="")
+        self.history_summary.pack(fill=tk.X)
+
+        diff_frame = ttk.Frame(self.history_window)
+        diff_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.history_left_label = ttk.Label(diff_frame, text="")
+        self.history_left_label.grid(row=0, column=0, sticky="w")
+        self.history_right_label = ttk.Label(diff_frame, text="")
+        self.history_right_label.grid(row=0, column=1, sticky="w")
+        scrollbar = ttk.Scrollbar(diff_frame, orient=tk.VERTICAL)
+        scrollbar.grid(row=1, column=2, sticky="ns")
+        self.history_panes = []
+        for column in (0, 1):
+            pane = tk.Text(diff_frame, wrap=tk.NONE, width=60, font=("TkFixedFont", 9))
+            pane.grid(row=1, column=column, sticky="nsew")
+            pane.tag_configure("removed", background="#ffd7d5")
+            pane.tag_configure("added", background="#d2f4d3")
+            pane.tag_configure("filler", background="#eeeeee")
+            diff_frame.columnconfigure(column, weight=1)
+            self.history_panes.append(pane)
+        diff_frame.rowconfigure(1, weight=1)
+
+        # Both panes scroll together
+        def yview(*args):
+            for pane in self.history_panes:
+                pane.yview(*args)
 
+        def on_scroll(source):
+            def set(first, last):
+                scrollbar.set(first, last)
+                for pane in self.history_panes:
+                    if pane is not source:
+                        pane.yview_moveto(first)
+            return set
+
+        scrollbar.config(command=yview)
+        for pane in self.history_panes:
+            pane.config(yscrollcommand=on_scroll(pane))
+        self.refresh_history()
+
+    def close_history(self):
+        self.history_generation += 1
+        self.history_window.destroy()
+        self.history_window = None
+
+    def refresh_history(self):
+        if self.history_window is None:
+            return
+        document = self.revision_key()
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=20,
-                n=1,
-                stop=None,
-                temperature=0.7,
-            )
-            generated_title = response.choices[0].message.content.strip()
-            self.title.set(generated_title)
-        except openai.error.OpenAIError as e:
-            messagebox.showerror("Error", f"Failed to generate title: {str(e)}")
+            self.history_revisions = self.draft_library.revisions(document) if document else []
+            count, size = self.draft_library.history_size(document) if document else (0, 0)
         except Exception as e:
-            messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
+            messagebox.showerror("Error", f"Failed to read revision history: {str(e)}")
+            return
+        self.history_list.delete(0, tk.END)
+        for revision in self.history_revisions:
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(revision["created"]))
+            self.history_list.insert(tk.END, f"{created}  {revision['reason']:<9} {revision['size']:,} chars")
+        self.history_summary.config(text=f"{count} revisions, {size / 1024:.1f} KB stored")
+
+    def selected_revisions(self):
+        return [self.history_revisions[index] for index in self.history_list.curselection()]
+
+    def show_revision_diff(self):
+        revisions = self.selected_revisions()[:2]
+        if not revisions:
+            return
+        # Older revision on the left; with one selected the editor is on the right
+        revisions.sort(key=lambda revision: revision["id"])
+        current = None if len(revisions) == 2 else self.tab.document.snapshot().text
+        ids = [revision["id"] for revision in revisions]
+        self.history_generation += 1
+        generation = self.history_generation
+
+        def diff():
+            texts = [self.draft_library.revision_text(revision_id) for revision_id in ids]
+            return side_by_side_diff(texts[0], texts[1] if current is None else current)
+
+        def on_success(columns):
+            if generation != self.history_generation:
+                return
+            for pane, rows in zip(self.history_panes, columns):
+                pane.config(state=tk.NORMAL)
+                pane.delete("1.0", tk.END)
+                for line, tag in rows:
+                    pane.insert(tk.END, line + "\n", tag or ())
+                pane.config(state=tk.DISABLED)
+
+        def on_error(e):
+            messagebox.showerror("Error", f"Failed to load revision: {str(e)}")
+
+        labels = [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(revision["created"])) for revision in revisions]
+        self.history_left_label.config(text=labels[0])
+        self.history_right_label.config(text=labels[1] if current is None else "Editor")
+        self.draft_library.submit(diff, on_success=on_success, on_error=on_error)
+
+    def restore_revision(self):
+        revisions = self.selected_revisions()
+        if len(revisions) != 1:
+            messagebox.showinfo("Revision History", "Select one revision to restore.")
+            return
+        revision_id = revisions[0]["id"]
+        # Keep what is in the editor now, so the restore can be undone from history
+        tab = self.tab
+        self.record_revision("restore")
+
+        def on_success(text):
+            def loaded():
+                tab.modified = True
+                self.update_tab_name(tab)
+                if self.history_window is not None:
+                    self.refresh_history()
+            if tab is not self.tab:
+                self.select_tab(tab)
+            self.load_content(text_progress_chunks(text), loaded)
+
+        def on_error(e):
+            messagebox.showerror("Error", f"Failed to restore revision: {str(e)}")
+
+        self.draft_library.submit(self.draft_library.revision_text, revision_id, on_success=on_success, on_error=on_error)
+
+    def on_exit(self):
+        if any(tab.modified for tab in self.tabs):
+            if not messagebox.askyesno("Quit", "You have unsaved changes. Do you really wish to quit?"):
+                return
+        for tab in self.tabs:
+            self.cancel_loading(tab)
+        self.grammar_scheduler.shutdown()
+        if self.metrics.wrapped:
+            self.export_metrics()
+        self.file_writer.close()
+        self.draft_library.close()
+        for tab in self.tabs:
+            tab.autosave_journal.close(discard=True)
+        self.publish_queue.stop()
+        self.network.shutdown()
+        self.root.destroy()
+
+    def generate_title(self):
+        def apply(candidates):
+            self.title_entry.config(values=[c["title"] for c in candidates if c["title"]])
+            if candidates[0]["title"]:
+                self.title.set(candidates[0]["title"])
+            if candidates[0]["subtitle"]:
+                self.subtitle.set(candidates[0]["subtitle"])
+        self.request_metadata(apply, "Please enter some content to generate a title.", "Failed to generate title")
 
     def suggest_tags(self):
+        def apply(candidates):
+            if candidates[0]["tags"]:
+                self.tags.set(candidates[0]["tags"])
+        self.request_metadata(apply, "Please enter some content to suggest tags.", "Failed to suggest tags")
+
+    def request_metadata(self, apply, content_warning, error_prefix):
+        # Title, subtitle and tags stream in from one cached request, so the
+        # second button is free once the first has been answered. Typing
+        # into the document cancels a stream that is still running.
         api_key = self.openai_api_key.get()
         if not api_key:
             messagebox.showwarning("API Key Required", "Please enter your OpenAI API key.")
             return
 
+        import openai
         openai.api_key = api_key
 
-        content = self.content_text.get("1.0", tk.END).strip()
+        content = self.tab.document.snapshot().text.strip()
         if not content:
-            messagebox.showwarning("Content Required", "Please enter some content to suggest tags.")
+            messagebox.showwarning("Content Required", content_warning)
             return
 
-        prompt = (
-            "Based on the following article, suggest up to 5 relevant tags separated by commas:\n\n"
-            f"{content}\n\nTags:"
-        )
+        self.metadata_request += 1
+        request = self.metadata_request
+        version = self.tab.document.version
 
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=50,
-                n=1,
-                stop=None,
-                temperature=0.5,
-            )
-            suggested_tags = response.choices[0].message.content.strip()
-            self.tags.set(suggested_tags)
-        except openai.error.OpenAIError as e:
-            messagebox.showerror("Error", f"Failed to suggest tags: {str(e)}")
-        except Exception as e:
-            messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
+        def cancelled():
+            return request != self.metadata_request or version != self.tab.document.version
+
+        def apply_latest():
+            candidates, self.metadata_candidates = self.metadata_candidates, None
+            if candidates and request == self.metadata_request:
+                apply(candidates)
+
+        def on_update(candidates):
+            # Coalesce token updates into at most one UI refresh per poll
+            pending = self.metadata_candidates
+            self.metadata_candidates = candidates
+            if pending is None:
+                self.call_soon(apply_latest)
+
+        def on_error(e):
+            if isinstance(e, MetadataCancelled):
+                self.set_status("AI suggestion cancelled because the content changed")
+                return
+            self.set_status("")
+            if isinstance(e, openai.error.OpenAIError):
+                messagebox.showerror("Error", f"{error_prefix}: {str(e)}")
+            else:
+                messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
+
+        def on_success(candidates):
+            self.set_status("")
+            if candidates and request == self.metadata_request:
+                apply(candidates)
+
+        self.set_status("Waiting for OpenAI...")
+        self.network.submit(self.metadata_generator.generate, content, on_update, cancelled,
+                            on_success=on_success, on_error=on_error)
 
     def debounce_grammar_check(self):
         if self.grammar_check_scheduled:
             return
         self.grammar_check_scheduled = True
-        self.root.after(500, self.start_grammar_check_thread)
+        self.root.after(GRAMMAR_DEBOUNCE_MS, self.frame_scheduler.request, "grammar")
 
-    def start_grammar_check_thread(self):
-        if self.grammar_check_thread and self.grammar_check_thread.is_alive():
-            self.grammar_check_scheduled = False
-            return
-        content = self.content_text.get("1.0", tk.END)
-        content_version = self.current_content_version
-        self.grammar_check_thread = threading.Thread(target=self.check_grammar_thread, args=(content, content_version))
-        self.grammar_check_thread.start()
-        self.grammar_check_scheduled = False  # Reset the flag here
+    def start_grammar_check(self):
+        # The scheduler collapses requests to the newest content version
+        tab = self.tab
+        snapshot = tab.document.snapshot()
+        self.grammar_scheduler.submit(snapshot.text, snapshot.version,
+                                      lambda matches, version: self.on_grammar_results(tab, matches, version))
+        self.grammar_check_scheduled = False
 
-    def check_grammar_thread(self, content, content_version):
-        matches = self.tool.check(content)
-        self.grammar_check_queue.put((matches, content_version))
-        self.root.after(0, self.highlight_errors_from_thread)
+    def on_grammar_results(self, tab, matches, content_version):
+        self.grammar_check_queue.put((tab, matches, content_version))
+        self.call_soon(self.highlight_errors_from_thread)
 
     def highlight_errors_from_thread(self):
-        try:
-            matches, content_version = self.grammar_check_queue.get_nowait()
-            if content_version == self.current_content_version:
-                self.highlight_errors(matches)
-        except queue.Empty:
-            pass
+        latest = {}
+        while True:
+            try:
+                tab, matches, content_version = self.grammar_check_queue.get_nowait()
+            except queue.Empty:
+                break
+            latest[tab] = (matches, content_version)
+        for tab, (matches, content_version) in latest.items():
+            if tab in self.tabs and content_version == tab.document.version:
+                self.highlight_errors(matches, tab)
+                tab.grammar_version = content_version
 
-    def highlight_errors(self, matches):
+    def highlight_errors(self, matches, tab=None):
+        tab = tab or self.tab
         # Remove previous error highlights
-        self.content_text.tag_remove("grammar_error", "1.0", tk.END)
-        self.grammar_matches = matches  # Store matches
-
-        for match in matches:
-            start_index = self.content_text.index(f"1.0+{match.offset}c")
-            end_index = self.content_text.index(f"{start_index}+{match.errorLength}c")
-            self.content_text.tag_add("grammar_error", start_index, end_index)
+        tab.content_text.tag_remove("grammar_error", "1.0", tk.END)
+        tab.match_index.set_matches(matches)  # Store matches
 
-        self.content_text.tag_config("grammar_error", underline=True, foreground="red")
+        for match in tab.match_index.matches:
+            start_index = tab.line_index.offset_to_index(match.offset)
+            end_index = tab.line_index.offset_to_index(match.offset + match.errorLength)
+            tab.content_text.tag_add("grammar_error", start_index, end_index)
+            # LanguageTool's report (with its suggestions) wins over the local one
+            tab.content_text.tag_remove("spelling_error", start_index, end_index)
 
     def show_suggestions(self, event):
         try:
-            index = self.content_text.index(f"@{event.x},{event.y}")
-            word_start = self.content_text.index(f"{index} wordstart")
-            word_end = self.content_text.index(f"{index} wordend")
-            word = self.content_text.get(word_start, word_end)
+            index = self.tab.content_text.index(f"@{event.x},{event.y}")
+            word_start = self.tab.content_text.index(f"{index} wordstart")
+            word_end = self.tab.content_text.index(f"{index} wordend")
+            word = self.tab.content_text.get(word_start, word_end)
 
             # Check if the word is underlined (has an error)
-            tags = self.content_text.tag_names(word_start)
+            tags = self.tab.content_text.tag_names(word_start)
             if "grammar_error" in tags:
                 # Get suggestions from stored matches
-                content = self.content_text.get("1.0", tk.END)
-                offset = self.content_text.count("1.0", word_start, "chars")[0]
-                error_length = len(word)
-                for match in self.grammar_matches:
-                    if match.offset <= offset < match.offset + match.errorLength:
-                        suggestions = match.replacements
-                        break
-                else:
-                    suggestions = []
+                match = self.tab.match_index.find(self.tab.line_index.index_to_offset(word_start))
+                suggestions = match.replacements if match else []
 
                 if suggestions:
                     menu = tk.Menu(self.root, tearoff=0)
                     for s in suggestions[:5]:
                         menu.add_command(label=s, command=lambda replacement=s: self.replace_word(word_start, word_end, replacement))
                     menu.post(event.x_root, event.y_root)
-        except Exception as e:
+            elif "spelling_error" in tags:
+                # Not reported by LanguageTool yet: suggest from the local dictionary
+                word_start, word_end = self.tab.content_text.tag_prevrange("spelling_error", f"{index}+1c")
+                word = self.tab.content_text.get(word_start, word_end)
+                menu = tk.Menu(self.root, tearoff=0)
+                for s in self.spell_checker.suggestions(word):
+                    menu.add_command(label=s, command=lambda replacement=s: self.replace_word(word_start, word_end, replacement))
+                menu.add_separator()
+                menu.add_command(label="Add to Dictionary", command=lambda: self.add_to_dictionary(word))
+                menu.post(event.x_root, event.y_root)
+        except Exception:
             pass  # Handle exceptions silently
 
+    def add_to_dictionary(self, word):
+        try:
+            self.spell_checker.add_word(word)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save the word list: {str(e)}")
+        self.tab.spell_highlighter.mark_all_dirty()
+        self.frame_scheduler.request("spelling_visible", "spelling")
+
     def replace_word(self, start, end, replacement):
-        self.content_text.delete(start, end)
-        self.content_text.insert(start, replacement)
+        self.tab.content_text.delete(start, end)
+        self.tab.content_text.insert(start, replacement)
         self.debounce_grammar_check()
 
-    def highlight_syntax(self):
-        # Remove previous syntax highlights
-        self.content_text.tag_remove("header", "1.0", tk.END)
-        self.content_text.tag_remove("bold", "1.0", tk.END)
-        self.content_text.tag_remove("italic", "1.0", tk.END)
-        self.content_text.tag_remove("code", "1.0", tk.END)
-        self.content_text.tag_remove("link", "1.0", tk.END)
-
-        # Highlight headers
-        header_patterns = [r'^(#{1,6})\s.*$']
-        for pattern in header_patterns:
-            self.highlight_pattern(pattern, "header", regexp=True, start="1.0", end="end", multiline=True)
-
-        # Highlight bold text
-        self.highlight_pattern(r'(?<!\*)\*\*(.+?)\*\*(?!\*)', "bold", regexp=True)
-
-        # Highlight italic text
-        self.highlight_pattern(r'(?<!\*)\*(.+?)\*(?!\*)', "italic", regexp=True)
-
-        # Highlight code blocks
-        self.highlight_pattern(r'`([^`]+)`', "code", regexp=True)
-
-        # Highlight links
-        self.highlight_pattern(r'\[([^\]]+)\]\([^)]+\)', "link", regexp=True)
-
-        # Configure tags
-        self.content_text.tag_config("header", foreground="blue")
-        self.content_text.tag_config("bold", font=("TkDefaultFont", 10, "bold"))
-        self.content_text.tag_config("italic", font=("TkDefaultFont", 10, "italic"))
-        self.content_text.tag_config("code", foreground="green")
-        self.content_text.tag_config("link", foreground="purple", underline=True)
-
-    def highlight_pattern(self, pattern, tag, start="1.0", end="end", regexp=False, multiline=False):
-        start_pos = self.content_text.index(start)
-        end_pos = self.content_text.index(end)
-        content = self.content_text.get(start_pos, end_pos)
-        if regexp:
-            flags = re.MULTILINE if multiline else 0
-            matches = re.finditer(pattern, content, flags)
-            for match in matches:
-                match_start = f"{start}+{match.start()}c"
-                match_end = f"{start}+{match.end()}c"
-                self.content_text.tag_add(tag, match_start, match_end)
-        else:
-            idx = start_pos
-            while True:
-                idx = self.content_text.search(pattern, idx, stopindex=end, regexp=False)
-                if not idx:
-                    break
-                match_end = f"{idx}+{len(pattern)}c"
-                self.content_text.tag_add(tag, idx, match_end)
-                idx = match_end
+    def highlight_syntax(self, deadline=None, visible_only=False):
+        if visible_only:
+            top, bottom = self.visible_editor_lines()
+            return self.tab.syntax_highlighter.highlight(deadline, top + 1, bottom + 1)
+        return self.tab.syntax_highlighter.highlight(deadline)
+
+    def check_spelling(self, deadline=None, visible_only=False):
+        if visible_only:
+            top, bottom = self.visible_editor_lines()
+            return self.tab.spell_highlighter.highlight(deadline, top + 1, bottom + 1)
+        return self.tab.spell_highlighter.highlight(deadline)
+
+    def configure_syntax_tags(self, content_text):
+        content_text.tag_config("header", foreground="blue")
+        content_text.tag_config("bold", font=("TkDefaultFont", 10, "bold"))
+        content_text.tag_config("italic", font=("TkDefaultFont", 10, "italic"))
+        content_text.tag_config("code", foreground="green")
+        content_text.tag_config("link", foreground="purple", underline=True)
+        content_text.tag_config("spelling_error", underline=True, foreground="red")
+        content_text.tag_config("grammar_error", underline=True, foreground="red")
 
     def schedule_auto_save(self):
         if self.auto_save_id:
@@ -630,31 +4532,36 @@ class MediumPosterApp:
         self.auto_save_id = self.root.after(self.auto_save_interval, self.auto_save)
 
     def auto_save(self):
-        content = self.content_text.get("1.0", tk.END)
-        try:
-            with open(self.auto_save_file, "w", encoding="utf-8") as f:
-                f.write(content)
-            self.auto_save_message = "Auto-saved at " + time.strftime("%H:%M:%S")
-            self.update_status_bar()
-        except Exception as e:
-            self.status_message = f"Auto-save failed: {str(e)}"
-            self.update_status_bar()
+        # Clean documents are skipped; the journal writers do the file I/O
+        for tab in self.tabs:
+            tab.autosave_journal.flush()
+            if not tab.loading:
+                self.record_revision("autosave", tab=tab)
+        journal = self.tab.autosave_journal
+        if journal.last_error:
+            self.status_message = f"Auto-save failed: {str(journal.last_error)}"
+        elif journal.last_saved:
+            self.auto_save_message = "Auto-saved at " + time.strftime("%H:%M:%S", time.localtime(journal.last_saved))
+        self.update_status_bar()
         self.schedule_auto_save()
 
     def check_autosave(self):
-        if os.path.exists(self.auto_save_file):
-            if messagebox.askyesno("Recovery", "Unsaved content was found. Do you want to recover it?"):
+        # Each tab of the previous session left its own journal
+        for session in find_orphaned_autosaves():
+            if messagebox.askyesno("Recovery", "Unsaved content from a previous session was found. Do you want to recover it?"):
                 try:
-                    with open(self.auto_save_file, "r", encoding="utf-8") as f:
-                        content = f.read()
-                    self.content_text.delete("1.0", tk.END)
-                    self.content_text.insert(tk.END, content)
-                    self.preview_content()
+                    content = recover_autosave_session(AUTOSAVE_DIR, session)
+                    tab = self.tab_for_open()
+
+                    def recovered(tab=tab):
+                        tab.modified = True
+                        self.update_tab_name(tab)
+
+                    self.load_content(text_progress_chunks(content), recovered)
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to recover auto-saved content: {str(e)}")
-            os.remove(self.auto_save_file)
-        else:
-            pass
+                    continue
+            discard_autosave_session(AUTOSAVE_DIR, session)
 
     def set_auto_save_interval(self):
         try:
@@ -668,20 +4575,238 @@ class MediumPosterApp:
         except ValueError:
             messagebox.showerror("Invalid Input", "Please enter a valid positive number for the auto-save interval.")
 
+    def request_status_update(self):
+        # One pending update at a time; nothing runs while the document is idle
+        if self.status_after_id is None:
+            self.status_after_id = self.root.after(STATUS_UPDATE_MS, self.frame_scheduler.request, "status")
+
+    def status_step(self, deadline):
+        # Stats catch up a slice at a time after large edits or loads
+        if self.tab.document_stats.refresh(deadline):
+            return True
+        self.update_status_bar()
+        return False
+
     def update_status_bar(self):
-        content = self.content_text.get("1.0", tk.END)
-        word_count = len(content.split())
-        reading_time = max(1, word_count // 200) if word_count > 0 else 0
-        status = f"Words: {word_count} | Estimated Reading Time: {reading_time} min"
+        if self.status_after_id is not None:
+            self.root.after_cancel(self.status_after_id)
+            self.status_after_id = None
+        stats = self.tab.document_stats
+        stats.refresh()
+        status = (
+            f"Words: {stats.words} | Characters: {self.tab.document.table.length} | "
+            f"Paragraphs: {stats.paragraphs} | Sections: {stats.headings} | "
+            f"Estimated Reading Time: {stats.reading_time()} min"
+        )
+        readability = stats.flesch_reading_ease()
+        if readability is not None:
+            status += f" | Readability: {readability:.0f}"
+        if self.grammar_status:
+            status += f" | {self.grammar_status}"
         if self.status_message:
             status += f" | {self.status_message}"
+        if self.queue_status:
+            status += f" | {self.queue_status}"
         if self.auto_save_message:
             status += f" | {self.auto_save_message}"
         self.status_var.set(status)
-        self.root.after(1000, self.update_status_bar)  # Update every second
+
+    def toggle_metrics(self):
+        # Timing shims are installed only while collection is on
+        if self.metrics_enabled.get() and not self.metrics.wrapped:
+            self.metrics.reset()
+            self.metrics.set_gauge("grammar_queue_depth_max", 0)
+            for name in ("on_content_modified", "highlight_syntax", "schedule_preview", "preview_content",
+                         "render_preview_window", "check_spelling", "update_status_bar", "start_grammar_check",
+                         "highlight_errors", "auto_save"):
+                self.metrics.wrap(self, name, name)
+            self.metrics.wrap(self.frame_scheduler, "run_frame", "frame")
+            self.metrics.wrap(self.grammar_scheduler, "_check", "grammar_check")
+            for tab in self.tabs:
+                self.metrics.wrap(tab.autosave_journal, "_write", "autosave_write")
+            self.metrics.wrap(self.network, "request", "network_request")
+            self.probe_event_loop()
+            self.metrics_export_id = self.root.after(METRICS_EXPORT_MS, self.export_metrics)
+        elif not self.metrics_enabled.get() and self.metrics.wrapped:
+            self.metrics.unwrap_all()
+            for after_id in (self.metrics_probe_id, self.metrics_export_id):
+                if after_id:
+                    self.root.after_cancel(after_id)
+            self.metrics_probe_id = self.metrics_export_id = None
+            self.export_metrics()
+
+    def probe_event_loop(self, expected=None):
+        # A timer that fires late means the Tk thread was busy for that long
+        now = time.perf_counter()
+        if expected is not None:
+            late = (now - expected) * 1000
+            if late > METRICS_STALL_MS:
+                self.metrics.increment("tk_stalls")
+                self.metrics.observe("tk_stall", late)
+        stats = self.grammar_scheduler.stats()
+        depth = stats["queue_depth"]
+        self.metrics.set_gauge("grammar_queue_depth", depth)
+        if depth > self.metrics.gauges["grammar_queue_depth_max"]:
+            self.metrics.set_gauge("grammar_queue_depth_max", depth)
+        self.metrics.set_gauge("grammar_checks_superseded", stats["checks_superseded"])
+        self.metrics_probe_id = self.root.after(METRICS_PROBE_MS, self.probe_event_loop,
+                                                time.perf_counter() + METRICS_PROBE_MS / 1000)
+
+    def export_metrics(self):
+        self.file_writer.save(METRICS_PATH, self.metrics.export(METRICS_FORMAT))
+        if self.metrics.wrapped:
+            self.metrics_export_id = self.root.after(METRICS_EXPORT_MS, self.export_metrics)
+
+    def show_metrics_overlay(self):
+        if self.metrics_overlay is not None:
+            self.metrics_overlay.lift()
+            return
+        if not self.metrics_enabled.get():
+            self.metrics_enabled.set(True)
+            self.toggle_metrics()
+        self.metrics_overlay = tk.Toplevel(self.root)
+        self.metrics_overlay.title("Performance")
+        self.metrics_overlay.attributes("-topmost", True)
+        self.metrics_overlay.protocol("WM_DELETE_WINDOW", self.close_metrics_overlay)
+        self.metrics_overlay_text = tk.Text(self.metrics_overlay, width=72, height=24, font=("TkFixedFont", 9))
+        self.metrics_overlay_text.pack(fill=tk.BOTH, expand=True)
+        self.refresh_metrics_overlay()
+
+    def refresh_metrics_overlay(self):
+        if self.metrics_overlay is None:
+            return
+        self.metrics_overlay_text.config(state=tk.NORMAL)
+        self.metrics_overlay_text.delete("1.0", tk.END)
+        self.metrics_overlay_text.insert(tk.END, self.metrics.report())
+        self.metrics_overlay_text.config(state=tk.DISABLED)
+        self.metrics_overlay_id = self.root.after(METRICS_OVERLAY_MS, self.refresh_metrics_overlay)
+
+    def close_metrics_overlay(self):
+        if self.metrics_overlay_id:
+            self.root.after_cancel(self.metrics_overlay_id)
+            self.metrics_overlay_id = None
+        self.metrics_overlay.destroy()
+        self.metrics_overlay = None
+
+
+def report_startup_time(app, imports_done):
+    # Runs from the event loop, i.e. once the first frame can take input
+    app.root.update_idletasks()
+    first_frame = time.perf_counter()
+    print(json.dumps({
+        "import_seconds": round(imports_done - _STARTUP_STARTED, 4),
+        "first_interactive_frame_seconds": round(first_frame - _STARTUP_STARTED, 4),
+    }))
+    app.grammar_scheduler.shutdown()
+    for tab in app.tabs:
+        tab.autosave_journal.close(discard=True)
+    app.publish_queue.stop()
+    app.network.shutdown()
+    app.root.destroy()
+
+
+def publish_main(argv):
+    parser = argparse.ArgumentParser(prog="medium_poster.py publish", description="Publish markdown posts to Medium without the GUI.")
+    parser.add_argument("sources", nargs="+", help="Markdown files, directories or JSON manifests")
+    parser.add_argument("--token", default=os.environ.get("MEDIUM_TOKEN"), help="Medium API token (default: $MEDIUM_TOKEN)")
+    parser.add_argument("--api-base", default=MEDIUM_API_BASE)
+    parser.add_argument("--concurrency", type=int, default=PUBLISH_CONCURRENCY)
+    parser.add_argument("--progress", default="publish_progress.json", help="Progress file used to resume interrupted runs")
+    parser.add_argument("--max-retries", type=int, default=PUBLISH_MAX_RETRIES)
+    parser.add_argument("--status", dest="publish_status", default="draft", choices=["draft", "public", "unlisted"])
+    parser.add_argument("--license", default="all-rights-reserved")
+    parser.add_argument("--tags", default="", help="Default tags for posts without their own")
+    parser.add_argument("--notify-followers", action="store_true")
+    parser.add_argument("--retry-uncertain", action="store_true",
+                        help="Send posts again whose earlier attempt may have reached Medium")
+    args = parser.parse_args(argv)
+    if not args.token:
+        parser.error("a Medium API token is required (--token or $MEDIUM_TOKEN)")
+
+    defaults = {
+        "publish_status": args.publish_status,
+        "license": args.license,
+        "tags": args.tags,
+        "notify_followers": args.notify_followers,
+    }
+    posts = collect_posts(args.sources, defaults)
+    publisher = BatchPublisher(args.token, args.api_base, args.concurrency, args.progress, args.max_retries)
+    try:
+        failures = publisher.run(posts, retry_uncertain=args.retry_uncertain)
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    print(f"{len(posts) - failures} of {len(posts)} posts published or already done")
+    return 1 if failures else 0
+
+
+def sync_main(argv):
+    parser = argparse.ArgumentParser(prog="medium_poster.py sync",
+                                     description="Publish only the posts that are new or changed since the last sync.")
+    parser.add_argument("sources", nargs="+", help="Markdown files or directories")
+    parser.add_argument("--token", default=os.environ.get("MEDIUM_TOKEN"), help="Medium API token (default: $MEDIUM_TOKEN)")
+    parser.add_argument("--api-base", default=MEDIUM_API_BASE)
+    parser.add_argument("--manifest", default="sync_manifest.json", help="Records the payload hash and URL of every synced post")
+    parser.add_argument("--concurrency", type=int, default=PUBLISH_CONCURRENCY)
+    parser.add_argument("--workers", type=int, default=None, help="Processes used to hash files (default: CPU count)")
+    parser.add_argument("--max-retries", type=int, default=PUBLISH_MAX_RETRIES)
+    parser.add_argument("--status", dest="publish_status", default="draft", choices=["draft", "public", "unlisted"])
+    parser.add_argument("--license", default="all-rights-reserved")
+    parser.add_argument("--tags", default="", help="Default tags for posts without their own")
+    parser.add_argument("--notify-followers", action="store_true")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be sent without publishing")
+    parser.add_argument("--retry-uncertain", action="store_true",
+                        help="Send posts again whose earlier attempt may have reached Medium")
+    args = parser.parse_args(argv)
+    if not args.token and not args.dry_run:
+        parser.error("a Medium API token is required (--token or $MEDIUM_TOKEN)")
+
+    defaults = {
+        "publish_status": args.publish_status,
+        "license": args.license,
+        "tags": args.tags,
+        "notify_followers": args.notify_followers,
+    }
+    publisher = BatchPublisher(args.token, args.api_base, args.concurrency, args.manifest, args.max_retries)
+    started = time.perf_counter()
+    paths = list(source_paths(args.sources))
+    changed, unchanged = plan_sync(paths, publisher.progress, defaults, args.workers)
+    new = sum(1 for path, _ in changed if path not in publisher.progress)
+    print(f"{len(paths)} posts checked in {time.perf_counter() - started:.2f}s: "
+          f"{new} new, {len(changed) - new} changed, {len(unchanged)} unchanged")
+    # Medium's API cannot edit a post, so a changed file is published as a new post
+    for path, _ in changed:
+        previous = publisher.progress.get(path, {}).get("url")
+        print(f"  {'changed' if path in publisher.progress else 'new'}: {path}" + (f" (was {previous})" if previous else ""))
+    if args.dry_run or not changed:
+        if not args.dry_run:
+            publisher.save_progress()  # Keep refreshed mtimes so the files aren't read next time
+        return 0
+
+    posts = []
+    for path, state in changed:
+        post = read_markdown_post(path, defaults)
+        post["manifest"] = state
+        posts.append(post)
+    try:
+        failures = publisher.run(posts, retry_uncertain=args.retry_uncertain)
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    print(f"{len(posts) - failures} of {len(posts)} new or changed posts published")
+    return 1 if failures else 0
+
+
+_IMPORTS_DONE = time.perf_counter()
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["publish"]:
+        sys.exit(publish_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["sync"]:
+        sys.exit(sync_main(sys.argv[2:]))
     root = tk.Tk()
     app = MediumPosterApp(root)
+    if "--measure-startup" in sys.argv[1:]:
+        root.after(0, report_startup_time, app, _IMPORTS_DONE)
     root.mainloop()